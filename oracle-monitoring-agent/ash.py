@@ -0,0 +1,166 @@
+import os
+import time
+import threading
+import datetime
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+# --- ASH collection settings ---
+ASH_POLL_INTERVAL = float(os.getenv("ASH_POLL_INTERVAL", "5"))
+ASH_COST_BUDGET = float(os.getenv("ASH_COST_BUDGET", "0.05"))   # share of wall time polls may take
+ASH_KEEP_SECONDS = int(os.getenv("ASH_KEEP_SECONDS", "900"))     # per-second buckets kept (15 min)
+ASH_KEEP_MINUTES = int(os.getenv("ASH_KEEP_MINUTES", "60"))      # per-minute buckets kept (1 h)
+ASH_BOOTSTRAP_SECONDS = int(os.getenv("ASH_BOOTSTRAP_SECONDS", "60"))
+ASH_TOP_N = int(os.getenv("ASH_TOP_N", "10"))
+
+# Only rows newer than the sample_id watermark are fetched (bind variable, no re-aggregation in SQL)
+ASH_SQL = """
+SELECT
+    sample_id,
+    sample_time,
+    session_id || ',' || session_serial# AS session_key,
+    sql_id,
+    DECODE(session_state, 'ON CPU', 'CPU', NVL(wait_class, 'CPU')) AS wait_class
+FROM
+    v$active_session_history
+WHERE
+    sample_id > :last_id
+ORDER BY
+    sample_id
+"""
+
+# First poll after startup: seed the watermark from a short time window
+ASH_BOOTSTRAP_SQL = """
+SELECT
+    sample_id,
+    sample_time,
+    session_id || ',' || session_serial# AS session_key,
+    sql_id,
+    DECODE(session_state, 'ON CPU', 'CPU', NVL(wait_class, 'CPU')) AS wait_class
+FROM
+    v$active_session_history
+WHERE
+    sample_time > SYSTIMESTAMP - NUMTODSINTERVAL(:secs, 'SECOND')
+ORDER BY
+    sample_id
+"""
+
+GROUP_KEYS = ("wait_class", "sql_id", "session")
+
+
+class AshBucket:
+    """Sample counts for one second or one minute, by wait class / SQL_ID / session"""
+    __slots__ = ("start", "length", "wait_class", "sql_id", "session")
+
+    def __init__(self, start: int, length: int):
+        self.start = start
+        self.length = length          # 1 or 60 seconds
+        self.wait_class = Counter()
+        self.sql_id = Counter()
+        self.session = Counter()
+
+    def add(self, session_key, sql_id, wait_class):
+        self.wait_class[wait_class] += 1
+        self.sql_id[sql_id or "(none)"] += 1
+        self.session[session_key] += 1
+
+    def aas(self, group_by: str, limit: Optional[int], seconds: float) -> Dict[str, float]:
+        """
+        Average active sessions per group over `seconds` of wall time. ASH
+        writes no row for a second without active sessions, so this must be
+        the time covered, not the number of samples seen.
+        """
+        counts: Counter = getattr(self, group_by)
+        items = counts.most_common(limit) if limit else counts.items()
+        return {k: round(v / seconds, 2) for k, v in items}
+
+
+class AshCollector:
+    """
+    Incremental ASH reader. Each poll fetches only rows above the last seen
+    sample_id and folds them into bounded per-second and per-minute buckets;
+    endpoints are served from memory without touching the database.
+    """
+
+    def __init__(self):
+        self.last_sample_id: Optional[int] = None
+        self.seconds: "OrderedDict[int, AshBucket]" = OrderedDict()
+        self.minutes: "OrderedDict[int, AshBucket]" = OrderedDict()
+        self.last_poll: Optional[float] = None
+        # Start of the time ASH has been read for (the bootstrap window's start)
+        self.covered_from: Optional[float] = None
+        self.last_rows = 0
+        self._lock = threading.Lock()
+
+    def poll(self, pool):
+        with pool.acquire() as conn:
+            with conn.cursor() as cursor:
+                cursor.arraysize = 1000
+                if self.last_sample_id is None:
+                    self.covered_from = time.time() - ASH_BOOTSTRAP_SECONDS
+                    cursor.execute(ASH_BOOTSTRAP_SQL, secs=ASH_BOOTSTRAP_SECONDS)
+                else:
+                    cursor.execute(ASH_SQL, last_id=self.last_sample_id)
+                rows = cursor.fetchall()
+        self.ingest(rows)
+
+    def ingest(self, rows):
+        with self._lock:
+            for sample_id, sample_time, session_key, sql_id, wait_class in rows:
+                ts = int(sample_time.timestamp())
+                for buckets, key, length in ((self.seconds, ts, 1), (self.minutes, ts - ts % 60, 60)):
+                    bucket = buckets.get(key)
+                    if bucket is None:
+                        bucket = buckets[key] = AshBucket(key, length)
+                    bucket.add(session_key, sql_id, wait_class)
+                if self.last_sample_id is None or sample_id > self.last_sample_id:
+                    self.last_sample_id = sample_id
+            self._prune()
+            self.last_poll = time.time()
+            self.last_rows = len(rows)
+
+    def _prune(self):
+        now = int(time.time())
+        for buckets, keep in ((self.seconds, ASH_KEEP_SECONDS), (self.minutes, ASH_KEEP_MINUTES * 60)):
+            # Buckets are inserted in time order, so the oldest are at the front
+            while buckets and next(iter(buckets)) < now - keep:
+                buckets.popitem(last=False)
+
+    def _seconds(self, bucket: AshBucket) -> float:
+        """Wall time of `bucket` the collector has covered: less for the bootstrap and the open bucket"""
+        start = max(bucket.start, self.covered_from or bucket.start)
+        end = min(bucket.start + bucket.length, self.last_poll or bucket.start + bucket.length)
+        return max(end - start, 1.0)
+
+    def series(self, granularity: str = "minute", group_by: str = "wait_class",
+               window: Optional[int] = None, limit: Optional[int] = None) -> List[dict]:
+        """Flatten buckets to [{time, <group_by>, active_sessions}] for the last `window` seconds"""
+        buckets = self.seconds if granularity == "second" else self.minutes
+        fmt = "%H:%M:%S" if granularity == "second" else "%H:%M"
+        since = time.time() - window if window else 0
+        result = []
+        with self._lock:
+            for ts, bucket in buckets.items():
+                if ts < since:
+                    continue
+                label = datetime.datetime.fromtimestamp(ts).strftime(fmt)
+                for key, value in bucket.aas(group_by, limit, self._seconds(bucket)).items():
+                    result.append({"time": label, group_by: key, "active_sessions": value})
+        return result
+
+    def closed_minutes(self, after_ts: float):
+        """Completed minute buckets newer than after_ts as [(minute_ts, {wait_class: aas})]"""
+        with self._lock:
+            # A minute is complete once a poll has run after it ended
+            polled = self.last_poll or 0
+            return [(ts, b.aas("wait_class", None, self._seconds(b))) for ts, b in self.minutes.items()
+                    if ts > after_ts and ts + 60 < polled]
+
+    def status(self):
+        return {
+            "last_sample_id": self.last_sample_id,
+            "last_poll": self.last_poll,
+            "last_rows": self.last_rows,
+            "second_buckets": len(self.seconds),
+            "minute_buckets": len(self.minutes),
+        }
@@ -0,0 +1,278 @@
+"""
+Bulk export of editor query results to CSV, Parquet or Arrow IPC.
+
+Rows come from iter_query() one array-fetched batch at a time and are
+written straight to the output, so memory is bounded by one batch (one row
+group for Parquet) no matter how many rows the query returns. Output is
+either streamed as a chunked response or written to a temporary file that
+is downloaded later through its export id.
+
+CSV needs nothing extra; Parquet and Arrow need pyarrow.
+"""
+import io
+import os
+import csv
+import time
+import uuid
+import datetime
+import tempfile
+import threading
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "oracle-agent-exports"))
+EXPORT_TTL_SECONDS = int(os.getenv("EXPORT_TTL_SECONDS", "3600"))     # finished files are deleted after this
+EXPORT_ROW_GROUP_ROWS = int(os.getenv("EXPORT_ROW_GROUP_ROWS", "65536"))
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+def check_format(fmt: str):
+    """Raise ValueError for an unknown format or one whose library is missing"""
+    if fmt not in FORMATS:
+        raise ValueError(f"export must be one of {list(FORMATS)}")
+    if fmt != "csv" and pyarrow is None:
+        raise ValueError(f"{fmt} export needs pyarrow on the agent (pip install pyarrow)")
+
+
+def media_type(fmt: str) -> str:
+    return FORMATS[fmt][0]
+
+
+def filename(query_id: str, fmt: str) -> str:
+    return f"{query_id}.{FORMATS[fmt][1]}"
+
+
+def _value(v):
+    # LOBs arrive as locators; everything else is already a Python value
+    return v.read() if hasattr(v, "read") else v
+
+
+class _Chunks:
+    """Write-only file object that hands written bytes back to the generator"""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+# --- Arrow schema from the cursor description ---
+
+def _arrow_type(col: dict):
+    name, precision, scale = col.get("type"), col.get("precision"), col.get("scale")
+    if name in ("DB_TYPE_NUMBER", "DB_TYPE_BINARY_INTEGER"):
+        if scale == 0 and precision and precision <= 18:
+            return pyarrow.int64()
+        # Unconstrained NUMBER may hold either; exact decimals need CSV
+        return pyarrow.float64()
+    if name in ("DB_TYPE_BINARY_FLOAT", "DB_TYPE_BINARY_DOUBLE"):
+        return pyarrow.float64()
+    if name in ("DB_TYPE_DATE", "DB_TYPE_TIMESTAMP", "DB_TYPE_TIMESTAMP_LTZ"):
+        return pyarrow.timestamp("us")
+    if name == "DB_TYPE_TIMESTAMP_TZ":
+        return pyarrow.timestamp("us", tz="UTC")
+    if name in ("DB_TYPE_RAW", "DB_TYPE_LONG_RAW", "DB_TYPE_BLOB"):
+        return pyarrow.binary()
+    if name == "DB_TYPE_BOOLEAN":
+        return pyarrow.bool_()
+    return pyarrow.string()
+
+
+def _schema(meta: dict):
+    types = meta.get("types") or [{} for _ in meta["columns"]]
+    return pyarrow.schema([pyarrow.field(c, _arrow_type(t)) for c, t in zip(meta["columns"], types)])
+
+
+def _record_batch(schema, rows: list):
+    columns = []
+    for i, field in enumerate(schema):
+        values = [_value(r[i]) for r in rows]
+        if pyarrow.types.is_string(field.type):
+            values = [None if v is None else v if isinstance(v, str) else str(v) for v in values]
+        elif pyarrow.types.is_timestamp(field.type) and field.type.tz:
+            values = [v.astimezone(datetime.timezone.utc) if v is not None and v.tzinfo else v for v in values]
+        columns.append(pyarrow.array(values, type=field.type))
+    return pyarrow.RecordBatch.from_arrays(columns, schema=schema)
+
+
+# --- writers: each consumes protocol messages and yields output bytes ---
+
+def _csv(messages) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for msg in messages:
+        if msg["type"] == "meta":
+            writer.writerow(msg["columns"])
+        elif msg["type"] == "rows":
+            writer.writerows([["" if v is None else _value(v) for v in row] for row in msg["rows"]])
+        else:
+            continue
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+
+
+def _arrow(messages) -> Iterator[bytes]:
+    sink = _Chunks()
+    writer = schema = None
+    for msg in messages:
+        if msg["type"] == "meta":
+            schema = _schema(msg)
+            writer = pyarrow.ipc.new_stream(sink, schema)
+        elif msg["type"] == "rows" and msg["rows"]:
+            writer.write_batch(_record_batch(schema, msg["rows"]))
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def _parquet(messages) -> Iterator[bytes]:
+    sink = _Chunks()
+    writer = schema = None
+    pending: list = []
+    pending_rows = 0
+    for msg in messages:
+        if msg["type"] == "meta":
+            schema = _schema(msg)
+            writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd")
+        elif msg["type"] == "rows" and msg["rows"]:
+            pending.append(_record_batch(schema, msg["rows"]))
+            pending_rows += len(msg["rows"])
+            # One row group per EXPORT_ROW_GROUP_ROWS rows: small groups make Parquet slow to read
+            if pending_rows >= EXPORT_ROW_GROUP_ROWS:
+                writer.write_table(pyarrow.Table.from_batches(pending, schema=schema))
+                pending, pending_rows = [], 0
+        yield sink.drain()
+    if writer is not None:
+        if pending:
+            writer.write_table(pyarrow.Table.from_batches(pending, schema=schema))
+        writer.close()
+        yield sink.drain()
+
+
+_WRITERS = {"csv": _csv, "arrow": _arrow, "parquet": _parquet}
+
+
+def iter_export(messages, fmt: str) -> Iterator[bytes]:
+    """Encode iter_query() messages as `fmt`, one chunk per fetched batch"""
+    for chunk in _WRITERS[fmt](_only_queries(messages)):
+        if chunk:
+            yield chunk
+
+
+def _only_queries(messages):
+    for msg in messages:
+        if msg["type"] == "end" and "message" in msg:
+            raise ValueError("Only queries can be exported")
+        yield msg
+
+
+class Export:
+    def __init__(self, export_id: str, query_id: str, fmt: str):
+        self.id = export_id
+        self.query_id = query_id
+        self.format = fmt
+        self.path = os.path.join(EXPORT_DIR, f"{export_id}.{FORMATS[fmt][1]}")
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.bytes = 0
+        self.started = time.time()
+        self.finished: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "export_id": self.id,
+            "query_id": self.query_id,
+            "format": self.format,
+            "status": self.status,
+            "error": self.error,
+            "bytes": self.bytes,
+            "started": self.started,
+            "finished": self.finished,
+            "filename": filename(self.query_id, self.format),
+        }
+
+
+class ExportRegistry:
+    """
+    Exports written to temporary files by a worker thread. The caller gets
+    an export id back at once and polls it; the file is kept for
+    EXPORT_TTL_SECONDS after it is finished.
+    """
+
+    def __init__(self):
+        self.exports: Dict[str, Export] = {}
+        self._lock = threading.Lock()
+
+    def start(self, messages, fmt: str, query_id: str) -> Export:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        self.expire()
+        export = Export(uuid.uuid4().hex, query_id, fmt)
+        with self._lock:
+            self.exports[export.id] = export
+        threading.Thread(target=self._write, args=(export, messages), daemon=True,
+                         name=f"export-{export.id[:8]}").start()
+        return export
+
+    def _write(self, export: Export, messages):
+        try:
+            with open(export.path, "wb") as f:
+                for chunk in iter_export(messages, export.format):
+                    f.write(chunk)
+                    export.bytes += len(chunk)
+            export.status = "done"
+        except Exception as e:
+            export.status = "failed"
+            export.error = str(e)
+            if os.path.exists(export.path):
+                os.remove(export.path)
+        export.finished = time.time()
+        if export.id not in self.exports and os.path.exists(export.path):
+            os.remove(export.path)  # deleted while it was still being written
+
+    def get(self, export_id: str) -> Optional[Export]:
+        return self.exports.get(export_id)
+
+    def expire(self):
+        now = time.time()
+        with self._lock:
+            for export in list(self.exports.values()):
+                if export.finished and now - export.finished > EXPORT_TTL_SECONDS:
+                    if os.path.exists(export.path):
+                        os.remove(export.path)
+                    del self.exports[export.id]
+
+    def remove(self, export_id: str) -> bool:
+        with self._lock:
+            export = self.exports.pop(export_id, None)
+        if export is None:
+            return False
+        if export.status != "running" and os.path.exists(export.path):
+            os.remove(export.path)
+        return True
@@ -0,0 +1,145 @@
+"""
+Prometheus / OpenMetrics self-instrumentation for the agent.
+
+Collector runs and editor statements pay one histogram observe; pool usage,
+push/spool state and editor counters are read at scrape time. Without
+prometheus_client every metric is a no-op and /metrics answers 503.
+"""
+import os
+import time
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Histogram, REGISTRY
+    from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+except ImportError:
+    prometheus_client = None
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true" and prometheus_client is not None
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Noop:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, value=1):
+        pass
+
+
+def _histogram(name, doc, labels):
+    if not METRICS_ENABLED:
+        return _Noop()
+    return Histogram(name, doc, labels, buckets=LATENCY_BUCKETS)
+
+
+def _counter(name, doc, labels):
+    if not METRICS_ENABLED:
+        return _Noop()
+    return Counter(name, doc, labels)
+
+
+HTTP_LATENCY = _histogram("oma_http_request_duration_seconds",
+                          "HTTP request latency by route template", ["method", "route", "status"])
+COLLECTOR_LATENCY = _histogram("oma_collector_duration_seconds",
+                               "Wall time of one collector run (its V$ queries and bookkeeping)", ["collector"])
+COLLECTOR_ERRORS = _counter("oma_collector_errors_total", "Collector runs that failed", ["collector"])
+EDITOR_QUEUE_WAIT = _histogram("oma_editor_queue_wait_seconds",
+                               "Wait for a free editor pool connection", [])
+EDITOR_LATENCY = _histogram("oma_editor_statement_duration_seconds",
+                            "Ad-hoc statement run time including fetch", ["outcome"])
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request by route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_LATENCY.labels(scope["method"], route, str(status)).observe(time.perf_counter() - started)
+
+
+class StateCollector:
+    """
+    Gauges read at scrape time. `pools` returns {name: oracledb pool or None};
+    `queries` and `pusher` are the agent's QueryRegistry and Pusher.
+    """
+
+    def __init__(self, pools, queries, pusher):
+        self.pools = pools
+        self.queries = queries
+        self.pusher = pusher
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        busy = GaugeMetricFamily("oma_pool_busy", "Connections in use", labels=["pool"])
+        opened = GaugeMetricFamily("oma_pool_opened", "Connections open", labels=["pool"])
+        size = GaugeMetricFamily("oma_pool_max", "Pool size limit", labels=["pool"])
+        for name, pool in self.pools().items():
+            if pool is None:
+                continue
+            busy.add_metric([name], pool.busy)
+            opened.add_metric([name], pool.opened)
+            size.add_metric([name], pool.max)
+        yield busy
+        yield opened
+        yield size
+
+        q = self.queries
+        yield GaugeMetricFamily("oma_editor_active_statements", "Ad-hoc statements queued or running",
+                                value=len(q.active))
+        outcomes = CounterMetricFamily("oma_editor_statements", "Finished ad-hoc statements", labels=["outcome"])
+        for outcome in ("completed", "failed", "timed_out", "cancelled", "rejected"):
+            outcomes.add_metric([outcome], getattr(q, outcome))
+        yield outcomes
+
+        p = self.pusher
+        yield CounterMetricFamily("oma_push_batches_sent", "Batches acknowledged by the server", value=p.sent)
+        yield CounterMetricFamily("oma_push_batches_replayed", "Spooled batches replayed", value=p.replayed)
+        if p.spool is not None:
+            yield GaugeMetricFamily("oma_spool_pending_bytes", "Spooled bytes not yet acknowledged",
+                                    value=p.spool.pending_bytes())
+            yield GaugeMetricFamily("oma_spool_bytes", "Spool size on disk", value=p.spool.total_bytes())
+
+
+def metrics_response(accept: str = ""):
+    """Render the registry, in OpenMetrics format when the scraper asks for it"""
+    from fastapi.responses import Response, PlainTextResponse
+
+    if not METRICS_ENABLED:
+        return PlainTextResponse("Metrics disabled (set METRICS_ENABLED=true and install prometheus_client)",
+                                 status_code=503)
+    if "application/openmetrics-text" in accept:
+        from prometheus_client.openmetrics.exposition import generate_latest, CONTENT_TYPE_LATEST
+    else:
+        from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+def register_state(pools, queries, pusher):
+    if METRICS_ENABLED:
+        REGISTRY.register(StateCollector(pools, queries, pusher))
@@ -0,0 +1,167 @@
+"""
+Blocking-chain analysis from one v$session snapshot.
+
+Every session waits on at most one blocker, so the wait-for graph is a set
+of in-trees (plus the odd cycle). One pass over the snapshot builds the
+trees; each session is visited once to find its root and depth, which keeps
+lock storms with thousands of sessions linear.
+"""
+import os
+import time
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+LOCKS_INTERVAL = float(os.getenv("LOCKS_INTERVAL", "15"))
+LOCKS_COST_BUDGET = float(os.getenv("LOCKS_COST_BUDGET", "0.02"))   # share of wall time snapshots may take
+LOCKS_KEEP_SAMPLES = int(os.getenv("LOCKS_KEEP_SAMPLES", "240"))
+LOCKS_MAX_ROOTS = int(os.getenv("LOCKS_MAX_ROOTS", "50"))     # trees returned, largest first
+
+# One bulk read; the graph is built in memory, no CONNECT BY over v$session
+BLOCKING_SQL = """
+SELECT
+    sid,
+    serial#,
+    username,
+    program,
+    status,
+    blocking_session,
+    final_blocking_session,
+    event,
+    sql_id,
+    seconds_in_wait
+FROM
+    v$session
+"""
+
+
+def _node(sid, serial=None, username=None, program=None, status=None, event=None, sql_id=None,
+          seconds_in_wait=None, final_blocker=None) -> dict:
+    return {
+        "sid": sid,
+        "serial": serial,
+        "username": username,
+        "program": program,
+        "status": status,
+        "event": event,
+        "sql_id": sql_id,
+        "seconds_in_wait": seconds_in_wait or 0,
+        "final_blocking_session": final_blocker,
+        "depth": 0,
+        "blocked_count": 0,
+        "children": [],
+    }
+
+
+def analyze(rows, now: Optional[float] = None) -> dict:
+    """
+    Build blocking trees from (sid, serial#, username, program, status,
+    blocking_session, final_blocking_session, event, sql_id, seconds_in_wait)
+    rows. Roots are sessions that block others without waiting on anyone; a
+    blocker missing from the snapshot (e.g. another instance) becomes a bare
+    root. Sessions in or behind a cycle are reported under `cycles`.
+    """
+    nodes: Dict[int, dict] = {}
+    blocker_of: Dict[int, int] = {}
+    sessions = 0
+    for sid, serial, username, program, status, blocker, final, event, sql_id, wait in rows:
+        sessions += 1
+        nodes[sid] = _node(sid, serial, username, program, status, event, sql_id, wait, final)
+        if blocker is not None:
+            blocker_of[sid] = blocker
+    for blocker in set(blocker_of.values()):
+        if blocker not in nodes:
+            nodes[blocker] = _node(blocker, status="UNKNOWN")
+
+    # root_of[sid]: the root sid, or None when the chain ends in a cycle.
+    # Each walk stops at the first session already resolved, so every session is walked once.
+    root_of: Dict[int, Optional[int]] = {}
+    cycles: List[List[int]] = []
+    for start in blocker_of:
+        path: List[int] = []
+        on_path: Dict[int, int] = {}
+        sid = start
+        while True:
+            if sid in root_of:
+                root, depth = root_of[sid], nodes[sid]["depth"]
+                break
+            if sid in on_path:
+                # Walked back onto this path: everything from there on is a cycle
+                cycles.append(path[on_path[sid]:])
+                root, depth = None, 0
+                break
+            if sid not in blocker_of:
+                root_of[sid] = root = sid
+                depth = 0
+                break
+            on_path[sid] = len(path)
+            path.append(sid)
+            sid = blocker_of[sid]
+        for s in reversed(path):
+            root_of[s] = root
+            depth += 1
+            nodes[s]["depth"] = depth if root is not None else 0
+
+    roots: Dict[int, dict] = {}
+    in_cycle = 0
+    for sid, blocker in blocker_of.items():
+        root = root_of[sid]
+        if root is None:
+            in_cycle += 1
+            continue
+        nodes[blocker]["children"].append(nodes[sid])
+        tree = nodes[root]
+        tree["blocked_count"] += 1
+        tree["max_depth"] = max(tree.get("max_depth", 0), nodes[sid]["depth"])  # roots only
+        roots[root] = tree
+
+    trees = sorted(roots.values(), key=lambda n: (n["blocked_count"], n["seconds_in_wait"]), reverse=True)
+    blocked = len(blocker_of)
+    return {
+        "ts": now if now is not None else time.time(),
+        "sessions": sessions,
+        "blocked_sessions": blocked,
+        "root_blockers": len(trees),
+        "max_depth": max((t["max_depth"] for t in trees), default=0),
+        "max_blocked_per_root": trees[0]["blocked_count"] if trees else 0,
+        "longest_wait_seconds": max((nodes[s]["seconds_in_wait"] for s in blocker_of), default=0),
+        "sessions_in_cycles": in_cycle,
+        "cycles": cycles,
+        "roots": trees[:LOCKS_MAX_ROOTS],
+    }
+
+
+def summary(report: dict) -> dict:
+    """The report without its trees (what alerting and push history need)"""
+    return {k: v for k, v in report.items() if k != "roots"}
+
+
+class BlockingAnalyzer:
+    """Periodic blocking snapshots; the latest full report plus a bounded history of summaries"""
+
+    def __init__(self):
+        self.latest: Optional[dict] = None
+        self.samples: deque = deque(maxlen=LOCKS_KEEP_SAMPLES)
+        self._lock = threading.Lock()
+
+    def collect(self, pool) -> dict:
+        with pool.acquire() as conn:
+            with conn.cursor() as cursor:
+                cursor.arraysize = 1000
+                cursor.execute(BLOCKING_SQL)
+                rows = cursor.fetchall()
+        report = analyze(rows)
+        with self._lock:
+            self.latest = report
+            self.samples.append(summary(report))
+        return report
+
+    def since(self, after_ts: float) -> List[dict]:
+        """Summaries of the snapshots taken after after_ts"""
+        with self._lock:
+            return [r for r in self.samples if r["ts"] > after_ts]
+
+    def status(self):
+        latest = self.latest
+        return {"last_snapshot": latest["ts"] if latest else None,
+                "blocked_sessions": latest["blocked_sessions"] if latest else None}
@@ -1,5 +1,5 @@
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 import oracledb
 try:
@@ -7,7 +7,23 @@ try:
 except Exception:
     pass
 import os
+import re
+import asyncio
+import threading
 import datetime
+from ash import AshCollector, ASH_POLL_INTERVAL, ASH_COST_BUDGET, ASH_TOP_N, GROUP_KEYS
+from topsql import (TopSqlEngine, TOPSQL_INTERVAL, TOPSQL_COST_BUDGET, WINDOWS as TOPSQL_WINDOWS,
+                    STATS as TOPSQL_STATS, GROUP_BY as TOPSQL_GROUP_BY)
+from sessions import SessionMetrics, SESSION_SAMPLE_INTERVAL, SESSION_COST_BUDGET
+from locks import BlockingAnalyzer, LOCKS_INTERVAL, LOCKS_COST_BUDGET
+from scheduler import Scheduler, SCHED_STRESS_CPU, SCHED_BOOST_SECONDS
+from pusher import Pusher, PUSH_URL
+from queries import QueryRegistry, EDITOR_QUEUE_TIMEOUT_MS
+from plans import PlanReader
+from sqlnorm import normalize
+import export
+from serialization import FastJSONResponse, dumps_line
+import instrumentation
 
 # --- Configuration ---
 # DB Connection Info (Load from Env or Default)
@@ -16,43 +32,282 @@ DB_PASSWORD = os.getenv("DB_PASSWORD", "oracle")
 DB_DSN = os.getenv("DB_DSN", "localhost/XE")
 
 from pydantic import BaseModel
+from fastapi.responses import StreamingResponse, FileResponse
+from typing import List, Optional
+from decimal import Decimal
+import base64
+import json
 
-app = FastAPI(title="Oracle Monitoring Agent")
+# Array fetch size for ad-hoc queries (rows per round-trip)
+FETCH_ARRAYSIZE = int(os.getenv("FETCH_ARRAYSIZE", "1000"))
+
+# Separate pools: collectors keep their connections no matter what the editor runs
+MONITOR_POOL_MIN = int(os.getenv("MONITOR_POOL_MIN", "1"))
+MONITOR_POOL_MAX = int(os.getenv("MONITOR_POOL_MAX", "3"))
+EDITOR_POOL_MIN = int(os.getenv("EDITOR_POOL_MIN", "1"))
+EDITOR_POOL_MAX = int(os.getenv("EDITOR_POOL_MAX", "5"))
+# On-demand plan, SQL stats and fresh blocking reads: never take a collector's connection
+DIAG_POOL_MIN = int(os.getenv("DIAG_POOL_MIN", "1"))
+DIAG_POOL_MAX = int(os.getenv("DIAG_POOL_MAX", "2"))
+DIAG_QUEUE_TIMEOUT_MS = int(os.getenv("DIAG_QUEUE_TIMEOUT_MS", "5000"))
+
+app = FastAPI(title="Oracle Monitoring Agent", default_response_class=FastJSONResponse)
 
 class QueryRequest(BaseModel):
     sql: str
+    stream: bool = False              # NDJSON, one line per fetched batch
+    max_rows: Optional[int] = None    # Cap rows returned by this call
+    cursor: Optional[str] = None      # Resume token from a previous `next_cursor`
+    fetch_size: int = FETCH_ARRAYSIZE
+    query_id: Optional[str] = None    # Client-chosen id for POST /queries/{id}/cancel
+    timeout_ms: Optional[int] = None  # Per round-trip call timeout (default EDITOR_CALL_TIMEOUT_MS)
+    export: Optional[str] = None      # csv / parquet / arrow instead of JSON rows
+    export_mode: str = "stream"       # stream: chunked response; file: temp file + GET /exports/{id}
+    session_id: Optional[str] = None  # Run on a script session (POST /sessions); nothing is committed
+
+class ExecuteManyRequest(BaseModel):
+    sql: str                               # DML with :1..:n binds
+    rows: List[List[Optional[str]]]
+    types: List[Optional[str]] = []        # "n" = numeric column (sent as text to keep precision)
+    query_id: Optional[str] = None
+    timeout_ms: Optional[int] = None
+    session_id: Optional[str] = None
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode()).decode()
+
+def decode_cursor(token: Optional[str]) -> int:
+    if not token:
+        return 0
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(token.encode()))["offset"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Errors from wrapping a statement in an inline view (duplicate column names, FOR UPDATE, ...);
+# the page is then read from the original statement instead, and the end message says so
+PAGING_FALLBACK_ERRORS = {907, 918, 933, 2014}
+FOR_UPDATE_RE = re.compile(r"\bFOR\s+UPDATE\b", re.IGNORECASE)
+
+SQL_TOKEN_RE = re.compile(r'"[^"]*"|[()]|[^\s()"]+')
+UNORDERED_RESUME_WARNING = ("The statement has no top-level ORDER BY, so rows can repeat or be missed between pages; "
+                            "order by a unique key for exact paging")
+
+def has_stable_order(sql: str) -> bool:
+    """
+    True if the statement ends in a top-level ORDER BY (not one inside a
+    subquery or an analytic OVER clause). Re-executing it at an offset then
+    returns the same rows, provided the sort keys are unique.
+    """
+    depth = 0
+    # normalize() drops comments and literals; quoted identifiers stay single tokens
+    tokens = SQL_TOKEN_RE.findall(normalize(sql))
+    for i, token in enumerate(tokens):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0 and token == "ORDER" and tokens[i + 1:i + 2] in (["BY"], ["SIBLINGS"]):
+            return True
+    return False
+
+def _resume_info(sql: str, offset: int, skip: int, has_more: bool) -> dict:
+    """`resume_exact` (and a `warning` if not) for any page that was resumed or hands out a cursor"""
+    if not offset and not has_more:
+        return {}
+    info = {"resume_exact": has_stable_order(sql)}
+    warnings = [] if info["resume_exact"] else [UNORDERED_RESUME_WARNING]
+    if offset and skip:
+        warnings.append(f"The statement can't be wrapped in OFFSET: {offset} rows were fetched and discarded to resume")
+    if warnings:
+        info["warning"] = "; ".join(warnings)
+    return info
+
+def _execute_from(cursor, sql: str, offset: int) -> int:
+    """
+    Execute a query, resuming at row `offset` (cursor tokens). The statement
+    itself is never rewritten for max_rows: the fetch loop stops there. To
+    resume, Oracle skips rows via OFFSET in a wrapper when the statement
+    allows it; otherwise they are skipped client-side. Returns the number of
+    rows the caller still has to skip. Either way the resume is only exact
+    for a statement with a stable order (see has_stable_order).
+    """
+    if offset and not FOR_UPDATE_RE.search(sql):
+        try:
+            cursor.execute(f"SELECT * FROM ({sql}) OFFSET :pg_offset ROWS", pg_offset=offset)
+            return 0
+        except oracledb.DatabaseError as e:
+            if e.args[0].code not in PAGING_FALLBACK_ERRORS:
+                raise
+    cursor.execute(sql)
+    return offset
+
+def _is_query(sql: str) -> bool:
+    head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+    return head in ("SELECT", "WITH")
+
+def iter_query(request: QueryRequest):
+    """
+    Run a statement and yield protocol messages as rows are array-fetched:
+    meta -> rows (one per batch) -> end. Nothing is buffered beyond one batch.
+    """
+    offset = decode_cursor(request.cursor)
+    fetch_size = max(1, request.fetch_size)
+    is_query = _is_query(request.sql)
+    sql = request.sql.strip().rstrip(";") if is_query else request.sql
+    query_id = request.query_id or queries.new_id()
+    timeout_ms = queries.timeout_for(request.timeout_ms)
+
+    try:
+        yield from _run_query(query_id, timeout_ms, sql, is_query, request, offset, fetch_size)
+    except oracledb.Error as e:
+        raise RuntimeError(queries.describe_error(query_id, e, timeout_ms)) from e
+
+def _run_query(query_id, timeout_ms, sql, is_query, request, offset, fetch_size):
+    with queries.run(ensure_editor_pool(), query_id, request.sql, timeout_ms, request.session_id) as conn:
+        with conn.cursor() as cursor:
+            cursor.arraysize = fetch_size
+            cursor.prefetchrows = fetch_size + 1
+            if is_query:
+                skip = _execute_from(cursor, sql, offset)
+            else:
+                cursor.execute(sql)
+                skip = 0
+            skipped_client_side = skip
+
+            if cursor.description is None:
+                # A script session's transaction is committed when the session is closed
+                if request.session_id is None:
+                    conn.commit()
+                yield {"type": "end", "query_id": query_id, "message": f"Executed. Rows affected: {cursor.rowcount}"}
+                return
+
+            yield {
+                "type": "meta",
+                "query_id": query_id,
+                "columns": [col[0] for col in cursor.description],
+                "types": [{"type": col[1].name, "precision": col[4], "scale": col[5]} for col in cursor.description],
+            }
+
+            while skip > 0:
+                skipped = cursor.fetchmany(min(skip, fetch_size))
+                if not skipped:
+                    break
+                skip -= len(skipped)
+
+            sent = 0
+            while True:
+                limit = fetch_size
+                if request.max_rows is not None:
+                    limit = min(limit, request.max_rows - sent)
+                if limit <= 0:
+                    break
+                rows = cursor.fetchmany(limit)
+                if not rows:
+                    break
+                sent += len(rows)
+                yield {"type": "rows", "rows": rows}
+
+            has_more = request.max_rows is not None and sent >= request.max_rows \
+                and cursor.fetchone() is not None
+            yield {
+                "type": "end",
+                "query_id": query_id,
+                "row_count": sent,
+                "next_cursor": encode_cursor(offset + sent) if has_more else None,
+                **_resume_info(sql, offset, skipped_client_side, has_more),
+            }
 
-# ... (pool setup)
+def _ndjson(messages):
+    try:
+        for msg in messages:
+            yield dumps_line(msg)
+    except Exception as e:
+        yield dumps_line({"type": "error", "message": str(e)})
 
 @app.post("/execute")
-async def execute_query(request: QueryRequest):
+def execute_query(request: QueryRequest):
     """
     Execute arbitrary SQL from Monitoring Server.
     """
+    if request.export:
+        return _export_query(request)
+    if request.stream:
+        return StreamingResponse(_ndjson(iter_query(request)), media_type="application/x-ndjson")
+
     try:
-        if not pool:
-             raise Exception("DB Pool not initialized")
-             
-        with pool.acquire() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(request.sql)
-                # Fetch results if SELECT
-                if request.sql.strip().upper().startswith("SELECT"):
-                    columns = [col[0] for col in cursor.description]
-                    rows = cursor.fetchall()
-                    # Serialize rows (handle dates etc if needed, but for now simple)
-                    return {
-                        "status": "success",
-                        "columns": columns,
-                        "rows": rows
-                    }
-                else:
-                    return {
-                        "status": "success",
-                        "message": f"Executed. Rows affected: {cursor.rowcount}"
-                    }
+        result = {"status": "success"}
+        rows = []
+        for msg in iter_query(request):
+            if msg["type"] == "meta":
+                result["columns"] = msg["columns"]
+            elif msg["type"] == "rows":
+                rows.extend(msg["rows"])
+            elif "message" in msg:
+                result["message"] = msg["message"]
+            else:
+                result["rows"] = rows
+                result["next_cursor"] = msg["next_cursor"]
+                result.update({k: msg[k] for k in ("resume_exact", "warning") if k in msg})
+        # Returned as a Response so FastAPI doesn't run jsonable_encoder over every row
+        return FastJSONResponse(result)
+    except HTTPException:
+        raise
     except Exception as e:
         return {"status": "error", "message": str(e)}
+
+def _export_query(request: QueryRequest):
+    """Stream a query's rows as CSV/Parquet/Arrow, or write them to a temp file for later download"""
+    try:
+        export.check_format(request.export)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if request.export_mode not in ("stream", "file"):
+        raise HTTPException(status_code=400, detail="export_mode must be 'stream' or 'file'")
+    if not _is_query(request.sql):
+        raise HTTPException(status_code=400, detail="Only queries (SELECT / WITH) can be exported")
+    request.query_id = request.query_id or queries.new_id()
+
+    if request.export_mode == "file":
+        job = exports.start(iter_query(request), request.export, request.query_id)
+        return {"status": "success", **job.to_dict()}
+    return StreamingResponse(
+        export.iter_export(iter_query(request), request.export),
+        media_type=export.media_type(request.export),
+        headers={
+            "Content-Disposition": f'attachment; filename="{export.filename(request.query_id, request.export)}"',
+            "X-Query-Id": request.query_id,
+        },
+    )
+
+@app.get("/exports/{export_id}")
+def get_export(export_id: str):
+    """Progress of a file export (status running / done / failed, bytes written)"""
+    job = exports.get(export_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No export with id {export_id}")
+    return job.to_dict()
+
+@app.get("/exports/{export_id}/download")
+def download_export(export_id: str):
+    job = exports.get(export_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No export with id {export_id}")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Export is {job.status}" + (f": {job.error}" if job.error else ""))
+    return FileResponse(job.path, media_type=export.media_type(job.format),
+                        filename=export.filename(job.query_id, job.format))
+
+@app.delete("/exports/{export_id}")
+def delete_export(export_id: str):
+    """Cancel a running export, or delete a finished export's file"""
+    job = exports.get(export_id)
+    if job is not None and job.status == "running":
+        queries.cancel(job.query_id)
+    if not exports.remove(export_id):
+        raise HTTPException(status_code=404, detail=f"No export with id {export_id}")
+    return {"status": "success", "message": f"Removed export {export_id}"}
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -60,120 +315,310 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(instrumentation.MetricsMiddleware)
+
+# Global DB Pools
+monitor_pool = None
+editor_pool = None
+diag_pool = None
+# Pools are created lazily from worker threads (collectors, sync endpoints): create each once
+_pool_lock = threading.Lock()
+
+queries = QueryRegistry()
+exports = export.ExportRegistry()
+
+ash_collector = AshCollector()
+topsql_engine = TopSqlEngine()
+session_metrics = SessionMetrics()
+plan_reader = PlanReader()
+blocking_analyzer = BlockingAnalyzer()
+pusher = Pusher(session_metrics, ash_collector, topsql_engine, blocking_analyzer)
+
+def _stressed() -> bool:
+    """Host CPU from the latest session sample is above SCHED_STRESS_CPU"""
+    latest = session_metrics.latest()
+    return latest is not None and latest["cpu_load"] >= SCHED_STRESS_CPU
+
+# ensure_pool is called on the collector's worker thread: a DB that is down never stalls the loop
+scheduler = Scheduler(lambda: ensure_pool(), _stressed)
+scheduler.add("Sessions", session_metrics.collect, SESSION_SAMPLE_INTERVAL, SESSION_COST_BUDGET)
+scheduler.add("ASH", ash_collector.poll, ASH_POLL_INTERVAL, ASH_COST_BUDGET)
+scheduler.add("Top-SQL", topsql_engine.snapshot, TOPSQL_INTERVAL, TOPSQL_COST_BUDGET)
+scheduler.add("Blocking", blocking_analyzer.collect, LOCKS_INTERVAL, LOCKS_COST_BUDGET)
+# Push mode: the server asks for faster sampling in its batch acks while alerts are active
+pusher.on_boost = scheduler.boost
+background_tasks = []
 
-# Global DB Pool
-pool = None
+instrumentation.register_state(lambda: {"monitor": monitor_pool, "editor": editor_pool, "diag": diag_pool}, queries, pusher)
+
+def _create_pool(name, min_size, max_size, **kwargs):
+    try:
+        new_pool = oracledb.create_pool(
+            user=DB_USER,
+            password=DB_PASSWORD,
+            dsn=DB_DSN,
+            min=min_size,
+            max=max_size,
+            increment=1,
+            **kwargs
+        )
+        print(f"Connected to Oracle DB: {DB_DSN} ({name} pool, max={max_size})")
+        return new_pool
+    except Exception as e:
+        print(f"Failed to connect to Oracle DB: {e}")
+        raise HTTPException(status_code=500, detail=f"DB Connection Error: {str(e)}")
+
+def ensure_pool():
+    """Pool for the background collectors"""
+    global monitor_pool
+    if not monitor_pool:
+        with _pool_lock:
+            if not monitor_pool:
+                monitor_pool = _create_pool("monitor", MONITOR_POOL_MIN, MONITOR_POOL_MAX)
+    return monitor_pool
+
+def ensure_editor_pool():
+    """Pool for ad-hoc SQL; callers wait at most EDITOR_QUEUE_TIMEOUT_MS for a free connection"""
+    global editor_pool
+    if not editor_pool:
+        with _pool_lock:
+            if not editor_pool:
+                editor_pool = _create_pool(
+                    "editor", EDITOR_POOL_MIN, EDITOR_POOL_MAX,
+                    getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+                    wait_timeout=EDITOR_QUEUE_TIMEOUT_MS,
+                )
+    return editor_pool
+
+def ensure_diag_pool():
+    """Pool for on-demand diagnostics; callers wait at most DIAG_QUEUE_TIMEOUT_MS for a free connection"""
+    global diag_pool
+    if not diag_pool:
+        with _pool_lock:
+            if not diag_pool:
+                diag_pool = _create_pool(
+                    "diag", DIAG_POOL_MIN, DIAG_POOL_MAX,
+                    getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+                    wait_timeout=DIAG_QUEUE_TIMEOUT_MS,
+                )
+    return diag_pool
+
+def _diagnose(read, *args):
+    """Run a diagnostics read on the diag pool; a busy or unreachable DB is a 503, not a 500"""
+    try:
+        return read(ensure_diag_pool(), *args)
+    except oracledb.Error as e:
+        raise HTTPException(status_code=503, detail=f"Diagnostics query failed: {e}")
 
 async def get_db_connection():
-    global pool
-    if not pool:
-        try:
-            pool = oracledb.create_pool(
-                user=DB_USER,
-                password=DB_PASSWORD,
-                dsn=DB_DSN,
-                min=2,
-                max=5,
-                increment=1
-            )
-            print(f"Connected to Oracle DB: {DB_DSN}")
-        except Exception as e:
-            print(f"Failed to connect to Oracle DB: {e}")
-            raise HTTPException(status_code=500, detail=f"DB Connection Error: {str(e)}")
-    
-    return pool.acquire()
+    return ensure_pool().acquire()
+
+def _pool_stats(p):
+    if not p:
+        return None
+    return {"busy": p.busy, "opened": p.opened, "max": p.max}
 
 @app.on_event("startup")
 async def startup_event():
-    # Attempt connection on startup
+    # Attempt connection on startup (in a thread: a DB that is down can take a while to time out)
     try:
-        await get_db_connection()
+        await asyncio.to_thread(ensure_pool)
+        await asyncio.to_thread(ensure_editor_pool)
     except:
         pass # Allow startup even if DB is down initially
+    # Collectors run on the adaptive scheduler; endpoints read their in-memory state
+    background_tasks.extend(scheduler.start())
+    if PUSH_URL:
+        # Push mode: ship batches to the server instead of waiting to be polled
+        print(f"Push mode enabled -> {PUSH_URL}")
+        background_tasks.append(asyncio.create_task(pusher.run()))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in background_tasks:
+        task.cancel()
 
 @app.get("/")
 def health_check():
-    return {"status": "running", "agent": "oracle-monitoring-agent-v1"}
+    return {"status": "running", "agent": "oracle-monitoring-agent-v1", "ash": ash_collector.status(), "top_sql": topsql_engine.status(),
+            "blocking": blocking_analyzer.status(), "scheduler": scheduler.status(), "push": pusher.status(),
+            "pools": {"monitor": _pool_stats(monitor_pool), "editor": _pool_stats(editor_pool),
+                      "diag": _pool_stats(diag_pool)}}
+
+@app.get("/metrics", include_in_schema=False)
+def get_prometheus_metrics(request: Request):
+    """Prometheus / OpenMetrics exposition of the agent's own metrics"""
+    return instrumentation.metrics_response(request.headers.get("accept", ""))
+
+@app.get("/scheduler")
+def get_scheduler():
+    """Current interval, smoothed query cost and boost state of every collector family"""
+    return scheduler.status()
+
+@app.post("/scheduler/boost")
+def boost_scheduler(seconds: float = SCHED_BOOST_SECONDS, families: Optional[str] = None):
+    """Sample faster for `seconds` (e.g. while an alert is active); `families` is comma-separated"""
+    names = [f.strip() for f in families.split(",")] if families else None
+    unknown = [n for n in names or [] if n not in scheduler.families]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown families {unknown}; known: {list(scheduler.families)}")
+    scheduler.boost(seconds, names)
+    return scheduler.status()
 
 @app.get("/metrics/ash")
-def get_ash_metrics():
-    """
-    Collect Active Session History (ASH) roughly mimicking real-time active sessions.
-    """
-    # Query to get active sessions grouped by wait class
-    sql = """
-    SELECT 
-        TO_CHAR(sample_time, 'HH24:MI') as time_str,
-        wait_class,
-        COUNT(*) as session_count
-    FROM 
-        v$active_session_history
-    WHERE 
-        sample_time > SYSDATE - 1/24/60 # Last 1 minute
-    GROUP BY 
-        TO_CHAR(sample_time, 'HH24:MI'), wait_class
-    ORDER BY 
-        time_str
-    """
-    
-    # Needs real DB execution.
-    # For now, if no DB connection, return error or mock?
-    # User asked for the DAEMON code, so we write REAL code.
-    
-    try:
-        if not pool:
-             raise Exception("DB Pool not initialized")
-             
-        with pool.acquire() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(sql)
-                rows = cursor.fetchall()
-                # Format: [{"time": "10:00", "active_sessions": 10, "wait_class": "CPU"}]
-                result = []
-                for row in rows:
-                    result.append({
-                        "time": row[0],
-                        "wait_class": row[1] if row[1] else "CPU", # NULL often means CPU
-                        "active_sessions": row[2]
-                    })
-                return result
-    except Exception as e:
-         return {"error": str(e), "note": "Ensure Agent is running on DB Server with correct credentials."}
+def get_ash_metrics(granularity: str = "minute", group_by: str = "wait_class",
+                    minutes: Optional[int] = None, limit: Optional[int] = None):
+    """
+    Active Session History aggregated in memory by the background collector.
+    `active_sessions` is the average number of active sessions in each bucket.
+    """
+    if granularity not in ("second", "minute"):
+        raise HTTPException(status_code=400, detail="granularity must be 'second' or 'minute'")
+    if group_by not in GROUP_KEYS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {GROUP_KEYS}")
+    if limit is None and group_by != "wait_class":
+        limit = ASH_TOP_N
+    window = minutes * 60 if minutes else None
+    # Format: [{"time": "10:00", "active_sessions": 10, "wait_class": "CPU"}]
+    return ash_collector.series(granularity, group_by, window, limit)
+
+@app.get("/metrics/sessions")
+def get_session_metrics():
+    """Latest cpu_load / active_sessions / disk_io sample"""
+    return session_metrics.latest() or {}
 
 @app.get("/metrics/top-sql")
-def get_top_sql():
-    """
-    Get Top SQL by Elapsed Time
-    """
-    sql = """
-    SELECT 
-        sql_id,
-        substr(sql_text, 1, 100) as sql_text,
-        elapsed_time / 1000000 as elapsed_sec,
-        cpu_time / 1000000 as cpu_sec,
-        executions,
-        module
-    FROM 
-        v$sql
-    WHERE 
-        elapsed_time > 0
-    ORDER BY 
-        elapsed_time DESC
-    FETCH FIRST 10 ROWS ONLY
-    """
-    
+def get_top_sql(window: str = "5m", order_by: str = "elapsed_time", limit: int = 10, group_by: str = "sql_id"):
+    """
+    Get Top SQL for the last `window` (1m/5m/15m/1h), ranked by per-interval
+    deltas from the v$sql snapshot engine rather than cumulative totals.
+    `group_by=fingerprint|signature` sums statements that differ only in literals.
+    """
+    if window not in TOPSQL_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window must be one of {list(TOPSQL_WINDOWS)}")
+    if order_by not in TOPSQL_STATS:
+        raise HTTPException(status_code=400, detail=f"order_by must be one of {TOPSQL_STATS}")
+    if group_by not in TOPSQL_GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {TOPSQL_GROUP_BY}")
+    return topsql_engine.top(window, order_by, limit, group_by)
+
+@app.get("/metrics/blocking")
+def get_blocking(fresh: bool = False):
+    """
+    Blocking trees (root blockers, chain depth, sessions blocked per root,
+    cycles) from the latest v$session snapshot; `fresh=true` takes a new one.
+    """
+    report = blocking_analyzer.latest
+    if fresh or report is None:
+        report = _diagnose(blocking_analyzer.collect)
+    return report
+
+@app.get("/metrics/sql/{sql_id}")
+def get_sql_stats(sql_id: str, text: bool = True):
+    """
+    Statistics for each plan_hash_value of a statement (v$sqlstats), most
+    recently active first. `text=false` skips the full SQL text.
+    """
+    stats = _diagnose(plan_reader.stats, sql_id, text)
+    if stats is None:
+        raise HTTPException(status_code=404, detail=f"SQL {sql_id} not found in the shared pool")
+    return stats
+
+@app.get("/metrics/sql/{sql_id}/plan/{plan_hash_value}")
+def get_sql_plan(sql_id: str, plan_hash_value: int):
+    """Execution plan lines (v$sql_plan) for one plan of a statement"""
+    plan = _diagnose(plan_reader.plan, sql_id, plan_hash_value)
+    if not plan:
+        raise HTTPException(status_code=404, detail=f"No plan {plan_hash_value} for SQL {sql_id}")
+    return plan
+
+@app.post("/execute-many")
+def execute_many(request: ExecuteManyRequest):
+    """
+    Array DML: run one statement for a batch of bind rows in a single
+    round-trip, then commit. On failure nothing is committed and `row_offset`
+    points at the failing row. On a script session nothing is committed
+    either way, and a failed batch is rolled back to where it started.
+    """
+    numeric = {i for i, t in enumerate(request.types) if t == "n"}
+    rows = request.rows
+    if numeric:
+        rows = [[Decimal(v) if i in numeric and v is not None else v for i, v in enumerate(row)]
+                for row in rows]
+    query_id = request.query_id or queries.new_id()
+    timeout_ms = queries.timeout_for(request.timeout_ms)
     try:
-        if not pool:
-             raise Exception("DB Pool not initialized")
-             
-        with pool.acquire() as conn:
+        with queries.run(ensure_editor_pool(), query_id, request.sql, timeout_ms, request.session_id) as conn:
             with conn.cursor() as cursor:
-                cursor.execute(sql)
-                columns = [col[0].lower() for col in cursor.description]
-                rows = cursor.fetchall()
-                return [dict(zip(columns, row)) for row in rows]
+                if request.session_id is None:
+                    cursor.executemany(request.sql, rows)
+                    row_count = cursor.rowcount
+                    conn.commit()
+                else:
+                    row_count = _execute_many_in_session(cursor, request.sql, rows)
+        return {"status": "success", "query_id": query_id, "row_count": row_count,
+                "message": f"Executed. Rows affected: {row_count}"}
+    except oracledb.Error as e:
+        error = e.args[0] if e.args else None
+        return {"status": "error", "query_id": query_id,
+                "message": queries.describe_error(query_id, e, timeout_ms),
+                "row_offset": getattr(error, "offset", None)}
+    except HTTPException:
+        raise
     except Exception as e:
-        return {"error": str(e)}
+        return {"status": "error", "query_id": query_id, "message": str(e)}
+
+def _execute_many_in_session(cursor, sql: str, rows) -> int:
+    # Rows before a failing one would stay in the session's transaction: the batch
+    # stands for consecutive INSERT statements of a script and is all or nothing
+    cursor.execute("SAVEPOINT oms_batch")
+    try:
+        cursor.executemany(sql, rows)
+    except oracledb.Error:
+        try:
+            cursor.execute("ROLLBACK TO SAVEPOINT oms_batch")
+        except oracledb.Error as e:
+            print(f"Rollback of failed batch failed: {e}")
+        raise
+    return cursor.rowcount
+
+@app.post("/sessions")
+def open_session():
+    """
+    Hold an editor connection for a script. Statements sent with its
+    session_id share session state (ALTER SESSION, temporary tables) and one
+    transaction, which DELETE /sessions/{id} commits or rolls back. Sessions
+    left idle for EDITOR_SESSION_IDLE_SECONDS are rolled back.
+    """
+    try:
+        return {"status": "success", "session_id": queries.open_session(ensure_editor_pool())}
+    except oracledb.Error as e:
+        raise HTTPException(status_code=503, detail=queries.describe_error("session", e, 0))
+
+@app.delete("/sessions/{session_id}")
+def close_session(session_id: str, commit: bool = False):
+    """End a script session: commit (or roll back) its transaction and release the connection"""
+    try:
+        closed = queries.close_session(session_id, commit)
+    except oracledb.Error as e:
+        return {"status": "error", "committed": False, "message": str(e)}
+    if not closed:
+        raise HTTPException(status_code=404, detail=f"No open session with id {session_id}")
+    return {"status": "success", "committed": commit}
+
+@app.get("/queries")
+def list_queries():
+    """Running/queued ad-hoc statements, queue wait percentiles and pool usage"""
+    return {**queries.status(),
+            "pools": {"monitor": _pool_stats(monitor_pool), "editor": _pool_stats(editor_pool),
+                      "diag": _pool_stats(diag_pool)}}
+
+@app.post("/queries/{query_id}/cancel")
+def cancel_query(query_id: str):
+    """Interrupt a running ad-hoc statement (the caller receives ORA-01013)"""
+    if not queries.cancel(query_id):
+        raise HTTPException(status_code=404, detail=f"No running query with id {query_id}")
+    return {"status": "success", "message": f"Cancel sent to {query_id}"}
 
 if __name__ == "__main__":
     # Run Agent on Port 8001 (Distinct from Server 8000)
@@ -0,0 +1,112 @@
+import os
+from typing import List, Optional
+
+# Cap on plan lines returned for one plan (huge generated SQL can have thousands)
+PLAN_MAX_LINES = int(os.getenv("PLAN_MAX_LINES", "2000"))
+
+# v$sqlstats: one row per (sql_id, plan_hash_value), read without library-cache latches
+SQLSTATS_SQL = """
+SELECT
+    plan_hash_value,
+    executions,
+    elapsed_time,
+    cpu_time,
+    buffer_gets,
+    disk_reads,
+    rows_processed,
+    last_active_time
+FROM
+    v$sqlstats
+WHERE
+    sql_id = :sql_id
+ORDER BY
+    last_active_time DESC
+"""
+
+SQLTEXT_SQL = """
+SELECT sql_fulltext FROM v$sqlstats WHERE sql_id = :sql_id AND ROWNUM = 1
+"""
+
+# Any child cursor with this plan hash has the same plan; read the lowest one
+PLAN_SQL = """
+SELECT
+    id,
+    parent_id,
+    depth,
+    operation,
+    options,
+    object_owner,
+    object_name,
+    cost,
+    cardinality,
+    bytes,
+    access_predicates,
+    filter_predicates
+FROM
+    v$sql_plan
+WHERE
+    sql_id = :sql_id
+    AND plan_hash_value = :plan_hash_value
+    AND child_number = (
+        SELECT MIN(child_number) FROM v$sql_plan
+        WHERE sql_id = :sql_id AND plan_hash_value = :plan_hash_value
+    )
+ORDER BY
+    id
+"""
+
+
+class PlanReader:
+    """
+    Reads SQL statistics and execution plans on demand. Stats change all the
+    time; a plan for a given plan_hash_value never does, so the server caches
+    plans and only asks for the ones it has not seen.
+    """
+
+    def stats(self, pool, sql_id: str, with_text: bool = True) -> Optional[dict]:
+        with pool.acquire() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(SQLSTATS_SQL, sql_id=sql_id)
+                rows = cursor.fetchall()
+                if not rows:
+                    return None
+                text = None
+                if with_text:
+                    cursor.execute(SQLTEXT_SQL, sql_id=sql_id)
+                    row = cursor.fetchone()
+                    if row and row[0] is not None:
+                        text = row[0].read() if hasattr(row[0], "read") else row[0]
+        return {
+            "sql_id": sql_id,
+            "sql_text": text,
+            "plans": [{
+                "plan_hash_value": phv,
+                "executions": executions or 0,
+                # v$sqlstats times are microseconds
+                "elapsed_time": round((elapsed or 0) / 1e6, 3),
+                "cpu_time": round((cpu or 0) / 1e6, 3),
+                "buffer_gets": buffer_gets or 0,
+                "disk_reads": disk_reads or 0,
+                "rows_processed": rows_processed or 0,
+                "last_active_time": last_active.timestamp() if last_active else None,
+            } for phv, executions, elapsed, cpu, buffer_gets, disk_reads, rows_processed, last_active in rows],
+        }
+
+    def plan(self, pool, sql_id: str, plan_hash_value: int) -> List[dict]:
+        with pool.acquire() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(PLAN_SQL, sql_id=sql_id, plan_hash_value=plan_hash_value)
+                rows = cursor.fetchmany(PLAN_MAX_LINES)
+        return [{
+            "id": line_id,
+            "parent_id": parent_id,
+            "depth": depth,
+            "operation": operation,
+            "options": options or "",
+            "object": f"{owner}.{name}" if owner and name else (name or ""),
+            "cost": cost,
+            "cardinality": cardinality,
+            "bytes": nbytes,
+            "access_predicates": access,
+            "filter_predicates": filt,
+        } for line_id, parent_id, depth, operation, options, owner, name, cost, cardinality, nbytes, access, filt in rows]
@@ -0,0 +1,220 @@
+import os
+import gzip
+import json
+import time
+import socket
+import asyncio
+from typing import List, Optional
+
+import httpx
+
+from spool import Spool, SpoolRecord
+
+# --- Push mode settings (disabled unless PUSH_URL is set) ---
+PUSH_URL = os.getenv("PUSH_URL")                      # e.g. http://monitoring-server:8000
+AGENT_ID = os.getenv("AGENT_ID", socket.gethostname())
+PUSH_TARGET = os.getenv("PUSH_TARGET", AGENT_ID)      # target id on the server
+PUSH_INTERVAL = float(os.getenv("PUSH_INTERVAL", "10"))
+PUSH_TIMEOUT = float(os.getenv("PUSH_TIMEOUT", "10"))
+# Backlog replay after an outage, in batches per second (keeps the server from being flooded)
+PUSH_REPLAY_RATE = float(os.getenv("PUSH_REPLAY_RATE", "5"))
+# Sent as X-Ingest-Token; must match the server's INGEST_TOKEN when that is set
+PUSH_TOKEN = os.getenv("PUSH_TOKEN")
+
+# Responses worth retrying; any other 4xx means the server will never accept the batch.
+# 401/403 are a configuration problem (token), not a bad batch: keep it until that is fixed
+RETRY_STATUSES = {401, 403, 408, 429}
+
+# Optional faster codecs; JSON + gzip are always available
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def encode_batch(batch: dict):
+    """Serialize + compress a batch; returns (body, content_type, content_encoding)"""
+    if msgpack is not None:
+        raw, content_type = msgpack.packb(batch, use_bin_type=True), "application/msgpack"
+    else:
+        raw, content_type = json.dumps(batch, separators=(",", ":")).encode(), "application/json"
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(raw), content_type, "zstd"
+    return gzip.compress(raw, compresslevel=6), content_type, "gzip"
+
+
+class Pusher:
+    """
+    Agent-side sampling loop output: every PUSH_INTERVAL the samples collected
+    since the last batch (session metrics, closed ASH minutes, Top-SQL
+    interval deltas, blocking summaries) are packed into one compressed batch with a sequence
+    number and POSTed to the server's ingest endpoint.
+
+    Batches are sent strictly in order and only dropped once the server acks
+    (or permanently rejects) them, so a retry after a lost response is
+    recognised as a duplicate.
+    A batch that cannot be delivered goes to the on-disk spool, and every
+    later batch queues behind it until the backlog has been replayed.
+    """
+
+    def __init__(self, sessions, ash, topsql, blocking):
+        self.sessions = sessions
+        self.ash = ash
+        self.topsql = topsql
+        self.blocking = blocking
+        # (agent_id, epoch) identifies this process' sequence space
+        self.epoch = int(time.time() * 1000)
+        self.seq = 0
+        self.cursor = {"sessions": time.time(), "ash": time.time(), "top_sql": time.time(), "blocking": time.time()}
+        self.spool: Optional[Spool] = None
+        self.sent = 0
+        self.replayed = 0
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+        self.last_ack: Optional[int] = None
+        # Called with seconds when the server's ack asks for faster sampling
+        self.on_boost = None
+
+    def collect(self) -> List[dict]:
+        samples = []
+        for s in self.sessions.since(self.cursor["sessions"]):
+            samples.append({"kind": "session_metrics", "ts": s["ts"], "data": s})
+            self.cursor["sessions"] = s["ts"]
+        for ts, counts in self.ash.closed_minutes(self.cursor["ash"]):
+            samples.append({"kind": "ash", "ts": ts, "data": counts})
+            self.cursor["ash"] = ts
+        for end, seconds, rows, groups in self.topsql.intervals_since(self.cursor["top_sql"]):
+            samples.append({"kind": "top_sql", "ts": end, "seconds": seconds, "data": rows, "groups": groups})
+            self.cursor["top_sql"] = end
+        summaries = self.blocking.since(self.cursor["blocking"])
+        for s in summaries:
+            samples.append({"kind": "blocking", "ts": s["ts"], "data": s})
+            self.cursor["blocking"] = s["ts"]
+        latest = self.blocking.latest
+        if summaries and latest is not None and latest["ts"] == summaries[-1]["ts"]:
+            # Only the newest snapshot carries its trees
+            samples[-1]["data"] = latest
+        return samples
+
+    def make_batch(self, samples: List[dict]) -> dict:
+        self.seq += 1
+        return {
+            "agent_id": AGENT_ID,
+            "target": PUSH_TARGET,
+            "epoch": self.epoch,
+            "seq": self.seq,
+            "created": time.time(),
+            "samples": samples,
+        }
+
+    def encode(self, batch: dict) -> SpoolRecord:
+        body, content_type, encoding = encode_batch(batch)
+        return SpoolRecord(body, content_type, encoding, batch["epoch"], batch["seq"])
+
+    async def send(self, client: httpx.AsyncClient, record: SpoolRecord) -> bool:
+        """
+        True once the batch is done with: acked, or rejected for good (malformed,
+        too large, failed validation) so it does not block every later batch.
+        False when it should be retried.
+        """
+        try:
+            resp = await client.post(
+                f"{PUSH_URL.rstrip('/')}/api/ingest/batch",
+                content=record.body,
+                headers={
+                    "Content-Type": record.content_type,
+                    "Content-Encoding": record.encoding,
+                    "X-Agent-Id": AGENT_ID,
+                    "X-Batch-Epoch": str(record.epoch),
+                    "X-Batch-Seq": str(record.seq),
+                    **({"X-Ingest-Token": PUSH_TOKEN} if PUSH_TOKEN else {}),
+                },
+            )
+        except httpx.HTTPError as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            return False
+        if resp.status_code != 200:
+            self.last_error = f"HTTP {resp.status_code}: {resp.text[:200]}"
+            if resp.status_code >= 500 or resp.status_code in RETRY_STATUSES:
+                return False
+            print(f"Push batch {record.epoch}/{record.seq} rejected, dropping it: {self.last_error}")
+            self.rejected += 1
+            return True
+        ack = resp.json()
+        self.last_ack = ack.get("ack")
+        if ack.get("boost") and self.on_boost is not None:
+            self.on_boost(float(ack["boost"]))
+        self.last_error = None
+        self.sent += 1
+        return True
+
+    async def replay(self, client: httpx.AsyncClient) -> bool:
+        """
+        Send spooled batches in order at PUSH_REPLAY_RATE, within one push
+        interval; True once drained. Batches are paced against a schedule, so
+        send time counts towards the gap rather than adding to it.
+        """
+        budget = max(1, int(PUSH_REPLAY_RATE * PUSH_INTERVAL))
+        started = time.monotonic()
+        for i in range(budget):
+            delay = started + i / PUSH_REPLAY_RATE - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # Spool reads and cursor writes are disk I/O: keep them off the event loop
+            record = await asyncio.to_thread(self.spool.peek)
+            if record is None:
+                return True
+            if not await self.send(client, record):
+                return False
+            await asyncio.to_thread(self.spool.ack)
+            self.replayed += 1
+        return self.spool.is_empty()
+
+    async def tick(self, client: httpx.AsyncClient):
+        samples = self.collect()
+        record = self.encode(self.make_batch(samples)) if samples else None
+        # Only send live when nothing older is waiting, so the server sees batches in order
+        drained = await self.replay(client)
+        if record is not None and not (drained and await self.send(client, record)):
+            await asyncio.to_thread(self.spool.append, record)
+        await asyncio.to_thread(self.spool.sync)
+
+    async def run(self):
+        self.spool = await asyncio.to_thread(Spool)
+        if not self.spool.is_empty():
+            print(f"Spool holds {self.spool.pending_bytes} bytes from a previous run; replaying")
+        try:
+            async with httpx.AsyncClient(timeout=PUSH_TIMEOUT) as client:
+                elapsed = 0.0
+                while True:
+                    # A tick spent replaying counts towards the interval, so replay keeps its rate
+                    await asyncio.sleep(max(0.0, PUSH_INTERVAL - elapsed))
+                    started = time.monotonic()
+                    try:
+                        await self.tick(client)
+                    except Exception as e:
+                        self.last_error = str(e)
+                        print(f"Push failed: {e}")
+                    elapsed = time.monotonic() - started
+        finally:
+            self.spool.close()
+
+    def status(self):
+        return {
+            "enabled": bool(PUSH_URL),
+            "url": PUSH_URL,
+            "agent_id": AGENT_ID,
+            "target": PUSH_TARGET,
+            "seq": self.seq,
+            "last_ack": self.last_ack,
+            "sent": self.sent,
+            "replayed": self.replayed,
+            "rejected_batches": self.rejected,
+            "last_error": self.last_error,
+            "spool": self.spool.status() if self.spool else None,
+            "codec": f"{'msgpack' if msgpack else 'json'}+{'zstd' if zstandard else 'gzip'}",
+        }
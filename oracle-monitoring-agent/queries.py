@@ -0,0 +1,262 @@
+import os
+import time
+import uuid
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import instrumentation
+
+# --- Ad-hoc (editor) query limits ---
+EDITOR_CALL_TIMEOUT_MS = int(os.getenv("EDITOR_CALL_TIMEOUT_MS", "60000"))     # per round-trip
+EDITOR_MAX_TIMEOUT_MS = int(os.getenv("EDITOR_MAX_TIMEOUT_MS", "600000"))      # cap on client-requested timeouts
+EDITOR_QUEUE_TIMEOUT_MS = int(os.getenv("EDITOR_QUEUE_TIMEOUT_MS", "5000"))    # wait for a free editor connection
+# Script sessions left unused this long (client gone) are rolled back and their connection released
+EDITOR_SESSION_IDLE_SECONDS = int(os.getenv("EDITOR_SESSION_IDLE_SECONDS", "300"))
+
+# Oracle / driver error codes for a statement that was stopped
+TIMEOUT_CODES = ("DPY-4024", "ORA-03156", "DPY-4011")
+CANCEL_CODES = ("ORA-01013",)
+POOL_TIMEOUT_CODES = ("DPY-4005",)
+
+
+def error_code(e: Exception) -> str:
+    error = e.args[0] if e.args else None
+    return getattr(error, "full_code", "") or ""
+
+
+class RunningQuery:
+    __slots__ = ("query_id", "sql", "conn", "queued_at", "started_at", "queue_wait_ms", "timeout_ms", "cancelled")
+
+    def __init__(self, query_id: str, sql: str, timeout_ms: int):
+        self.query_id = query_id
+        self.sql = sql
+        self.conn = None
+        self.queued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.queue_wait_ms: Optional[float] = None
+        self.timeout_ms = timeout_ms
+        self.cancelled = False
+
+    def to_dict(self, now: float):
+        return {
+            "query_id": self.query_id,
+            "sql": self.sql[:200],
+            "state": "RUNNING" if self.started_at else "QUEUED",
+            "queue_wait_ms": self.queue_wait_ms,
+            "running_ms": round((now - self.started_at) * 1000, 1) if self.started_at else None,
+            "timeout_ms": self.timeout_ms,
+            "cancelled": self.cancelled,
+        }
+
+
+class ScriptSession:
+    """An editor connection held across requests, so a script's statements share one session"""
+    __slots__ = ("session_id", "pool", "conn", "lock", "opened_at", "last_used")
+
+    def __init__(self, session_id: str, pool, conn):
+        self.session_id = session_id
+        self.pool = pool
+        self.conn = conn
+        self.lock = threading.Lock()      # one statement at a time
+        self.opened_at = self.last_used = time.time()
+
+    def to_dict(self, now: float):
+        return {
+            "session_id": self.session_id,
+            "open_seconds": round(now - self.opened_at, 1),
+            "idle_seconds": round(now - self.last_used, 1),
+            "busy": self.lock.locked(),
+        }
+
+
+class QueryRegistry:
+    """
+    Tracks ad-hoc statements on the editor pool: queue wait for a connection,
+    per-round-trip call timeouts, and cancellation by query id from another
+    request (Connection.cancel() interrupts the statement in progress).
+
+    Script sessions keep one editor connection for a whole script: ALTER
+    SESSION, temporary tables and the transaction carry from one statement to
+    the next, and only closing the session commits (or rolls back).
+    """
+
+    def __init__(self):
+        self.active: Dict[str, RunningQuery] = {}
+        self.sessions: Dict[str, ScriptSession] = {}
+        self.queue_waits: deque = deque(maxlen=500)
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def timeout_for(requested_ms: Optional[int]) -> int:
+        if not requested_ms or requested_ms <= 0:
+            return EDITOR_CALL_TIMEOUT_MS
+        return min(requested_ms, EDITOR_MAX_TIMEOUT_MS)
+
+    def _acquire(self, pool):
+        try:
+            return pool.acquire()
+        except Exception as e:
+            if error_code(e) in POOL_TIMEOUT_CODES:
+                self.rejected += 1
+            raise
+
+    @contextmanager
+    def run(self, pool, query_id: str, sql: str, timeout_ms: int, session_id: Optional[str] = None):
+        """
+        Acquire an editor connection for `query_id` (or use script session
+        `session_id`'s) and yield it with call_timeout applied
+        """
+        session = self.session(session_id) if session_id is not None else None
+        q = RunningQuery(query_id, sql, timeout_ms)
+        with self._lock:
+            if query_id in self.active:
+                raise ValueError(f"Query id already running: {query_id}")
+            self.active[query_id] = q
+        try:
+            started = time.perf_counter()
+            if session is None:
+                self.reap_sessions()
+                conn = self._acquire(pool)
+            else:
+                session.lock.acquire()
+                if session_id not in self.sessions:
+                    # Closed (or reaped) while we waited for it
+                    session.lock.release()
+                    raise ValueError(f"Unknown or expired session: {session_id}")
+                conn = session.conn
+            acquired = time.perf_counter()
+            q.queue_wait_ms = round((acquired - started) * 1000, 1)
+            self.queue_waits.append(q.queue_wait_ms)
+            instrumentation.EDITOR_QUEUE_WAIT.observe(acquired - started)
+            outcome = "failed"
+            try:
+                conn.call_timeout = timeout_ms
+                q.conn = conn
+                q.started_at = time.time()
+                if q.cancelled:
+                    raise RuntimeError("Query cancelled")
+                yield conn
+                self.completed += 1
+                outcome = "completed"
+            except Exception as e:
+                code = error_code(e)
+                if q.cancelled or code in CANCEL_CODES:
+                    self.cancelled += 1
+                    outcome = "cancelled"
+                elif code in TIMEOUT_CODES:
+                    self.timed_out += 1
+                    outcome = "timed_out"
+                else:
+                    self.failed += 1
+                raise
+            finally:
+                instrumentation.EDITOR_LATENCY.labels(outcome).observe(time.perf_counter() - acquired)
+                q.conn = None
+                conn.call_timeout = 0
+                if session is None:
+                    pool.release(conn)
+                else:
+                    session.last_used = time.time()
+                    session.lock.release()
+        finally:
+            with self._lock:
+                self.active.pop(query_id, None)
+
+    def open_session(self, pool) -> str:
+        """Take an editor connection for a script; statements sent with the id run on it"""
+        self.reap_sessions()
+        session = ScriptSession(self.new_id(), pool, self._acquire(pool))
+        with self._lock:
+            self.sessions[session.session_id] = session
+        return session.session_id
+
+    def session(self, session_id: str) -> ScriptSession:
+        with self._lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            raise ValueError(f"Unknown or expired session: {session_id}")
+        return session
+
+    def close_session(self, session_id: str, commit: bool = False) -> bool:
+        """Commit or roll back a script session's transaction and release its connection"""
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        # Waits for a statement still running on it (cancel it first to stop sooner)
+        with session.lock:
+            try:
+                if commit:
+                    session.conn.commit()
+                else:
+                    session.conn.rollback()
+            finally:
+                session.pool.release(session.conn)
+        return True
+
+    def reap_sessions(self):
+        """Roll back sessions whose client stopped using them"""
+        cutoff = time.time() - EDITOR_SESSION_IDLE_SECONDS
+        with self._lock:
+            idle = [s.session_id for s in self.sessions.values() if not s.lock.locked() and s.last_used < cutoff]
+        for session_id in idle:
+            try:
+                self.close_session(session_id, commit=False)
+                print(f"Rolled back idle script session {session_id}")
+            except Exception as e:
+                print(f"Closing idle script session {session_id} failed: {e}")
+
+    def cancel(self, query_id: str) -> bool:
+        with self._lock:
+            q = self.active.get(query_id)
+        if q is None:
+            return False
+        q.cancelled = True
+        conn = q.conn
+        if conn is not None:
+            conn.cancel()
+        return True
+
+    def describe_error(self, query_id: str, e: Exception, timeout_ms: int) -> str:
+        code = error_code(e)
+        if code in CANCEL_CODES or str(e) == "Query cancelled":
+            return f"Query {query_id} was cancelled"
+        if code in TIMEOUT_CODES:
+            return f"Query {query_id} exceeded the call timeout of {timeout_ms} ms"
+        if code in POOL_TIMEOUT_CODES:
+            return f"All editor connections are busy (waited {EDITOR_QUEUE_TIMEOUT_MS} ms); try again later"
+        return str(e)
+
+    def status(self):
+        now = time.time()
+        waits = sorted(self.queue_waits)
+        self.reap_sessions()
+        with self._lock:
+            active = [q.to_dict(now) for q in self.active.values()]
+            sessions = [s.to_dict(now) for s in self.sessions.values()]
+        return {
+            "active": active,
+            "sessions": sessions,
+            "queue_wait_ms": {
+                "samples": len(waits),
+                "p50": waits[len(waits) // 2] if waits else None,
+                "p95": waits[int(len(waits) * 0.95)] if waits else None,
+                "max": waits[-1] if waits else None,
+            },
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,135 @@
+"""
+Adaptive collector scheduler.
+
+Every metric family has a base interval and a query-cost budget: the share
+of wall time its queries may take. Before each run the next interval is
+worked out from
+
+    base            the family's configured interval
+    / BOOST         while an alert is active on the server (POST /scheduler/boost)
+    * STRESS        while the host is under stress and no boost is active
+    >= cost floor   smoothed run time / budget, so slow queries slow the family down
+    +- jitter       so agents (and families) never poll in lockstep
+"""
+import os
+import time
+import random
+import asyncio
+from typing import Callable, Dict, Iterable, Optional
+
+import instrumentation
+
+SCHED_JITTER = float(os.getenv("SCHED_JITTER", "0.1"))                # +-10% per run
+SCHED_MIN_INTERVAL = float(os.getenv("SCHED_MIN_INTERVAL", "1"))
+SCHED_MAX_INTERVAL = float(os.getenv("SCHED_MAX_INTERVAL", "300"))
+SCHED_BOOST_FACTOR = float(os.getenv("SCHED_BOOST_FACTOR", "2"))
+SCHED_BOOST_SECONDS = float(os.getenv("SCHED_BOOST_SECONDS", "300"))
+SCHED_STRESS_FACTOR = float(os.getenv("SCHED_STRESS_FACTOR", "2"))
+SCHED_STRESS_CPU = float(os.getenv("SCHED_STRESS_CPU", "90"))          # host CPU % counted as stress
+SCHED_COST_ALPHA = 0.3                                                  # EWMA weight of the latest run
+
+
+class Family:
+    """One metric family: a blocking collect(pool) callable, its base interval and cost budget"""
+
+    def __init__(self, name: str, collect: Callable, interval: float, budget: float = 0.05):
+        self.name = name
+        self.collect = collect
+        self.base_interval = interval
+        self.budget = budget
+        self.interval = interval
+        self.cost: Optional[float] = None     # smoothed run time, seconds
+        self.boosted_until = 0.0
+        self.runs = 0
+        self.errors = 0
+        self.last_run: Optional[float] = None
+
+    def observe(self, seconds: float):
+        self.cost = seconds if self.cost is None else (1 - SCHED_COST_ALPHA) * self.cost + SCHED_COST_ALPHA * seconds
+
+    def next_interval(self, stressed: bool, now: float) -> float:
+        if now < self.boosted_until:
+            interval = self.base_interval / SCHED_BOOST_FACTOR
+        elif stressed:
+            interval = self.base_interval * SCHED_STRESS_FACTOR
+        else:
+            interval = self.base_interval
+        if self.cost is not None and self.budget > 0:
+            interval = max(interval, self.cost / self.budget)
+        self.interval = min(max(interval, SCHED_MIN_INTERVAL), SCHED_MAX_INTERVAL)
+        return self.interval
+
+    def status(self, now: float) -> dict:
+        return {
+            "base_interval": self.base_interval,
+            "interval": round(self.interval, 2),
+            "budget": self.budget,
+            "cost_ms": round(self.cost * 1000, 1) if self.cost is not None else None,
+            "boosted": now < self.boosted_until,
+            "runs": self.runs,
+            "errors": self.errors,
+            "last_run": self.last_run,
+        }
+
+
+class Scheduler:
+    """
+    Runs each family in its own task on a worker thread. `pool` returns the
+    monitor pool (and may block creating it, so it is called on that thread
+    too); `stressed` reports whether the target is under stress.
+    """
+
+    def __init__(self, pool: Callable, stressed: Callable[[], bool] = lambda: False):
+        self.pool = pool
+        self.stressed = stressed
+        self.families: Dict[str, Family] = {}
+
+    def add(self, name: str, collect: Callable, interval: float, budget: float = 0.05) -> Family:
+        family = self.families[name] = Family(name, collect, interval, budget)
+        return family
+
+    def boost(self, seconds: float = SCHED_BOOST_SECONDS, families: Optional[Iterable[str]] = None):
+        """Sample faster for `seconds` (all families unless named); the next run is pulled forward"""
+        until = time.time() + seconds
+        for name in families or self.families:
+            family = self.families.get(name)
+            if family is not None:
+                family.boosted_until = max(family.boosted_until, until)
+
+    def _collect(self, family: Family):
+        family.collect(self.pool())
+
+    async def _loop(self, family: Family):
+        latency = instrumentation.COLLECTOR_LATENCY.labels(family.name)
+        errors = instrumentation.COLLECTOR_ERRORS.labels(family.name)
+        # Random phase so families (and agents started together) spread out
+        await asyncio.sleep(random.uniform(0, family.base_interval))
+        while True:
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._collect, family)
+                latency.observe(time.perf_counter() - started)
+            except Exception as e:
+                family.errors += 1
+                errors.inc()
+                print(f"{family.name} collection failed: {e}")
+            family.observe(time.perf_counter() - started)
+            family.runs += 1
+            family.last_run = time.time()
+            interval = family.next_interval(self.stressed(), family.last_run)
+            deadline = time.time() + interval * random.uniform(1 - SCHED_JITTER, 1 + SCHED_JITTER)
+            # Sleep in short steps so a boost takes effect without waiting out a long interval
+            while time.time() < deadline:
+                await asyncio.sleep(min(1.0, deadline - time.time()))
+                if family.boosted_until > time.time():
+                    deadline = min(deadline, family.last_run + family.next_interval(False, time.time()))
+
+    def start(self) -> list:
+        return [asyncio.create_task(self._loop(f)) for f in self.families.values()]
+
+    def status(self) -> dict:
+        now = time.time()
+        return {
+            "stressed": self.stressed(),
+            "families": {name: f.status(now) for name, f in self.families.items()},
+        }
@@ -0,0 +1,72 @@
+"""
+JSON encoding of editor results.
+
+orjson is used when installed: str, int, float and datetime columns are
+encoded natively, so the per-value hook below only runs for the few types
+JSON has no form for (LOB locators, RAW bytes, INTERVAL, Decimal). Without
+orjson the stdlib json module is used with the same hook.
+
+Result rows are returned as a ready-made FastJSONResponse, which skips
+FastAPI's jsonable_encoder walk over every row.
+"""
+import json
+import datetime
+from decimal import Decimal
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _value(obj):
+    if hasattr(obj, "read"):            # CLOB / NCLOB / BLOB locator
+        obj = obj.read()
+        if isinstance(obj, str):
+            return obj
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.hex().upper()         # RAW is shown as hex, like SQL*Plus
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, datetime.timedelta):
+        return obj.total_seconds()
+    return None
+
+
+def _default(obj):
+    value = _value(obj)
+    if value is None:
+        if isinstance(obj, (datetime.date, datetime.time)):
+            return obj.isoformat()
+        return str(obj)
+    return value
+
+
+def _line_default(obj):
+    # NDJSON lines keep their historical format: dates as str() ("2023-01-01 12:00:00")
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return str(obj)
+    value = _value(obj)
+    return str(obj) if value is None else value
+
+
+if orjson is not None:
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def dumps_line(obj) -> bytes:
+        return orjson.dumps(obj, default=_line_default,
+                            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_APPEND_NEWLINE)
+else:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+    def dumps_line(obj) -> bytes:
+        return json.dumps(obj, default=_line_default, ensure_ascii=False).encode() + b"\n"
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,77 @@
+import os
+import time
+import threading
+from collections import deque
+from typing import Optional
+
+# --- Session / system metric sampling ---
+SESSION_SAMPLE_INTERVAL = float(os.getenv("SESSION_SAMPLE_INTERVAL", "5"))
+SESSION_COST_BUDGET = float(os.getenv("SESSION_COST_BUDGET", "0.02"))   # share of wall time samples may take
+SESSION_KEEP_SAMPLES = int(os.getenv("SESSION_KEEP_SAMPLES", "720"))
+
+SESSION_SQL = """
+SELECT count(*) FROM v$session WHERE status = 'ACTIVE' AND type != 'BACKGROUND'
+"""
+
+# Latest 60s values from the system metric history (group 2)
+SYSMETRIC_SQL = """
+SELECT
+    metric_name,
+    value
+FROM
+    v$sysmetric
+WHERE
+    group_id = 2
+    AND metric_name IN (
+        'Host CPU Utilization (%)',
+        'Average Active Sessions',
+        'Physical Read Total Bytes Per Sec',
+        'Physical Write Total Bytes Per Sec'
+    )
+"""
+
+
+# Host memory, for memory_usage (%)
+OSSTAT_SQL = """
+SELECT stat_name, value FROM v$osstat WHERE stat_name IN ('PHYSICAL_MEMORY_BYTES', 'FREE_MEMORY_BYTES')
+"""
+
+
+class SessionMetrics:
+    """Periodic dashboard-style samples (cpu_load, memory_usage, active_sessions, disk_io) kept in a bounded buffer"""
+
+    def __init__(self):
+        self.samples: deque = deque(maxlen=SESSION_KEEP_SAMPLES)
+        self._lock = threading.Lock()
+
+    def collect(self, pool):
+        with pool.acquire() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(SESSION_SQL)
+                active_sessions = cursor.fetchone()[0]
+                cursor.execute(SYSMETRIC_SQL)
+                metrics = dict(cursor.fetchall())
+                cursor.execute(OSSTAT_SQL)
+                osstat = dict(cursor.fetchall())
+        physical = osstat.get("PHYSICAL_MEMORY_BYTES")
+        free = osstat.get("FREE_MEMORY_BYTES")
+        sample = {
+            "ts": time.time(),
+            "cpu_load": round(metrics.get("Host CPU Utilization (%)", 0.0), 1),
+            "memory_usage": round(100 * (1 - free / physical), 1) if physical and free is not None else None,
+            "active_sessions": active_sessions,
+            "average_active_sessions": round(metrics.get("Average Active Sessions", 0.0), 2),
+            # MB/s, same unit as the dashboard
+            "disk_io": round((metrics.get("Physical Read Total Bytes Per Sec", 0.0)
+                              + metrics.get("Physical Write Total Bytes Per Sec", 0.0)) / 1048576, 1),
+        }
+        with self._lock:
+            self.samples.append(sample)
+
+    def latest(self) -> Optional[dict]:
+        with self._lock:
+            return self.samples[-1] if self.samples else None
+
+    def since(self, after_ts: float):
+        with self._lock:
+            return [s for s in self.samples if s["ts"] > after_ts]
@@ -0,0 +1,247 @@
+import os
+import json
+import zlib
+import struct
+from typing import List, NamedTuple, Optional
+
+# --- Outage spool settings ---
+SPOOL_DIR = os.getenv("SPOOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "spool"))
+SPOOL_SEGMENT_BYTES = int(os.getenv("SPOOL_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+SPOOL_MAX_BYTES = int(os.getenv("SPOOL_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Frame: body length, crc32(body), epoch, seq, content-type code, encoding code
+HEADER = struct.Struct("<IIqqBB")
+CONTENT_TYPES = ("application/json", "application/msgpack")
+ENCODINGS = ("identity", "gzip", "zstd")
+CURSOR_FILE = "cursor.json"
+
+
+class SpoolRecord(NamedTuple):
+    """One encoded batch, exactly as it will be POSTed"""
+    body: bytes
+    content_type: str
+    encoding: str
+    epoch: int
+    seq: int
+
+
+def _segment_name(n: int) -> str:
+    return f"{n:012d}.seg"
+
+
+class Spool:
+    """
+    Append-only, segment-rotated on-disk queue of encoded batches.
+
+    Batches are appended to the newest segment and read back in order from
+    a persisted (segment, offset) cursor. Fully acknowledged segments are
+    deleted; when the spool exceeds SPOOL_MAX_BYTES the oldest segments are
+    dropped, even if unsent. append() only hands bytes to the OS; the owner
+    fsyncs with sync() once per push interval. A torn record at the tail after
+    a crash is truncated on open. The cursor itself is not fsync'ed: replaying
+    a batch twice is harmless because the server dedups on (agent_id, epoch, seq).
+
+    Every method does blocking file I/O: call them from a worker thread, one
+    at a time.
+    """
+
+    def __init__(self, directory: str = SPOOL_DIR, segment_bytes: int = SPOOL_SEGMENT_BYTES,
+                 max_bytes: int = SPOOL_MAX_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self.segments: List[int] = sorted(
+            int(name[:-4]) for name in os.listdir(directory) if name.endswith(".seg")
+        )
+        self.sizes = {}
+        for n in self.segments:
+            self.sizes[n] = os.path.getsize(self._path(n))
+        if self.segments:
+            self._recover_tail(self.segments[-1])
+        else:
+            self._new_segment_file(1)
+
+        self.read_segment, self.read_offset = self._load_cursor()
+        # A crash between saving the cursor and deleting a consumed segment leaves it behind
+        for n in [n for n in self.segments if n < self.read_segment]:
+            self._delete_segment(n)
+        self._wf = open(self._path(self.segments[-1]), "ab")
+        self._dirty = False
+        self._peeked_end: Optional[int] = None
+
+        self.appended = 0
+        self.acked = 0
+        self.dropped_segments = 0
+        self.dropped_bytes = 0
+        self.corrupt = 0
+
+    # --- files ---
+
+    def _path(self, n: int) -> str:
+        return os.path.join(self.directory, _segment_name(n))
+
+    def _new_segment_file(self, n: int):
+        open(self._path(n), "ab").close()
+        self.segments.append(n)
+        self.sizes[n] = 0
+
+    def _recover_tail(self, n: int):
+        """Truncate a partially written record left by a crash"""
+        valid = 0
+        with open(self._path(n), "rb") as f:
+            while True:
+                rec = self._read_at(f, valid)
+                if rec is None:
+                    break
+                valid = rec[1]
+        if valid < self.sizes[n]:
+            print(f"Spool: truncating {self.sizes[n] - valid} torn bytes in {_segment_name(n)}")
+            with open(self._path(n), "r+b") as f:
+                f.truncate(valid)
+            self.sizes[n] = valid
+
+    @staticmethod
+    def _read_at(f, offset: int):
+        """Decode the record at offset; returns (record, next_offset) or None if absent/corrupt"""
+        f.seek(offset)
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return None
+        length, crc, epoch, seq, ct, enc = HEADER.unpack(header)
+        body = f.read(length)
+        if len(body) < length or zlib.crc32(body) != crc or ct >= len(CONTENT_TYPES) or enc >= len(ENCODINGS):
+            return None
+        record = SpoolRecord(body, CONTENT_TYPES[ct], ENCODINGS[enc], epoch, seq)
+        return record, offset + HEADER.size + length
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE)) as f:
+                cursor = json.load(f)
+            segment, offset = int(cursor["segment"]), int(cursor["offset"])
+            if segment in self.sizes and offset <= self.sizes[segment]:
+                return segment, offset
+        except (OSError, ValueError, KeyError):
+            pass
+        return self.segments[0], 0
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, CURSOR_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"segment": self.read_segment, "offset": self.read_offset}, f)
+        os.replace(path + ".tmp", path)
+
+    # --- write side ---
+
+    def append(self, record: SpoolRecord):
+        frame = HEADER.pack(
+            len(record.body), zlib.crc32(record.body), record.epoch, record.seq,
+            CONTENT_TYPES.index(record.content_type), ENCODINGS.index(record.encoding),
+        ) + record.body
+        current = self.segments[-1]
+        if self.sizes[current] and self.sizes[current] + len(frame) > self.segment_bytes:
+            self._rotate()
+            current = self.segments[-1]
+        self._wf.write(frame)
+        # Hand the bytes to the OS so the reader sees them; durability comes from sync()
+        self._wf.flush()
+        self.sizes[current] += len(frame)
+        self.appended += 1
+        self._dirty = True
+        self._enforce_cap()
+
+    def _rotate(self):
+        self.sync()
+        self._wf.close()
+        self._new_segment_file(self.segments[-1] + 1)
+        self._wf = open(self._path(self.segments[-1]), "ab")
+
+    def _enforce_cap(self):
+        while self.total_bytes > self.max_bytes and len(self.segments) > 1:
+            oldest = self.segments[0]
+            if oldest == self.read_segment:
+                # Unsent data is lost: count what the cursor had not consumed yet
+                self.dropped_bytes += self.sizes[oldest] - self.read_offset
+                self.read_segment, self.read_offset = self.segments[1], 0
+                self._peeked_end = None
+                self._save_cursor()
+            self.dropped_segments += 1
+            self._delete_segment(oldest)
+            print(f"Spool over {self.max_bytes} bytes: dropped oldest segment {_segment_name(oldest)}")
+
+    def _delete_segment(self, n: int):
+        self.segments.remove(n)
+        del self.sizes[n]
+        try:
+            os.remove(self._path(n))
+        except FileNotFoundError:
+            pass
+
+    def sync(self):
+        """fsync pending appends (batched: the pusher calls it once per tick)"""
+        if self._dirty:
+            os.fsync(self._wf.fileno())
+            self._dirty = False
+
+    # --- read side ---
+
+    def peek(self) -> Optional[SpoolRecord]:
+        """Oldest unacknowledged batch, or None if the spool is drained"""
+        while True:
+            if self.read_offset < self.sizes[self.read_segment]:
+                with open(self._path(self.read_segment), "rb") as f:
+                    rec = self._read_at(f, self.read_offset)
+                if rec is not None:
+                    self._peeked_end = rec[1]
+                    return rec[0]
+                # Unreadable record mid-spool: skip the rest of that segment
+                self.corrupt += 1
+                print(f"Spool: corrupt record in {_segment_name(self.read_segment)} at {self.read_offset}, skipping segment")
+                self.read_offset = self.sizes[self.read_segment]
+            if self.read_segment == self.segments[-1]:
+                return None
+            # Segment fully consumed: move on and reclaim it
+            finished = self.read_segment
+            self.read_segment = self.segments[self.segments.index(finished) + 1]
+            self.read_offset = 0
+            self._save_cursor()
+            self._delete_segment(finished)
+
+    def ack(self):
+        """Mark the batch returned by the last peek() as delivered"""
+        if self._peeked_end is None:
+            return
+        self.read_offset = self._peeked_end
+        self._peeked_end = None
+        self.acked += 1
+        self._save_cursor()
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.sizes.values())
+
+    @property
+    def pending_bytes(self) -> int:
+        return self.total_bytes - self.read_offset
+
+    def is_empty(self) -> bool:
+        return self.pending_bytes == 0
+
+    def close(self):
+        self.sync()
+        self._wf.close()
+
+    def status(self):
+        return {
+            "dir": self.directory,
+            "segments": len(self.segments),
+            "total_bytes": self.total_bytes,
+            "pending_bytes": self.pending_bytes,
+            "appended": self.appended,
+            "acked": self.acked,
+            "dropped_segments": self.dropped_segments,
+            "dropped_bytes": self.dropped_bytes,
+            "corrupt": self.corrupt,
+        }
@@ -0,0 +1,98 @@
+"""
+Literal-insensitive SQL fingerprints.
+
+normalize() turns statements that differ only in literals, bind names, IN-list
+length, comments, whitespace or keyword case into the same text:
+
+    select * from t where id = 42 and name in ('a', 'b')   -- x
+    SELECT *  FROM t WHERE id=:b1 AND name IN (:1)
+        -> SELECT * FROM T WHERE ID = ? AND NAME IN (...)
+
+fingerprint() hashes that text. Results are memoized per sql_id (an LRU of
+FINGERPRINT_MEMO_SIZE entries), so each statement is only parsed once no matter
+how often it shows up in snapshots.
+"""
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+FINGERPRINT_MEMO_SIZE = int(os.getenv("FINGERPRINT_MEMO_SIZE", "20000"))
+
+# Comments, literals, binds and quoted identifiers, found in one pass
+_LITERALS = re.compile(r"""
+    (?=[-/'"nNqQ:0-9.])
+    (?:(?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<qstring>[nN]?[qQ]'(?:\[.*?\]|\{.*?\}|\(.*?\)|<.*?>|(?P<qd>[^\s\[{(<]).*?(?P=qd))')
+  | (?P<string>[nN]?'(?:[^']|'')*')
+  | (?P<ident>"[^"]*")
+  | (?P<bind>:\w+)
+  | (?P<number>(?<![\w$#])(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?[fFdD]?(?![\w$#])))
+""", re.S | re.X)
+
+_OPERATORS = re.compile(r"(<>|!=|<=|>=|\|\||[-+*/=<>(),;])")
+_IN_LIST = re.compile(r"\bIN \( \?(?: , \?)* \)")
+_VALUES_LIST = re.compile(r"\bVALUES \( \?(?: , \?)* \)")
+
+
+def _literal(m: "re.Match") -> str:
+    kind = m.lastgroup
+    if kind == "comment":
+        return " "
+    if kind == "ident":
+        # Keep case; mark so the upper() below can be undone cheaply
+        return "\x00" + m.group() + "\x00"
+    return " ? "
+
+
+def normalize(sql: str) -> str:
+    """Literal-free, single-spaced, upper-case form of a statement"""
+    text = _LITERALS.sub(_literal, sql or "")
+    if "\x00" in text:
+        parts = text.split("\x00")
+        # Odd parts are quoted identifiers
+        text = "".join(p if i % 2 else p.upper() for i, p in enumerate(parts))
+    else:
+        text = text.upper()
+    # Space out operators, then collapse all whitespace runs to one space
+    text = " ".join(_OPERATORS.sub(r" \1 ", text).split())
+    text = _IN_LIST.sub("IN (...)", text)
+    text = _VALUES_LIST.sub("VALUES (...)", text)
+    text = text.replace("( ", "(").replace(" )", ")").replace(" ,", ",")
+    return text.rstrip("; ")
+
+
+def digest(normalized: str) -> str:
+    return hashlib.blake2b(normalized.encode(), digest_size=8).hexdigest()
+
+
+class Fingerprinter:
+    """LRU memo of sql_id -> (fingerprint, normalized text)"""
+
+    def __init__(self, size: int = FINGERPRINT_MEMO_SIZE):
+        self.size = size
+        self.memo: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def fingerprint(self, sql_id: str, sql_text: str) -> Tuple[str, str]:
+        with self._lock:
+            hit = self.memo.get(sql_id)
+            if hit is not None:
+                self.memo.move_to_end(sql_id)
+                self.hits += 1
+                return hit
+        normalized = normalize(sql_text)
+        result = (digest(normalized), normalized)
+        with self._lock:
+            self.misses += 1
+            self.memo[sql_id] = result
+            if len(self.memo) > self.size:
+                self.memo.popitem(last=False)
+        return result
+
+    def status(self):
+        return {"memo": len(self.memo), "hits": self.hits, "misses": self.misses}
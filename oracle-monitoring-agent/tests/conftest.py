@@ -0,0 +1,39 @@
+import os
+import sys
+import types
+
+import pytest
+
+# The agent is a flat set of modules run from its own directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _stub_oracledb():
+    """Just enough of python-oracledb for main.py to import; any connection attempt fails"""
+    mod = types.ModuleType("oracledb")
+
+    class Error(Exception):
+        pass
+
+    class DatabaseError(Error):
+        pass
+
+    def create_pool(*args, **kwargs):
+        raise DatabaseError("oracledb is stubbed out in tests")
+
+    mod.Error, mod.DatabaseError = Error, DatabaseError
+    mod.POOL_GETMODE_TIMEDWAIT = 3
+    mod.init_oracle_client = lambda *args, **kwargs: None
+    mod.create_pool = create_pool
+    return mod
+
+
+@pytest.fixture(scope="session")
+def agent_main():
+    """main.py imported the way uvicorn does; without the driver installed a stand-in is used"""
+    try:
+        import oracledb  # noqa: F401
+    except ImportError:
+        sys.modules["oracledb"] = _stub_oracledb()
+    import main
+    return main
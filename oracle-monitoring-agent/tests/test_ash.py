@@ -0,0 +1,50 @@
+import datetime
+import time
+
+from ash import AshCollector
+
+
+def rows_at(ts, sessions, first_id=1, wait_class="CPU"):
+    stamp = datetime.datetime.fromtimestamp(ts)
+    return [(first_id, stamp, f"{i},1", "sql1", wait_class) for i in range(sessions)]
+
+
+def closed_minute():
+    now = int(time.time())
+    return now - now % 60 - 180
+
+
+def test_aas_is_per_second_of_wall_time_not_per_sample():
+    # One active session for one second of an otherwise idle minute
+    collector = AshCollector()
+    minute = closed_minute()
+    collector.ingest(rows_at(minute + 5, 1))
+    [(ts, counts)] = collector.closed_minutes(0)
+    assert ts == minute
+    assert counts == {"CPU": round(1 / 60, 2)}
+
+
+def test_busy_minute():
+    collector = AshCollector()
+    minute = closed_minute()
+    rows = []
+    for second in range(60):
+        rows += rows_at(minute + second, 3, first_id=second + 1)
+    collector.ingest(rows)
+    assert collector.closed_minutes(0) == [(minute, {"CPU": 3.0})]
+
+
+def test_bootstrap_window_covers_part_of_a_minute():
+    collector = AshCollector()
+    minute = closed_minute()
+    collector.covered_from = minute + 30
+    collector.ingest(rows_at(minute + 40, 3))
+    assert collector.closed_minutes(0) == [(minute, {"CPU": 0.1})]
+
+
+def test_second_series_groups():
+    collector = AshCollector()
+    now = int(time.time()) - 5
+    collector.ingest(rows_at(now, 2) + rows_at(now, 1, wait_class="User I/O"))
+    points = collector.series("second", "wait_class", window=60)
+    assert {p["wait_class"]: p["active_sessions"] for p in points} == {"CPU": 2.0, "User I/O": 1.0}
@@ -0,0 +1,63 @@
+from locks import analyze, summary
+
+
+def session(sid, blocker=None, wait=0):
+    return (sid, 1, "U", "prog", "ACTIVE", blocker, None, "enq: TX", None, wait)
+
+
+def test_no_blocking():
+    report = analyze([session(1), session(2)], now=0)
+    assert report["blocked_sessions"] == 0 and report["root_blockers"] == 0 and report["roots"] == []
+
+
+def test_chain_depth_and_tree():
+    # 1 <- 2 <- 3, and 1 <- 4
+    report = analyze([session(1), session(2, 1, wait=30), session(3, 2, wait=10), session(4, 1, wait=5)], now=0)
+    assert report["blocked_sessions"] == 3
+    assert report["root_blockers"] == 1
+    assert report["max_depth"] == 2
+    assert report["max_blocked_per_root"] == 3
+    assert report["longest_wait_seconds"] == 30
+    root = report["roots"][0]
+    assert root["sid"] == 1 and root["blocked_count"] == 3
+    assert sorted(c["sid"] for c in root["children"]) == [2, 4]
+    two = next(c for c in root["children"] if c["sid"] == 2)
+    assert [c["sid"] for c in two["children"]] == [3] and two["children"][0]["depth"] == 2
+
+
+def test_blocker_missing_from_snapshot_becomes_bare_root():
+    report = analyze([session(5, 99)], now=0)
+    assert report["root_blockers"] == 1
+    assert report["roots"][0]["sid"] == 99 and report["roots"][0]["status"] == "UNKNOWN"
+
+
+def test_cycle_and_sessions_behind_it():
+    # 1 -> 2 -> 3 -> 1 is a deadlock; 4 waits on 3 and 5 on 4; 7 <- 6 is an ordinary tree
+    rows = [session(1, 2), session(2, 3), session(3, 1), session(4, 3), session(5, 4), session(6), session(7, 6)]
+    report = analyze(rows, now=0)
+    assert report["sessions_in_cycles"] == 5
+    assert [sorted(c) for c in report["cycles"]] == [[1, 2, 3]]
+    assert report["root_blockers"] == 1 and report["roots"][0]["sid"] == 6
+
+
+def test_self_block_is_a_cycle():
+    report = analyze([session(1, 1)], now=0)
+    assert report["cycles"] == [[1]] and report["root_blockers"] == 0
+
+
+def test_roots_sorted_by_blocked_count():
+    rows = [session(1), session(2, 1), session(10), session(11, 10), session(12, 10)]
+    report = analyze(rows, now=0)
+    assert [r["sid"] for r in report["roots"]] == [10, 1]
+
+
+def test_long_chain_is_linear():
+    n = 50_000
+    rows = [session(1)] + [session(i, i - 1) for i in range(2, n + 1)]
+    report = analyze(rows, now=0)
+    assert report["max_depth"] == n - 1 and report["blocked_sessions"] == n - 1
+
+
+def test_summary_drops_trees():
+    report = analyze([session(1), session(2, 1)], now=0)
+    assert "roots" not in summary(report) and summary(report)["blocked_sessions"] == 1
@@ -0,0 +1,56 @@
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+
+def test_import_does_not_connect(agent_main):
+    # Importing must not touch the database: pools are created on first use
+    assert agent_main.monitor_pool is None and agent_main.editor_pool is None
+    assert set(agent_main.scheduler.families) == {"Sessions", "ASH", "Top-SQL", "Blocking"}
+
+
+def test_scheduler_resolves_the_pool_lazily(agent_main, monkeypatch):
+    sentinel = object()
+    monkeypatch.setattr(agent_main, "monitor_pool", sentinel)
+    assert agent_main.scheduler.pool() is sentinel
+
+
+def test_unreachable_database_fails_on_use(agent_main):
+    if agent_main.oracledb.__spec__ is not None:
+        pytest.skip("real driver installed: would try to connect")
+    with pytest.raises(HTTPException):
+        agent_main.ensure_pool()
+    assert agent_main.monitor_pool is None
+
+
+def test_diagnostics_endpoints_use_their_own_pool(agent_main, monkeypatch):
+    diag, used = object(), []
+
+    def record(name):
+        def read(pool, *args):
+            used.append((name, pool))
+            return {"roots": []} if name == "blocking" else [{"id": 0}]
+        return read
+
+    def no_monitor_pool():
+        raise AssertionError("diagnostics must not use the collectors' pool")
+
+    monkeypatch.setattr(agent_main, "ensure_pool", no_monitor_pool)
+    monkeypatch.setattr(agent_main, "diag_pool", diag)
+    monkeypatch.setattr(agent_main.plan_reader, "stats", record("stats"))
+    monkeypatch.setattr(agent_main.plan_reader, "plan", record("plan"))
+    monkeypatch.setattr(agent_main.blocking_analyzer, "collect", record("blocking"))
+    client = TestClient(agent_main.app)
+    assert client.get("/metrics/sql/abc").status_code == 200
+    assert client.get("/metrics/sql/abc/plan/1").status_code == 200
+    assert client.get("/metrics/blocking", params={"fresh": True}).status_code == 200
+    assert used == [("stats", diag), ("plan", diag), ("blocking", diag)]
+
+
+def test_diagnostics_failures_are_503(agent_main, monkeypatch):
+    def busy(pool, *args):
+        raise agent_main.oracledb.DatabaseError("pool timeout")
+
+    monkeypatch.setattr(agent_main, "diag_pool", object())
+    monkeypatch.setattr(agent_main.plan_reader, "stats", busy)
+    assert TestClient(agent_main.app).get("/metrics/sql/abc").status_code == 503
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import time
+
+import httpx
+
+import pusher
+from pusher import Pusher
+from spool import Spool, SpoolRecord
+
+pusher.PUSH_URL = "http://server"
+pusher.PUSH_REPLAY_RATE = 1000
+
+
+def record(seq):
+    return SpoolRecord(b"{}", "application/json", "identity", 1, seq)
+
+
+def run_replay(tmp_path, respond):
+    """Replay seqs 1..3 against a server answering respond(seq) -> status code"""
+    p = Pusher(None, None, None, None)
+    p.spool = Spool(str(tmp_path))
+    for seq in (1, 2, 3):
+        p.spool.append(record(seq))
+    seen = []
+
+    def handler(request):
+        seq = int(request.headers["X-Batch-Seq"])
+        seen.append(seq)
+        status = respond(seq)
+        return httpx.Response(status, json={"ack": seq} if status == 200 else {"detail": "no"})
+
+    async def replay():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await p.replay(client)
+
+    drained = asyncio.run(replay())
+    p.spool.close()
+    return p, drained, seen
+
+
+def test_replay_drains_in_order(tmp_path):
+    p, drained, seen = run_replay(tmp_path, lambda seq: 200)
+    assert drained and seen == [1, 2, 3]
+    assert p.replayed == 3 and p.rejected == 0
+
+
+def test_rejected_batch_does_not_block_the_spool(tmp_path):
+    # A batch the server will never accept (422/413/400...) is dropped, not retried forever
+    p, drained, seen = run_replay(tmp_path, lambda seq: 422 if seq == 1 else 200)
+    assert drained and seen == [1, 2, 3]
+    assert p.rejected == 1
+    assert p.status()["rejected_batches"] == 1
+
+
+def test_server_errors_are_retried(tmp_path):
+    for status in (500, 503, 429, 408, 401):
+        p, drained, seen = run_replay(tmp_path / str(status), lambda seq: status)
+        assert not drained and seen == [1], status
+        assert p.rejected == 0
+        assert not p.spool.is_empty()
+
+
+def test_transport_error_keeps_batch(tmp_path):
+    def handler(request):
+        raise httpx.ConnectError("refused")
+
+    p = Pusher(None, None, None, None)
+    p.spool = Spool(str(tmp_path))
+    p.spool.append(record(1))
+
+    async def replay():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await p.replay(client)
+
+    assert asyncio.run(replay()) is False
+    assert p.spool.peek().seq == 1
+    assert "ConnectError" in p.last_error
+    p.spool.close()
+
+
+def test_replay_keeps_the_configured_rate(tmp_path, monkeypatch):
+    # 10 batches at 40/s take ~0.25 s even when each send takes 20 ms; sleeping 1/rate
+    # after every send made it ~0.45 s, and the tick after it waited another interval
+    monkeypatch.setattr(pusher, "PUSH_REPLAY_RATE", 40)
+    monkeypatch.setattr(pusher, "PUSH_INTERVAL", 0.25)
+    p = Pusher(None, None, None, None)
+    p.spool = Spool(str(tmp_path))
+    for seq in range(1, 11):
+        p.spool.append(record(seq))
+
+    async def replay():
+        def slow(request):
+            time.sleep(0.02)
+            return httpx.Response(200, json={"ack": 0})
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(slow)) as client:
+            started = time.monotonic()
+            drained = await p.replay(client)
+            return drained, time.monotonic() - started
+
+    drained, elapsed = asyncio.run(replay())
+    assert drained and p.replayed == 10
+    assert 0.2 <= elapsed < 0.35
+    p.spool.close()
+
+
+def test_spool_io_runs_off_the_event_loop(tmp_path, monkeypatch):
+    p = Pusher(None, None, None, None)
+    p.spool = Spool(str(tmp_path))
+    p.spool.append(record(1))
+    loop_thread = threading.get_ident()
+    threads = []
+    for name in ("peek", "ack", "append", "sync"):
+        original = getattr(p.spool, name)
+
+        def traced(*args, _original=original, **kwargs):
+            threads.append(threading.get_ident())
+            return _original(*args, **kwargs)
+
+        monkeypatch.setattr(p.spool, name, traced)
+    monkeypatch.setattr(p, "collect", lambda: [{"kind": "ash", "ts": 1.0, "data": {}}])
+
+    async def tick():
+        transport = httpx.MockTransport(lambda request: httpx.Response(503))
+        async with httpx.AsyncClient(transport=transport) as client:
+            await p.tick(client)
+
+    asyncio.run(tick())
+    assert threads and loop_thread not in threads
+    p.spool.close()
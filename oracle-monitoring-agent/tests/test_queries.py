@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+import queries
+from queries import QueryRegistry
+
+
+class FakeConn:
+    def __init__(self):
+        self.call_timeout = 0
+        self.log = []
+
+    def commit(self):
+        self.log.append("commit")
+
+    def rollback(self):
+        self.log.append("rollback")
+
+    def cancel(self):
+        self.log.append("cancel")
+
+
+class FakePool:
+    def __init__(self):
+        self.acquired = 0
+        self.released = []
+
+    def acquire(self):
+        self.acquired += 1
+        return FakeConn()
+
+    def release(self, conn):
+        self.released.append(conn)
+
+
+def test_statements_without_a_session_get_their_own_connection():
+    registry, pool = QueryRegistry(), FakePool()
+    for i in range(2):
+        with registry.run(pool, f"q{i}", "select 1 from dual", 1000):
+            pass
+    assert pool.acquired == 2 and len(pool.released) == 2
+
+
+def test_session_statements_share_one_connection_until_closed():
+    registry, pool = QueryRegistry(), FakePool()
+    session_id = registry.open_session(pool)
+    seen = []
+    for i, sql in enumerate(["ALTER SESSION SET CURRENT_SCHEMA = app", "insert into t values (1)"]):
+        with registry.run(pool, f"q{i}", sql, 1000, session_id) as conn:
+            seen.append(conn)
+    assert seen[0] is seen[1] and pool.acquired == 1 and pool.released == []
+    assert seen[0].call_timeout == 0
+
+    assert registry.close_session(session_id, commit=True)
+    assert seen[0].log == ["commit"] and pool.released == [seen[0]]
+    assert not registry.close_session(session_id)
+    with pytest.raises(ValueError):
+        with registry.run(pool, "q9", "select 1 from dual", 1000, session_id):
+            pass
+
+
+def test_closing_without_commit_rolls_back():
+    registry, pool = QueryRegistry(), FakePool()
+    session_id = registry.open_session(pool)
+    conn = registry.session(session_id).conn
+    registry.close_session(session_id)
+    assert conn.log == ["rollback"] and pool.released == [conn]
+
+
+def test_session_runs_one_statement_at_a_time():
+    registry, pool = QueryRegistry(), FakePool()
+    session_id = registry.open_session(pool)
+    inside, release = threading.Event(), threading.Event()
+    order = []
+
+    def first():
+        with registry.run(pool, "a", "begin slow; end;", 1000, session_id):
+            inside.set()
+            release.wait(5)
+            order.append("a")
+
+    def second():
+        with registry.run(pool, "b", "select 1 from dual", 1000, session_id):
+            order.append("b")
+
+    t1 = threading.Thread(target=first)
+    t1.start()
+    inside.wait(5)
+    t2 = threading.Thread(target=second)
+    t2.start()
+    t2.join(0.1)
+    assert order == []
+    release.set()
+    t1.join(5)
+    t2.join(5)
+    assert order == ["a", "b"]
+
+
+def test_idle_sessions_are_rolled_back(monkeypatch):
+    registry, pool = QueryRegistry(), FakePool()
+    session_id = registry.open_session(pool)
+    conn = registry.session(session_id).conn
+    monkeypatch.setattr(queries, "EDITOR_SESSION_IDLE_SECONDS", -1)
+    assert [s["session_id"] for s in registry.status()["sessions"]] == []
+    assert conn.log == ["rollback"] and pool.released == [conn]
@@ -0,0 +1,161 @@
+import json
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _main(agent_main):
+    global main, oracledb
+    main, oracledb = agent_main, agent_main.oracledb
+
+JOIN = "SELECT * FROM emp e JOIN dept d ON d.deptno = e.deptno"
+
+
+class _OraError:
+    def __init__(self, code):
+        self.code = code
+
+
+class FakeCursor:
+    """Records executed statements; wrapped statements fail with `wrap_error`"""
+
+    def __init__(self, wrap_error=None):
+        self.executed = []
+        self.wrap_error = wrap_error
+
+    def execute(self, sql, *args, **binds):
+        self.executed.append(sql)
+        if self.wrap_error and sql.startswith("SELECT * FROM ("):
+            raise oracledb.DatabaseError(_OraError(self.wrap_error))
+
+
+def test_first_page_runs_statement_unmodified():
+    cursor = FakeCursor()
+    assert main._execute_from(cursor, JOIN, 0) == 0
+    assert cursor.executed == [JOIN]
+
+
+def test_resume_skips_rows_in_oracle_when_wrapping_works():
+    cursor = FakeCursor()
+    assert main._execute_from(cursor, "SELECT * FROM emp", 100) == 0
+    assert "OFFSET :pg_offset ROWS" in cursor.executed[0]
+
+
+@pytest.mark.parametrize("code", [918, 2014, 907])
+def test_resume_falls_back_to_client_side_skip(code):
+    # ORA-00918: a join selecting two columns with the same name can't be wrapped
+    cursor = FakeCursor(wrap_error=code)
+    assert main._execute_from(cursor, JOIN, 100) == 100
+    assert cursor.executed[-1] == JOIN
+
+
+def test_for_update_is_never_wrapped():
+    sql = "SELECT * FROM emp FOR UPDATE"
+    cursor = FakeCursor()
+    assert main._execute_from(cursor, sql, 10) == 10
+    assert cursor.executed == [sql]
+
+
+def test_other_errors_propagate():
+    cursor = FakeCursor(wrap_error=942)
+    with pytest.raises(oracledb.DatabaseError):
+        main._execute_from(cursor, "SELECT * FROM missing", 10)
+
+
+@pytest.mark.parametrize("sql, ordered", [
+    ("SELECT * FROM emp ORDER BY empno", True),
+    ("select ename from emp order  by 1 fetch first 10 rows only", True),
+    ("SELECT * FROM emp CONNECT BY PRIOR empno = mgr ORDER SIBLINGS BY ename", True),
+    ("SELECT * FROM (SELECT * FROM emp ORDER BY empno)", False),
+    ("SELECT ename, ROW_NUMBER() OVER (ORDER BY sal) rn FROM emp", False),
+    ("SELECT 'order by x' AS s FROM dual -- order by 1", False),
+    ('SELECT "ORDER" FROM t', False),
+    (JOIN, False),
+])
+def test_has_stable_order(sql, ordered):
+    assert main.has_stable_order(sql) is ordered
+
+
+class _Type:
+    name = "DB_TYPE_NUMBER"
+
+
+class RowCursor(FakeCursor):
+    """Serves `rows`, skipping `offset` of them when the wrapped statement runs"""
+
+    def __init__(self, rows, wrap_error=None):
+        super().__init__(wrap_error)
+        self.rows, self.pos = rows, 0
+        self.description = [("N", _Type, None, None, 10, 0, True)]
+
+    def execute(self, sql, *args, **binds):
+        super().execute(sql, *args, **binds)
+        self.pos = binds.get("pg_offset", 0)
+
+    def fetchmany(self, n):
+        batch = self.rows[self.pos:self.pos + n]
+        self.pos += len(batch)
+        return batch
+
+    def fetchone(self):
+        batch = self.fetchmany(1)
+        return batch[0] if batch else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class RowConn:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.call_timeout = 0
+
+    def cursor(self):
+        return self._cursor
+
+    def release(self):
+        pass
+
+
+def page(monkeypatch, sql, cursor_token=None, wrap_error=None):
+    cursor = RowCursor([(i,) for i in range(10)], wrap_error)
+
+    class Pool:
+        def acquire(self):
+            return RowConn(cursor)
+
+        def release(self, conn):
+            pass
+
+    monkeypatch.setattr(main, "ensure_editor_pool", lambda: Pool())
+    response = main.execute_query(main.QueryRequest(sql=sql, max_rows=4, cursor=cursor_token))
+    return json.loads(response.body)
+
+
+def test_unordered_paging_tells_the_client_the_resume_is_not_exact(monkeypatch):
+    first = page(monkeypatch, "SELECT n FROM t")
+    assert first["rows"] == [[0], [1], [2], [3]]
+    assert first["resume_exact"] is False and "ORDER BY" in first["warning"]
+    second = page(monkeypatch, "SELECT n FROM t", first["next_cursor"])
+    assert second["rows"] == [[4], [5], [6], [7]] and second["resume_exact"] is False
+
+
+def test_ordered_paging_is_exact_and_quiet(monkeypatch):
+    first = page(monkeypatch, "SELECT n FROM t ORDER BY n")
+    assert first["resume_exact"] is True and "warning" not in first
+    second = page(monkeypatch, "SELECT n FROM t ORDER BY n", first["next_cursor"])
+    assert second["rows"] == [[4], [5], [6], [7]] and "warning" not in second
+
+
+def test_client_side_skip_is_reported(monkeypatch):
+    token = main.encode_cursor(4)
+    result = page(monkeypatch, "SELECT n FROM t ORDER BY n", token, wrap_error=918)
+    assert result["rows"] == [[4], [5], [6], [7]]
+    assert result["resume_exact"] is True and "4 rows were fetched and discarded" in result["warning"]
+
+
+def test_single_page_results_carry_no_resume_info():
+    assert main._resume_info("SELECT n FROM t", 0, 0, has_more=False) == {}
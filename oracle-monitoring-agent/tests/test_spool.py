@@ -0,0 +1,107 @@
+import os
+
+import spool
+from spool import Spool, SpoolRecord, CURSOR_FILE
+
+
+def record(seq, size=100):
+    return SpoolRecord(bytes([seq % 256]) * size, "application/json", "gzip", 1, seq)
+
+
+def drain(spool):
+    seqs = []
+    while True:
+        rec = spool.peek()
+        if rec is None:
+            return seqs
+        seqs.append(rec.seq)
+        spool.ack()
+
+
+def test_fifo_across_segment_rotation(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=500, max_bytes=10 ** 6)
+    for seq in range(1, 21):
+        spool.append(record(seq))
+    assert len(spool.segments) > 1
+    assert drain(spool) == list(range(1, 21))
+    assert spool.is_empty()
+    # Consumed segments are reclaimed; only the one being written remains
+    assert len(spool.segments) == 1
+    spool.close()
+
+
+def test_peek_without_ack_returns_same_record(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.append(record(1))
+    spool.append(record(2))
+    assert spool.peek().seq == 1
+    assert spool.peek().seq == 1
+    spool.ack()
+    assert spool.peek().seq == 2
+    spool.close()
+
+
+def test_cursor_survives_restart(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=500)
+    for seq in range(1, 11):
+        spool.append(record(seq))
+    for _ in range(4):
+        spool.peek()
+        spool.ack()
+    spool.close()
+
+    reopened = Spool(str(tmp_path), segment_bytes=500)
+    assert drain(reopened) == list(range(5, 11))
+    reopened.close()
+
+
+def test_torn_tail_is_truncated_on_open(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.append(record(1))
+    spool.append(record(2))
+    spool.close()
+    path = os.path.join(str(tmp_path), f"{spool.segments[-1]:012d}.seg")
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 10)
+
+    reopened = Spool(str(tmp_path))
+    assert drain(reopened) == [1]
+    reopened.append(record(3))
+    assert drain(reopened) == [3]
+    reopened.close()
+
+
+def test_size_cap_drops_oldest_segments(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=300, max_bytes=1000)
+    for seq in range(1, 31):
+        spool.append(record(seq))
+    assert spool.total_bytes <= 1000
+    assert spool.dropped_segments > 0
+    seqs = drain(spool)
+    # Whatever survived is the newest batches, still in order
+    assert seqs == sorted(seqs) and seqs[-1] == 30 and seqs[0] > 1
+    spool.close()
+
+
+def test_unreadable_cursor_restarts_from_oldest(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.append(record(1))
+    spool.close()
+    with open(os.path.join(str(tmp_path), CURSOR_FILE), "w") as f:
+        f.write("{not json")
+    reopened = Spool(str(tmp_path))
+    assert drain(reopened) == [1]
+    reopened.close()
+
+
+def test_append_leaves_fsync_to_sync(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(spool.os, "fsync", lambda fd: calls.append(fd))
+    s = Spool(str(tmp_path))
+    for seq in range(1, 4):
+        s.append(SpoolRecord(b"x" * 10, "application/json", "identity", 1, seq))
+    assert calls == []
+    s.sync()
+    s.sync()
+    assert len(calls) == 1
+    s.close()
@@ -0,0 +1,94 @@
+import datetime
+
+import topsql
+from topsql import TopSqlEngine
+
+OLD_LOAD = datetime.datetime(2020, 1, 1)
+T0 = 1_700_000_000.0
+
+
+def row(sql_id, elapsed, cpu=0, gets=0, reads=0, execs=1, child=0, phv=1, address="A", load=OLD_LOAD,
+        text=None, signature=0):
+    return (sql_id, child, phv, address, load, elapsed, cpu, gets, reads, execs,
+            text or f"select * from {sql_id}", "mod", "APP", signature)
+
+
+def engine_with(*snapshots):
+    engine = TopSqlEngine()
+    for i, rows in enumerate(snapshots):
+        engine.ingest(rows, T0 + 15 * i)
+    return engine
+
+
+def deltas(engine):
+    return {r["sql_id"]: r for r in engine.intervals[-1][2]}
+
+
+def test_first_snapshot_is_only_a_baseline():
+    engine = engine_with([row("a", 100)])
+    assert not engine.intervals
+
+
+def test_delta_between_snapshots():
+    engine = engine_with([row("a", 100, execs=1)], [row("a", 350, execs=4)])
+    d = deltas(engine)["a"]
+    assert d["elapsed_time"] == 250 and d["executions"] == 3 and not d["new_cursor"]
+
+
+def test_idle_cursor_is_skipped():
+    engine = engine_with([row("a", 100)], [row("a", 100)])
+    assert engine.intervals[-1][2] == []
+
+
+def test_reload_counts_current_totals():
+    # Same key, new child_address: aged out and reloaded, so everything it has is new work
+    engine = engine_with([row("a", 1000)], [row("a", 40, address="B")])
+    d = deltas(engine)["a"]
+    assert d["elapsed_time"] == 40 and d["new_cursor"]
+
+
+def test_counter_reset_counts_current_totals():
+    engine = engine_with([row("a", 1000, execs=10)], [row("a", 1200, execs=2)])
+    assert deltas(engine)["a"]["elapsed_time"] == 1200
+
+
+def test_unknown_cursor_only_counts_if_loaded_during_interval():
+    fresh = datetime.datetime.fromtimestamp(T0 + 5)
+    engine = engine_with([row("a", 1)], [row("a", 1), row("old", 500), row("new", 70, load=fresh)])
+    d = deltas(engine)
+    assert "old" not in d
+    assert d["new"]["elapsed_time"] == 70
+
+
+def test_top_sums_intervals_and_converts_to_seconds():
+    engine = TopSqlEngine()
+    now = topsql.time.time()
+    engine.ingest([row("a", 0)], now - 30)
+    engine.ingest([row("a", 2_000_000, cpu=1_000_000)], now - 15)
+    engine.ingest([row("a", 5_000_000, cpu=1_500_000)], now)
+    top = engine.top("5m")
+    assert top[0]["sql_id"] == "a"
+    assert top[0]["elapsed_time"] == 5.0 and top[0]["cpu_time"] == 1.5
+
+
+def test_ranking_by_other_statistics_keeps_their_heavy_hitters(monkeypatch):
+    monkeypatch.setattr(topsql, "TOPSQL_TOP_N", 2)
+    engine = TopSqlEngine()
+    now = topsql.time.time()
+    base = [row("a", 0), row("b", 0), row("c", 0)]
+    engine.ingest(base, now - 15)
+    engine.ingest([row("a", 100), row("b", 90), row("c", 1, gets=10 ** 6)], now)
+    assert engine.top("5m", order_by="buffer_gets", limit=1)[0]["sql_id"] == "c"
+    assert [r["sql_id"] for r in engine.top("5m", limit=2)] == ["a", "b"]
+
+
+def test_literal_variants_group_by_fingerprint():
+    engine = TopSqlEngine()
+    now = topsql.time.time()
+    texts = {f"s{i}": f"select * from t where id = {i}" for i in range(5)}
+    engine.ingest([row(s, 0, text=t) for s, t in texts.items()] + [row("x", 0)], now - 15)
+    engine.ingest([row(s, 100, text=t) for s, t in texts.items()] + [row("x", 300)], now)
+    groups = engine.top("5m", group_by="fingerprint")
+    assert groups[0]["statements"] == 5
+    assert groups[0]["elapsed_time"] == round(500 / 1e6, 3)
+    assert groups[1]["sql_id"] == "x"
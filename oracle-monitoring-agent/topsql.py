@@ -0,0 +1,275 @@
+import os
+import time
+import heapq
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from sqlnorm import Fingerprinter
+
+# --- Top-SQL snapshot settings ---
+TOPSQL_INTERVAL = float(os.getenv("TOPSQL_INTERVAL", "15"))
+TOPSQL_COST_BUDGET = float(os.getenv("TOPSQL_COST_BUDGET", "0.05"))   # share of wall time v$sql scans may take
+TOPSQL_TOP_N = int(os.getenv("TOPSQL_TOP_N", "50"))              # rows kept per interval and statistic
+TOPSQL_KEEP_SECONDS = int(os.getenv("TOPSQL_KEEP_SECONDS", "3900"))
+# Baselines for cursors that stop showing up are forgotten after this long
+TOPSQL_STALE_SECONDS = int(os.getenv("TOPSQL_STALE_SECONDS", "3600"))
+TOPSQL_TEXT_CHARS = 100                                            # sql_text shown per row
+TOPSQL_SAMPLE_IDS = 5                                              # sql_ids listed per fingerprint group
+
+# Only cursors active since the previous snapshot are read; the rest have no delta
+TOPSQL_SQL = """
+SELECT
+    sql_id,
+    child_number,
+    plan_hash_value,
+    RAWTOHEX(child_address) AS child_address,
+    TO_DATE(last_load_time, 'YYYY-MM-DD/HH24:MI:SS') AS last_load_time,
+    elapsed_time,
+    cpu_time,
+    buffer_gets,
+    disk_reads,
+    executions,
+    sql_text,
+    module,
+    parsing_schema_name,
+    force_matching_signature
+FROM
+    v$sql
+WHERE
+    last_active_time >= SYSDATE - NUMTODSINTERVAL(:since_secs, 'SECOND')
+"""
+
+STATS = ("elapsed_time", "cpu_time", "buffer_gets", "disk_reads", "executions")
+WINDOWS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600}
+# sql_id: one row per statement; fingerprint: literal-insensitive text; signature:
+# Oracle's force_matching_signature (falls back to the fingerprint when it is 0)
+GROUP_BY = ("sql_id", "fingerprint", "signature")
+
+
+class _Baseline:
+    __slots__ = ("identity", "values", "seen")
+
+    def __init__(self, identity, values, seen):
+        self.identity = identity
+        self.values = values
+        self.seen = seen
+
+
+class TopSqlEngine:
+    """
+    Periodic v$sql snapshots turned into per-interval deltas.
+
+    Cursors are keyed by (sql_id, child_number, plan_hash_value). A change of
+    child_address/last_load_time, or any counter going backwards, means the
+    cursor was aged out and reloaded, so its current totals are the delta.
+    Each interval keeps the rows that are in the top N by any statistic, so a
+    window can be ranked by each of them, and windows are answered by summing
+    the intervals they cover. A statement never in any interval's top N is
+    missing from the sums, so low-ranked totals are approximate.
+
+    Statements that differ only in literals are also summed per fingerprint and
+    per force_matching_signature before the top-N cut, so thousands of cheap
+    unbound statements show up as the one expensive statement they really are.
+    """
+
+    def __init__(self):
+        self.baselines: Dict[Tuple, _Baseline] = {}
+        self.fingerprints = Fingerprinter()
+        self.intervals: deque = deque()   # (end_ts, seconds, [row, ...], {group_by: [group, ...]})
+        self.last_snapshot: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def snapshot(self, pool):
+        now = time.time()
+        # The very first snapshot baselines every cursor; later ones only recently active ones
+        since = (now - self.last_snapshot if self.last_snapshot else 10 * 365 * 86400) + 5
+        with pool.acquire() as conn:
+            with conn.cursor() as cursor:
+                cursor.arraysize = 1000
+                cursor.execute(TOPSQL_SQL, since_secs=since)
+                rows = cursor.fetchall()
+        self.ingest(rows, now)
+
+    def ingest(self, rows, now: Optional[float] = None):
+        now = now if now is not None else time.time()
+        deltas = []
+        normalized: Dict[str, str] = {}
+        with self._lock:
+            first = self.last_snapshot is None
+            for (sql_id, child, phv, address, load_time, elapsed, cpu, gets, reads, execs,
+                 sql_text, module, schema, signature) in rows:
+                key = (sql_id, child, phv)
+                identity = (address, load_time)
+                values = (elapsed or 0, cpu or 0, gets or 0, reads or 0, execs or 0)
+                prev = self.baselines.get(key)
+                self.baselines[key] = _Baseline(identity, values, now)
+                if first:
+                    continue
+                loaded = True
+                if prev is None:
+                    # Unknown cursor: only count it if it was loaded during this interval,
+                    # otherwise we have no baseline and this snapshot becomes one
+                    if load_time is None or load_time.timestamp() < self.last_snapshot:
+                        continue
+                    delta = values
+                elif prev.identity != identity or any(v < p for v, p in zip(values, prev.values)):
+                    # Reloaded cursor: everything it has accumulated is new work
+                    delta = values
+                else:
+                    delta = tuple(v - p for v, p in zip(values, prev.values))
+                    loaded = False
+                if not any(delta):
+                    continue
+                fingerprint, text = self.fingerprints.fingerprint(sql_id, sql_text)
+                normalized[fingerprint] = text
+                deltas.append({
+                    "sql_id": sql_id,
+                    "plan_hash_value": phv,
+                    "sql_text": (sql_text or "")[:TOPSQL_TEXT_CHARS],
+                    "module": module,
+                    "parsing_schema": schema,
+                    "fingerprint": fingerprint,
+                    # Up to 2^64: sent as text so JSON clients keep every digit
+                    "force_matching_signature": str(signature) if signature else None,
+                    "new_cursor": loaded,
+                    **dict(zip(STATS, delta)),
+                })
+
+            if not first:
+                seconds = now - self.last_snapshot
+                top = _keep_top(deltas)
+                groups = {
+                    "fingerprint": _group(deltas, lambda d: d["fingerprint"], normalized),
+                    "signature": _group(deltas, lambda d: d["force_matching_signature"] or f"fp:{d['fingerprint']}",
+                                        normalized),
+                }
+                self.intervals.append((now, seconds, top, groups))
+            self.last_snapshot = now
+            self._prune(now)
+
+    def _prune(self, now: float):
+        while self.intervals and self.intervals[0][0] < now - TOPSQL_KEEP_SECONDS:
+            self.intervals.popleft()
+        stale = [k for k, b in self.baselines.items() if b.seen < now - TOPSQL_STALE_SECONDS]
+        for k in stale:
+            del self.baselines[k]
+
+    def top(self, window: str = "5m", order_by: str = "elapsed_time", limit: int = 10,
+            group_by: str = "sql_id") -> List[dict]:
+        """Top SQL by `order_by` summed over the intervals in the window (times in seconds)"""
+        since = time.time() - WINDOWS[window]
+        if group_by != "sql_id":
+            with self._lock:
+                interval_groups = [groups[group_by] for end, _, _, groups in self.intervals if end >= since]
+            return merge_groups(interval_groups, order_by, limit)
+
+        totals: Dict[str, dict] = {}
+        with self._lock:
+            for end, _, rows, _ in self.intervals:
+                if end < since:
+                    continue
+                for r in rows:
+                    agg = totals.get(r["sql_id"])
+                    if agg is None:
+                        agg = totals[r["sql_id"]] = {
+                            "sql_id": r["sql_id"],
+                            "sql_text": r["sql_text"],
+                            "module": r["module"],
+                            "parsing_schema": r["parsing_schema"],
+                            "plan_hash_values": set(),
+                            **{s: 0 for s in STATS},
+                        }
+                    agg["plan_hash_values"].add(r["plan_hash_value"])
+                    for s in STATS:
+                        agg[s] += r[s]
+
+        result = heapq.nlargest(limit, totals.values(), key=lambda d: d[order_by])
+        for r in result:
+            r["plan_hash_values"] = sorted(r["plan_hash_values"])
+            # v$sql times are microseconds
+            r["elapsed_time"] = round(r["elapsed_time"] / 1e6, 3)
+            r["cpu_time"] = round(r["cpu_time"] / 1e6, 3)
+        return result
+
+    def intervals_since(self, after_ts: float):
+        """Raw per-interval top-N deltas and groups that ended after after_ts (times in microseconds)"""
+        with self._lock:
+            return [interval for interval in self.intervals if interval[0] > after_ts]
+
+    def status(self):
+        return {
+            "last_snapshot": self.last_snapshot,
+            "intervals": len(self.intervals),
+            "tracked_cursors": len(self.baselines),
+            "fingerprints": self.fingerprints.status(),
+        }
+
+
+def _group(deltas: List[dict], key_of, normalized: Dict[str, str]) -> List[dict]:
+    """Sum one interval's deltas per group key and keep the top N groups"""
+    groups: Dict[str, dict] = {}
+    ids: Dict[str, set] = {}
+    for d in deltas:
+        key = key_of(d)
+        g = groups.get(key)
+        if g is None:
+            g = groups[key] = {
+                "key": key,
+                "fingerprint": d["fingerprint"],
+                "force_matching_signature": d["force_matching_signature"],
+                "sql_text": normalized.get(d["fingerprint"], d["sql_text"]),
+                "module": d["module"],
+                "parsing_schema": d["parsing_schema"],
+                "sql_ids": [],
+                "new_cursors": 0,
+                **{s: 0 for s in STATS},
+            }
+            ids[key] = set()
+        if d["sql_id"] not in ids[key]:
+            ids[key].add(d["sql_id"])
+            if len(g["sql_ids"]) < TOPSQL_SAMPLE_IDS:
+                g["sql_ids"].append(d["sql_id"])
+        g["new_cursors"] += d["new_cursor"]
+        for s in STATS:
+            g[s] += d[s]
+    for key, g in groups.items():
+        g["statements"] = len(ids[key])
+    return _keep_top(list(groups.values()))
+
+
+def _keep_top(items: List[dict]) -> List[dict]:
+    """Items in the top N by any of STATS (not just elapsed time), heaviest first"""
+    kept: Dict[int, dict] = {}
+    for s in STATS:
+        for item in heapq.nlargest(TOPSQL_TOP_N, items, key=lambda d: d[s]):
+            kept[id(item)] = item
+    return sorted(kept.values(), key=lambda d: d["elapsed_time"], reverse=True)
+
+
+def merge_groups(interval_groups: List[List[dict]], order_by: str = "elapsed_time", limit: int = 10) -> List[dict]:
+    """
+    Sum per-interval groups over a window (times returned in seconds).
+    `statements` is the most distinct sql_ids seen in one interval;
+    `new_cursors` counts cursors loaded (hard parsed) in the window.
+    """
+    totals: Dict[str, dict] = {}
+    for groups in interval_groups:
+        for g in groups:
+            agg = totals.get(g["key"])
+            if agg is None:
+                agg = totals[g["key"]] = {**g, "sql_ids": list(g["sql_ids"])}
+                continue
+            for s in STATS:
+                agg[s] += g[s]
+            agg["new_cursors"] += g["new_cursors"]
+            agg["statements"] = max(agg["statements"], g["statements"])
+            for sql_id in g["sql_ids"]:
+                if len(agg["sql_ids"]) < TOPSQL_SAMPLE_IDS and sql_id not in agg["sql_ids"]:
+                    agg["sql_ids"].append(sql_id)
+    result = heapq.nlargest(limit, totals.values(), key=lambda d: d[order_by])
+    for r in result:
+        r["sql_id"] = r["sql_ids"][0] if r["sql_ids"] else None
+        r["elapsed_time"] = round(r["elapsed_time"] / 1e6, 3)
+        r["cpu_time"] = round(r["cpu_time"] / 1e6, 3)
+    return result
@@ -0,0 +1,561 @@
+"""
+Benchmark suite for the monitoring server.
+
+Runs the server against a local stub agent (bench/stub_agent.py) with every
+target in mock DB mode, drives a set of scenarios and writes the results as
+JSON so runs can be compared between commits.
+
+Run from oracle-monitoring-server/:
+
+    python -m bench.run                                   # all scenarios, server in-process
+    python -m bench.run --mode subprocess --targets 20 --ws-clients 500
+    python -m bench.run --scenarios ws,http --duration 20 --latency-ms 50
+    python -m bench.run --baseline bench/results/abc1234.json --fail-on-regression
+    python -m bench.run compare bench/results/old.json bench/results/new.json
+
+Modes:
+    inprocess   server runs under uvicorn in a thread of this process; event-loop
+                lag is probed on the server loop (RSS includes the load generator)
+    subprocess  server runs as `python -m uvicorn main:app`; RSS is the server's own,
+                loop lag is not available
+
+Scenarios: ws (dashboard WebSocket fan-out), http (/api/performance/* and
+/api/dashboard/metrics), editor (/api/editor/execute with large streamed
+results), upload (multi-statement script through /api/editor/upload).
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import datetime
+from typing import Dict, List, Optional
+
+import httpx
+import uvicorn
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+SCENARIOS = ("ws", "http", "editor", "upload")
+
+# Metric direction for `compare`: True = higher is better
+HIGHER_IS_BETTER = {
+    "throughput_rps": True, "msgs_per_s": True, "rows_per_s": True, "statements_per_s": True,
+    "p50_ms": False, "p99_ms": False, "max_ms": False, "lag_p50_ms": False, "lag_p99_ms": False,
+    "loop_lag_p99_ms": False, "loop_lag_max_ms": False, "rss_peak_mb": False, "errors": False,
+}
+
+
+# --- measurement helpers ---
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    s = sorted(values)
+    return round(s[min(len(s) - 1, int(q * len(s)))], 2)
+
+
+def latency_summary(latencies_ms: List[float], elapsed_s: float, errors: int) -> dict:
+    return {
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "throughput_rps": round(len(latencies_ms) / elapsed_s, 1) if elapsed_s else None,
+        "p50_ms": percentile(latencies_ms, 0.50),
+        "p99_ms": percentile(latencies_ms, 0.99),
+        "max_ms": round(max(latencies_ms), 2) if latencies_ms else None,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if pid is None:
+        import resource
+        # ru_maxrss is KiB on Linux (peak, not current)
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return None
+
+
+class RssSampler:
+    def __init__(self, pid: Optional[int] = None, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            value = rss_mb(self.pid)
+            if value is not None:
+                self.samples.append(value)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def mark(self) -> int:
+        return len(self.samples)
+
+    def peak_since(self, mark: int) -> Optional[float]:
+        window = self.samples[mark:]
+        return max(window) if window else None
+
+    def stop(self):
+        self._stop.set()
+
+
+class LoopLagProbe:
+    """Runs on the server's event loop; records how late each short sleep wakes up"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append((loop.time() - started - self.interval) * 1000)
+
+    def mark(self) -> int:
+        return len(self.samples)
+
+    def summary_since(self, mark: int) -> dict:
+        window = self.samples[mark:]
+        return {
+            "loop_lag_p50_ms": percentile(window, 0.50),
+            "loop_lag_p99_ms": percentile(window, 0.99),
+            "loop_lag_max_ms": round(max(window), 2) if window else None,
+        }
+
+
+# --- servers ---
+
+class ThreadedServer:
+    """uvicorn.Server on its own thread and event loop"""
+
+    def __init__(self, app, port: int):
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self, timeout: float = 30):
+        self.thread.start()
+        deadline = time.time() + timeout
+        while not self.server.started:
+            if time.time() > deadline or not self.thread.is_alive():
+                raise RuntimeError(f"Server on port {self.port} failed to start")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+def prepare_env(args, workdir: str, agent_url: str) -> Dict[str, str]:
+    targets = [{"id": f"bench{i}", "name": f"Bench {i}", "agent_url": agent_url, "mock": True}
+               for i in range(args.targets)]
+    targets_file = os.path.join(workdir, "targets.json")
+    with open(targets_file, "w") as f:
+        json.dump(targets, f)
+    return {
+        "TARGETS_FILE": targets_file,
+        "TSDB_DIR": os.path.join(workdir, "tsdb"),
+        "ALERT_HISTORY_FILE": os.path.join(workdir, "alerts.jsonl"),
+        "DASHBOARD_INTERVAL": str(args.interval),
+        "MOCK_MODE": "true",
+    }
+
+
+def wait_http(url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+# --- scenarios ---
+
+async def run_http(base_url: str, paths: List[str], concurrency: int, duration: float) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client: httpx.AsyncClient, offset: int):
+        nonlocal errors
+        i = offset
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                resp = await client.get(path)
+                await resp.aread()
+                if resp.status_code != 200:
+                    errors += 1
+                    continue
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client, n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latency_summary(latencies, elapsed, errors)
+
+
+async def run_ws(ws_url: str, targets: int, clients: int, duration: float) -> dict:
+    import websockets
+
+    connect_ms: List[float] = []
+    lag_ms: List[float] = []
+    received = 0
+    errors = 0
+    stop = asyncio.Event()
+
+    async def client(n: int):
+        nonlocal received, errors
+        started = time.perf_counter()
+        try:
+            async with websockets.connect(f"{ws_url}?target=bench{n % targets}", max_size=None) as ws:
+                connect_ms.append((time.perf_counter() - started) * 1000)
+                while not stop.is_set():
+                    try:
+                        msg = await asyncio.wait_for(ws.recv(), timeout=1)
+                    except asyncio.TimeoutError:
+                        continue
+                    received += 1
+                    try:
+                        sent = datetime.datetime.fromisoformat(json.loads(msg)["timestamp"])
+                        lag_ms.append((datetime.datetime.now() - sent).total_seconds() * 1000)
+                    except (ValueError, KeyError, TypeError):
+                        pass
+        except Exception:
+            errors += 1
+
+    tasks = [asyncio.create_task(client(n)) for n in range(clients)]
+    started = time.perf_counter()
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    return {
+        "clients": clients,
+        "connected": len(connect_ms),
+        "errors": errors,
+        "messages": received,
+        "msgs_per_s": round(received / elapsed, 1),
+        "connect_p50_ms": percentile(connect_ms, 0.50),
+        "connect_p99_ms": percentile(connect_ms, 0.99),
+        # Sample timestamp -> client receive: collection + fan-out delay
+        "lag_p50_ms": percentile(lag_ms, 0.50),
+        "lag_p99_ms": percentile(lag_ms, 0.99),
+    }
+
+
+async def run_editor(base_url: str, rows: int, concurrency: int, requests: int) -> dict:
+    latencies: List[float] = []
+    first_byte: List[float] = []
+    errors = 0
+    total_bytes = 0
+    queue = list(range(requests))
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors, total_bytes
+        while queue:
+            queue.pop()
+            payload = {"sql": f"SELECT /*rows={rows}*/ * FROM bench", "stream": True}
+            started = time.perf_counter()
+            try:
+                async with client.stream("POST", "/api/editor/execute", json=payload) as resp:
+                    first = None
+                    async for chunk in resp.aiter_raw():
+                        if first is None:
+                            first = time.perf_counter()
+                        total_bytes += len(chunk)
+                    if resp.status_code != 200:
+                        errors += 1
+                        continue
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            first_byte.append(((first or time.perf_counter()) - started) * 1000)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    result = latency_summary(latencies, elapsed, errors)
+    result.update({
+        "rows_per_request": rows,
+        "rows_per_s": round(rows * len(latencies) / elapsed, 1),
+        "mb_per_s": round(total_bytes / elapsed / 1e6, 2),
+        "ttfb_p50_ms": percentile(first_byte, 0.50),
+        "ttfb_p99_ms": percentile(first_byte, 0.99),
+    })
+    return result
+
+
+def make_script(statements: int) -> bytes:
+    parts = ["SET DEFINE OFF\n", "CREATE TABLE bench_t (id NUMBER, name VARCHAR2(50), note VARCHAR2(200));\n"]
+    for i in range(statements):
+        if i % 100 == 99:
+            parts.append(f"UPDATE bench_t SET note = 'batch {i}; done' WHERE id < {i};\n")
+        elif i % 50 == 0:
+            # q-quoted literals fall back to single-statement execution
+            parts.append(f"INSERT INTO bench_t (id, name, note) VALUES ({i}, 'name_{i}', q'[it's row {i}]');\n")
+        else:
+            parts.append(f"INSERT INTO bench_t (id, name, note) VALUES ({i}, 'name_{i}', 'it''s row {i}');\n")
+    parts.append("BEGIN\n  NULL; -- end of script;\nEND;\n/\n")
+    return "".join(parts).encode()
+
+
+async def run_upload(base_url: str, statements: int, iterations: int) -> dict:
+    script = make_script(statements)
+    latencies: List[float] = []
+    errors = 0
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as client:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            try:
+                resp = await client.post("/api/editor/upload", files={"file": ("bench.sql", script)})
+                if resp.status_code != 200 or resp.json().get("status") != "success":
+                    errors += 1
+                    continue
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - t0) * 1000)
+        elapsed = time.perf_counter() - started
+    result = latency_summary(latencies, elapsed, errors)
+    result.update({
+        "script_bytes": len(script),
+        "statements": statements + 3,
+        "statements_per_s": round((statements + 3) * len(latencies) / elapsed, 1),
+    })
+    return result
+
+
+# --- driver ---
+
+def git_revision() -> dict:
+    def git(*cmd):
+        try:
+            return subprocess.run(["git", *cmd], cwd=SERVER_DIR, capture_output=True, text=True,
+                                  timeout=10).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+    return {"commit": git("rev-parse", "--short", "HEAD") or None,
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+async def run_scenarios(args, base_url: str, probe: Optional[LoopLagProbe], rss: RssSampler) -> dict:
+    results = {}
+    ws_url = base_url.replace("http://", "ws://") + "/api/dashboard/ws"
+    http_paths = [
+        "/api/performance/top-sql?window=5m",
+        "/api/performance/ash?minutes=30",
+        "/api/performance/sql/bench0001",
+        "/api/dashboard/metrics",
+        "/api/fleet/summary",
+    ]
+    for name in args.scenarios:
+        print(f"▶ {name} ...", flush=True)
+        lag_mark = probe.mark() if probe else 0
+        rss_mark = rss.mark()
+        if name == "ws":
+            result = await run_ws(ws_url, args.targets, args.ws_clients, args.duration)
+        elif name == "http":
+            result = await run_http(base_url, http_paths, args.concurrency, args.duration)
+        elif name == "editor":
+            result = await run_editor(base_url, args.editor_rows, args.editor_concurrency, args.editor_requests)
+        else:
+            result = await run_upload(base_url, args.script_statements, args.upload_iterations)
+        if probe:
+            result.update(probe.summary_since(lag_mark))
+        result["rss_peak_mb"] = rss.peak_since(rss_mark)
+        results[name] = result
+        print(f"  {json.dumps(result)}", flush=True)
+    return results
+
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="oms-bench-")
+    os.environ["STUB_LATENCY_MS"] = str(args.latency_ms)
+    sys.path.insert(0, BENCH_DIR)
+    import stub_agent
+
+    stub_agent.STUB_LATENCY_MS = args.latency_ms
+    agent_port = free_port()
+    agent = ThreadedServer(stub_agent.app, agent_port)
+    agent.start()
+    env = prepare_env(args, workdir, f"http://127.0.0.1:{agent_port}")
+
+    server_port = free_port()
+    base_url = f"http://127.0.0.1:{server_port}"
+    probe = None
+    proc = None
+    server = None
+    if args.mode == "inprocess":
+        os.environ.update(env)
+        sys.path.insert(0, SERVER_DIR)
+        from main import app
+
+        probe = LoopLagProbe()
+
+        @app.on_event("startup")
+        async def _start_probe():
+            asyncio.get_running_loop().create_task(probe.run())
+
+        server = ThreadedServer(app, server_port)
+        server.start()
+        rss = RssSampler()
+    else:
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+             "--port", str(server_port), "--log-level", "warning"],
+            cwd=SERVER_DIR, env={**os.environ, **env},
+        )
+        rss = RssSampler(proc.pid)
+    try:
+        wait_http(base_url + "/health")
+        rss.start()
+        rss_start = rss_mb(proc.pid if proc else None)
+        # Let the collectors take their first samples
+        time.sleep(min(2 * args.interval, 5))
+        results = asyncio.run(run_scenarios(args, base_url, probe, rss))
+        rss_end = rss_mb(proc.pid if proc else None)
+    finally:
+        rss.stop()
+        if server:
+            server.stop()
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=10)
+        agent.stop()
+
+    return {
+        "meta": {
+            **git_revision(),
+            "started": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mode": args.mode,
+            "params": {k: v for k, v in vars(args).items() if k not in ("out", "baseline", "command")},
+        },
+        "process": {"rss_start_mb": rss_start, "rss_end_mb": rss_end,
+                    "rss_peak_mb": max(rss.samples) if rss.samples else None},
+        "results": results,
+    }
+
+
+def compare(base: dict, new: dict, threshold: float) -> List[str]:
+    """Print metric deltas between two result files; returns the regressions"""
+    regressions = []
+    print(f"{'scenario':<10} {'metric':<20} {'base':>12} {'new':>12} {'change':>9}")
+    for scenario, metrics in new.get("results", {}).items():
+        old = base.get("results", {}).get(scenario, {})
+        for metric, value in metrics.items():
+            if metric not in HIGHER_IS_BETTER or value is None or old.get(metric) is None:
+                continue
+            prev = old[metric]
+            change = (value - prev) / prev if prev else (0.0 if value == prev else float("inf"))
+            worse = -change if HIGHER_IS_BETTER[metric] else change
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSION"
+                regressions.append(f"{scenario}.{metric}")
+            print(f"{scenario:<10} {metric:<20} {prev:>12} {value:>12} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monitoring server benchmark suite")
+    sub = parser.add_subparsers(dest="command")
+    cmp_parser = sub.add_parser("compare", help="compare two result files")
+    cmp_parser.add_argument("base")
+    cmp_parser.add_argument("new")
+    cmp_parser.add_argument("--threshold", type=float, default=0.10)
+
+    parser.add_argument("--mode", choices=("inprocess", "subprocess"), default="inprocess")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        type=lambda s: [x for x in s.split(",") if x])
+    parser.add_argument("--duration", type=float, default=10, help="seconds per timed scenario")
+    parser.add_argument("--targets", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=1.0, help="DASHBOARD_INTERVAL for the server")
+    parser.add_argument("--latency-ms", type=float, default=10, help="stub agent latency per call")
+    parser.add_argument("--ws-clients", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32, help="HTTP workers")
+    parser.add_argument("--editor-rows", type=int, default=100000)
+    parser.add_argument("--editor-concurrency", type=int, default=4)
+    parser.add_argument("--editor-requests", type=int, default=8)
+    parser.add_argument("--script-statements", type=int, default=20000)
+    parser.add_argument("--upload-iterations", type=int, default=3)
+    parser.add_argument("--out", help="result file (default bench/results/<commit>.json)")
+    parser.add_argument("--baseline", help="compare against this result file after the run")
+    parser.add_argument("--threshold", type=float, default=0.10, help="regression threshold (fraction)")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        return 1 if compare(base, new, args.threshold) else 0
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    report = run(args)
+    out = args.out
+    if not out:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        name = report["meta"]["commit"] or datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        out = os.path.join(RESULTS_DIR, f"{name}{'-dirty' if report['meta']['dirty'] else ''}.json")
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Results written to {out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions and args.fail_on_regression:
+            print(f"❌ Regressions: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Stand-in for oracle-monitoring-agent used by the benchmark suite.
+
+Serves the agent endpoints the server calls with synthetic data and a fixed
+artificial latency (STUB_LATENCY_MS), so server-side overhead can be measured
+without Oracle. Result sizes for /execute come from a `/*rows=N*/` hint in the
+SQL text (default STUB_DEFAULT_ROWS).
+"""
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import datetime
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "10"))
+STUB_DEFAULT_ROWS = int(os.getenv("STUB_DEFAULT_ROWS", "100"))
+STUB_FETCH_SIZE = 1000
+
+WAIT_CLASSES = ["CPU", "User I/O", "System I/O", "Concurrency", "Commit"]
+ROWS_HINT = re.compile(r"/\*\s*rows\s*=\s*(\d+)\s*\*/", re.IGNORECASE)
+
+app = FastAPI(title="Stub Oracle Monitoring Agent")
+
+
+class QueryRequest(BaseModel):
+    sql: str
+    stream: bool = False
+    max_rows: Optional[int] = None
+    cursor: Optional[str] = None
+    fetch_size: int = STUB_FETCH_SIZE
+    query_id: Optional[str] = None
+    timeout_ms: Optional[int] = None
+
+
+class ExecuteManyRequest(BaseModel):
+    sql: str
+    rows: List[List[Optional[str]]]
+    types: List[Optional[str]] = []
+    query_id: Optional[str] = None
+    timeout_ms: Optional[int] = None
+
+
+async def _latency():
+    if STUB_LATENCY_MS > 0:
+        await asyncio.sleep(STUB_LATENCY_MS / 1000)
+
+
+@app.get("/")
+async def health():
+    return {"status": "running", "agent": "stub"}
+
+
+@app.get("/metrics/ash")
+async def ash(granularity: str = "minute", group_by: str = "wait_class",
+              minutes: Optional[int] = None, limit: Optional[int] = None):
+    await _latency()
+    now = datetime.datetime.now().replace(second=0, microsecond=0)
+    result = []
+    for m in range(minutes or 30):
+        label = (now - datetime.timedelta(minutes=m)).strftime("%H:%M")
+        for wc in WAIT_CLASSES:
+            result.append({"time": label, "wait_class": wc, "active_sessions": round(random.uniform(0, 8), 2)})
+    return result
+
+
+@app.get("/metrics/sessions")
+async def sessions():
+    await _latency()
+    return {"ts": time.time(), "cpu_load": random.uniform(10, 95), "active_sessions": random.randint(1, 60)}
+
+
+@app.get("/metrics/top-sql")
+async def top_sql(window: str = "5m", order_by: str = "elapsed_time", limit: int = 10):
+    await _latency()
+    return [{
+        "sql_id": f"stub{i:09d}",
+        "sql_text": f"SELECT /* stub {i} */ * FROM orders WHERE id = :1",
+        "elapsed_time": round(random.uniform(0.1, 100), 3),
+        "cpu_time": round(random.uniform(0.1, 50), 3),
+        "executions": random.randint(1, 10000),
+        "module": "bench",
+        "parsing_schema": "APP",
+    } for i in range(limit)]
+
+
+@app.get("/metrics/blocking")
+async def blocking(fresh: bool = False):
+    await _latency()
+    return {"ts": time.time(), "sessions": 100, "blocked_sessions": 0, "root_blockers": 0, "max_depth": 0,
+            "max_blocked_per_root": 0, "longest_wait_seconds": 0, "sessions_in_cycles": 0,
+            "cycles": [], "roots": []}
+
+
+@app.get("/metrics/sql/{sql_id}")
+async def sql_stats(sql_id: str, text: bool = True):
+    await _latency()
+    return {"sql_id": sql_id, "sql_text": f"SELECT /* {sql_id} */ * FROM orders" if text else None,
+            "plans": [{"plan_hash_value": 1234567890, "executions": random.randint(1, 10000),
+                       "elapsed_time": round(random.uniform(0.1, 100), 3), "cpu_time": round(random.uniform(0.1, 50), 3),
+                       "buffer_gets": random.randint(1000, 100000), "disk_reads": 0, "rows_processed": 100,
+                       "last_active_time": time.time()}]}
+
+
+@app.get("/metrics/sql/{sql_id}/plan/{plan_hash_value}")
+async def sql_plan(sql_id: str, plan_hash_value: int):
+    await _latency()
+    return [{"id": i, "parent_id": i - 1 if i else None, "depth": i, "operation": "TABLE ACCESS" if i else "SELECT STATEMENT",
+             "options": "FULL" if i else "", "object": "APP.ORDERS" if i else "", "cost": 10, "cardinality": 100,
+             "bytes": None, "access_predicates": None, "filter_predicates": None} for i in range(2)]
+
+
+def _rows(n: int, start: int = 0):
+    for i in range(start, start + n):
+        yield [i, f"Item_{i}", "ACTIVE", "2023-01-01 12:00:00", i % 1000]
+
+
+def _messages(request: QueryRequest):
+    m = ROWS_HINT.search(request.sql)
+    total = int(m.group(1)) if m else STUB_DEFAULT_ROWS
+    if request.max_rows is not None:
+        total = min(total, request.max_rows)
+    if not request.sql.lstrip().upper().startswith(("SELECT", "WITH", "/*")):
+        yield {"type": "end", "query_id": request.query_id, "message": "Executed. Rows affected: 1"}
+        return
+    yield {"type": "meta", "query_id": request.query_id, "columns": ["ID", "NAME", "STATUS", "CREATED_AT", "VALUE"]}
+    size = max(1, request.fetch_size)
+    for start in range(0, total, size):
+        yield {"type": "rows", "rows": list(_rows(min(size, total - start), start))}
+    yield {"type": "end", "query_id": request.query_id, "row_count": total, "next_cursor": None}
+
+
+@app.post("/execute")
+async def execute(request: QueryRequest):
+    await _latency()
+    if request.stream:
+        lines = (json.dumps(msg) + "\n" for msg in _messages(request))
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+    result = {"status": "success"}
+    rows = []
+    for msg in _messages(request):
+        if msg["type"] == "meta":
+            result["columns"] = msg["columns"]
+        elif msg["type"] == "rows":
+            rows.extend(msg["rows"])
+        elif "message" in msg:
+            result["message"] = msg["message"]
+        else:
+            result["rows"] = rows
+            result["next_cursor"] = None
+    return result
+
+
+@app.post("/execute-many")
+async def execute_many(request: ExecuteManyRequest):
+    await _latency()
+    return {"status": "success", "row_count": len(request.rows),
+            "message": f"Executed. Rows affected: {len(request.rows)}"}
+
+
+@app.get("/queries")
+async def queries():
+    return {"active": []}
+
+
+@app.post("/queries/{query_id}/cancel")
+async def cancel(query_id: str):
+    raise HTTPException(status_code=404, detail=f"No running query with id {query_id}")
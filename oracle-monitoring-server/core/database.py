@@ -1,105 +1,352 @@
 import os
+import time
+import asyncio
 import random
-from typing import Dict, Any
+from typing import Dict, Any, Optional, List, Set
 
-# Environment variables
-DB_USER = os.getenv("DB_USER", "system")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "oracle")
-DB_DSN = os.getenv("DB_DSN", "localhost/orclpdb1")
-MOCK_MODE = os.getenv("MOCK_MODE", "true").lower() == "true"
+from core.targets import Target, get_target, list_targets, DEFAULT_TARGET
+from core import instrumentation, profiling
 
-pool = None
+# Pool sizing and per-query call timeout
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "5"))
+DB_POOL_INCREMENT = int(os.getenv("DB_POOL_INCREMENT", "1"))
+DB_CALL_TIMEOUT_MS = int(os.getenv("DB_CALL_TIMEOUT_MS", "5000"))
 
-async def init_db():
-    "Initialize DB connection pool (or Mock setup)"
-    global pool, MOCK_MODE
-    if MOCK_MODE:
-        print("⚡ Running in MOCK MODE (No real DB connection)")
+# Thick mode is opt-in: the native asyncio pool is only available in Thin mode
+DB_THICK_MODE = os.getenv("DB_THICK_MODE", "false").lower() == "true"
+ORACLE_LIB_DIR = os.getenv("ORACLE_LIB_DIR")
+
+# Connection settings
+DB_INIT_CONCURRENCY = int(os.getenv("DB_INIT_CONCURRENCY", "16"))
+
+# Pool swaps: a replacement pool must be warm within DB_WARM_TIMEOUT, and the
+# retired pool gets DB_DRAIN_TIMEOUT for in-flight calls before it is force-closed
+DB_WARM_TIMEOUT = float(os.getenv("DB_WARM_TIMEOUT", "30"))
+DB_DRAIN_TIMEOUT = float(os.getenv("DB_DRAIN_TIMEOUT", "30"))
+VALIDATION_SQL = "SELECT 1 FROM dual"
+
+# One pool per target id
+pools: Dict[str, "OraclePool"] = {}
+# Pools that were swapped out and are still draining
+_retired: Set["OraclePool"] = set()
+_swap_locks: Dict[str, asyncio.Lock] = {}
+
+_driver = None
+
+def load_driver():
+    """Import python-oracledb once, enabling Thick mode only when configured"""
+    global _driver
+    if _driver is None:
+        import oracledb
+        if DB_THICK_MODE:
+            try:
+                oracledb.init_oracle_client(lib_dir=ORACLE_LIB_DIR)
+            except Exception as e:
+                print(f"⚠️ Thick mode init failed, staying in Thin mode: {e}")
+        _driver = oracledb
+    return _driver
+
+
+class OraclePool:
+    """
+    Awaitable wrapper around an Oracle connection pool.
+
+    Thin mode uses the driver's native asyncio pool. Thick mode has no asyncio
+    support, so a regular pool is used and each call is offloaded to a worker
+    thread to keep the event loop free.
+
+    Once a pool is swapped out (`replacement` set) it forwards new calls to its
+    replacement, so callers holding a stale reference never hit a closed pool.
+    """
+
+    def __init__(self, raw_pool, dsn, is_async, call_timeout_ms=DB_CALL_TIMEOUT_MS, target_id=DEFAULT_TARGET,
+                 min=DB_POOL_MIN, max=DB_POOL_MAX, increment=DB_POOL_INCREMENT):
+        self._pool = raw_pool
+        self.dsn = dsn
+        self.is_async = is_async
+        self.call_timeout_ms = call_timeout_ms
+        self.target_id = target_id
+        self.min = min
+        self.max = max
+        self.increment = increment
+        self.inflight = 0
+        self.replacement: Optional["OraclePool"] = None
+        self._wait = instrumentation.POOL_WAIT.labels(target_id)
+
+    @classmethod
+    async def create(cls, user, password, dsn,
+                     min=DB_POOL_MIN, max=DB_POOL_MAX, increment=DB_POOL_INCREMENT,
+                     call_timeout_ms=DB_CALL_TIMEOUT_MS, target_id=DEFAULT_TARGET):
+        oracledb = load_driver()
+        params = dict(user=user, password=password, dsn=dsn,
+                      min=min, max=max, increment=increment)
+        sizes = dict(min=min, max=max, increment=increment)
+        if oracledb.is_thin_mode():
+            raw_pool = oracledb.create_pool_async(**params)
+            return cls(raw_pool, dsn, True, call_timeout_ms, target_id, **sizes)
+        # Thick pool creation opens `min` connections synchronously
+        raw_pool = await asyncio.to_thread(oracledb.create_pool, **params)
+        return cls(raw_pool, dsn, False, call_timeout_ms, target_id, **sizes)
+
+    @property
+    def busy(self) -> int:
+        return self._pool.busy
+
+    @property
+    def opened(self) -> int:
+        return self._pool.opened
+
+    def settings(self) -> dict:
+        return {"min": self.min, "max": self.max, "increment": self.increment,
+                "call_timeout_ms": self.call_timeout_ms}
+
+    async def _run(self, sql, params, timeout_ms, fetch):
+        if self.replacement is not None:
+            return await self.replacement._run(sql, params, timeout_ms, fetch)
+        timeout_ms = self.call_timeout_ms if timeout_ms is None else timeout_ms
+        self.inflight += 1
+        started = time.perf_counter()
+        try:
+            if not self.is_async:
+                return await asyncio.to_thread(self._run_sync, sql, params, timeout_ms, fetch)
+            return await self._run_async(sql, params, timeout_ms, fetch)
+        finally:
+            self.inflight -= 1
+            profiling.record("db", time.perf_counter() - started)
+
+    async def _run_async(self, sql, params, timeout_ms, fetch):
+        started = time.perf_counter()
+        async with self._pool.acquire() as conn:
+            self._wait.observe(time.perf_counter() - started)
+            conn.call_timeout = timeout_ms
+            with conn.cursor() as cursor:
+                await cursor.execute(sql, params or {})
+                if fetch == "one":
+                    return await cursor.fetchone()
+                if fetch == "all":
+                    return await cursor.fetchall()
+                await conn.commit()
+                return cursor.rowcount
+
+    def _run_sync(self, sql, params, timeout_ms, fetch):
+        started = time.perf_counter()
+        with self._pool.acquire() as conn:
+            self._wait.observe(time.perf_counter() - started)
+            conn.call_timeout = timeout_ms
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params or {})
+                if fetch == "one":
+                    return cursor.fetchone()
+                if fetch == "all":
+                    return cursor.fetchall()
+                conn.commit()
+                return cursor.rowcount
+
+    async def fetchone(self, sql: str, params=None, timeout_ms: Optional[int] = None):
+        return await self._run(sql, params, timeout_ms, "one")
+
+    async def fetchall(self, sql: str, params=None, timeout_ms: Optional[int] = None) -> List[tuple]:
+        return await self._run(sql, params, timeout_ms, "all")
+
+    async def execute(self, sql: str, params=None, timeout_ms: Optional[int] = None) -> int:
+        return await self._run(sql, params, timeout_ms, None)
+
+    async def warm(self):
+        """Open `min` connections and validate each one before the pool takes traffic"""
+        await asyncio.gather(*[self.fetchone(VALIDATION_SQL) for _ in range(max(1, self.min))])
+
+    async def drain(self, timeout: float = DB_DRAIN_TIMEOUT) -> bool:
+        """Wait up to `timeout` for in-flight calls, then close. True if nothing was cut off."""
+        deadline = time.monotonic() + timeout
+        while self.inflight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        clean = self.inflight == 0
+        await self.close(force=not clean)
+        return clean
+
+    async def close(self, force: bool = False):
+        if self.is_async:
+            await self._pool.close(force=force)
+        else:
+            await asyncio.to_thread(self._pool.close, force)
+
+
+async def init_target_db(target: Target):
+    "Initialize one target's connection pool (or Mock setup)"
+    if target.mock:
+        print(f"⚡ [{target.id}] Running in MOCK MODE (No real DB connection)")
         return
-    
+
     try:
-        import oracledb
+        pool = await OraclePool.create(target.user, target.password, target.dsn, target_id=target.id)
+        pools[target.id] = pool
+        # Validate credentials up front so we fail over to mock at startup, not per query
+        await asyncio.wait_for(pool.warm(), DB_WARM_TIMEOUT)
+        mode = "async" if pool.is_async else "thick/threaded"
+        print(f"✅ [{target.id}] Connected to Oracle DB: {target.dsn} ({mode}, pool {DB_POOL_MIN}-{DB_POOL_MAX})")
+    except Exception as e:
+        print(f"❌ [{target.id}] DB Connection Failed: {e}")
+        print(f"⚠️ [{target.id}] Falling back to MOCK MODE due to connection failure")
+        instrumentation.MOCK_FALLBACK.labels(target.id, "connect").inc()
+        await close_target_db(target.id)
+        target.mock = True
+
+async def init_db():
+    "Initialize pools for every registered target, a bounded number at a time"
+    sem = asyncio.Semaphore(DB_INIT_CONCURRENCY)
+
+    async def _init(target):
+        async with sem:
+            await init_target_db(target)
+
+    await asyncio.gather(*[_init(t) for t in list_targets()])
+
+async def close_target_db(target_id: str):
+    pool = pools.pop(target_id, None)
+    if pool:
+        try:
+            await pool.close(force=True)
+        except Exception as e:
+            print(f"⚠️ [{target_id}] Error closing pool: {e}")
+
+async def close_db():
+    await asyncio.gather(*[close_target_db(tid) for tid in list(pools)])
+    for pool in list(_retired):
+        _retired.discard(pool)
         try:
-            oracledb.init_oracle_client()
+            await pool.close(force=True)
         except Exception:
             pass
-        # Initialize Oracle Client (Thin mode default, Thick mode if lib dir set)
-        pool = oracledb.create_pool(
-            user=DB_USER,
-            password=DB_PASSWORD,
-            dsn=DB_DSN,
-            min=2,
-            max=5,
-            increment=1
-        )
-        print(f"✅ Connected to Oracle DB: {DB_DSN}")
-    except Exception as e:
-        print(f"❌ DB Connection Failed: {e}")
-        print("⚠️ Falling back to MOCK MODE due to connection failure")
-        MOCK_MODE = True
-
-async def reconnect_db(user, password, dsn):
-    """Re-establish DB connection pool dynamically from Settings"""
-    global pool, MOCK_MODE, DB_USER, DB_PASSWORD, DB_DSN
-    
+
+def get_pool(target_id: str = DEFAULT_TARGET) -> Optional["OraclePool"]:
+    return pools.get(target_id)
+
+def is_mock(target_id: str = DEFAULT_TARGET) -> bool:
+    return get_target(target_id).mock or target_id not in pools
+
+def _swap_lock(target_id: str) -> asyncio.Lock:
+    if target_id not in _swap_locks:
+        _swap_locks[target_id] = asyncio.Lock()
+    return _swap_locks[target_id]
+
+async def _drain_retired(pool: "OraclePool"):
     try:
-        import oracledb
-        
-        # Close existing pool
-        if pool:
-            try:
-                pool.close(force=True)
-            except Exception as e:
-                print(f"⚠️ Error closing old pool: {e}")
-                
-        # Create new pool
-        new_pool = oracledb.create_pool(
-            user=user,
-            password=password,
-            dsn=dsn,
-            min=2,
-            max=5,
-            increment=1
-        )
-        
-        # Update globals only on success
-        pool = new_pool
-        DB_USER = user
-        DB_PASSWORD = password
-        DB_DSN = dsn
-        MOCK_MODE = False
-        
-        print(f"✅ Dynamically connected to Oracle DB: {DB_DSN}")
-        return True, f"Successfully connected to {DB_DSN}"
-        
+        if await pool.drain():
+            print(f"♻️ [{pool.target_id}] Old pool drained and closed")
+        else:
+            print(f"⚠️ [{pool.target_id}] Old pool force-closed after {DB_DRAIN_TIMEOUT:.0f}s with {pool.inflight} call(s) in flight")
     except Exception as e:
-        print(f"❌ Dynamic DB Connection Failed: {e}")
-        return False, str(e)
+        print(f"⚠️ [{pool.target_id}] Error closing old pool: {e}")
+    finally:
+        _retired.discard(pool)
+
+def swap_pool(target_id: str, new_pool: "OraclePool"):
+    """Route new acquisitions to `new_pool` at once; drain the old pool in the background"""
+    old_pool = pools.get(target_id)
+    pools[target_id] = new_pool
+    if old_pool is not None and old_pool is not new_pool:
+        old_pool.replacement = new_pool
+        _retired.add(old_pool)
+        asyncio.create_task(_drain_retired(old_pool))
 
-async def get_db_metrics() -> Dict[str, Any]:
+async def reconnect_db(user, password, dsn, target_id: str = DEFAULT_TARGET, settings: Optional[dict] = None):
+    """
+    Re-establish a target's DB connection pool dynamically (blue/green).
+
+    The new pool is built with the current pool's settings (overridden by
+    `settings`) and warmed before it replaces the current one. The current pool
+    keeps serving until the swap and is then drained, so in-flight queries
+    finish and nothing falls back to mock data in between.
+    """
+    target = get_target(target_id)
+
+    async with _swap_lock(target_id):
+        current = pools.get(target_id)
+        config = current.settings() if current else {
+            "min": DB_POOL_MIN, "max": DB_POOL_MAX, "increment": DB_POOL_INCREMENT,
+            "call_timeout_ms": DB_CALL_TIMEOUT_MS,
+        }
+        config.update(settings or {})
+
+        new_pool = None
+        try:
+            new_pool = await OraclePool.create(user, password, dsn, target_id=target_id, **config)
+            await asyncio.wait_for(new_pool.warm(), DB_WARM_TIMEOUT)
+        except Exception as e:
+            print(f"❌ [{target_id}] Dynamic DB Connection Failed: {e}")
+            if new_pool:
+                try:
+                    await new_pool.close(force=True)
+                except Exception:
+                    pass
+            return False, str(e)
+
+        # No await between the swap and the target update: both change together
+        swap_pool(target_id, new_pool)
+        target.user = user
+        target.password = password
+        target.dsn = dsn
+        target.mock = False
+
+    print(f"✅ [{target_id}] Dynamically connected to Oracle DB: {dsn} (pool {config['min']}-{config['max']})")
+    return True, f"Successfully connected to {dsn}"
+
+async def configure_pool(target_id: str = DEFAULT_TARGET, **settings):
+    """
+    Change a live pool's settings. A new call timeout applies in place; size
+    changes rebuild the pool with the same credentials via a blue/green swap.
+    """
+    pool = pools.get(target_id)
+    if pool is None or get_target(target_id).mock:
+        return False, f"Target {target_id} has no live pool (mock mode)"
+
+    merged = {**pool.settings(), **settings}
+    if merged["min"] > merged["max"]:
+        return False, "min must not exceed max"
+    if {k: v for k, v in merged.items() if k != "call_timeout_ms"} == \
+            {k: v for k, v in pool.settings().items() if k != "call_timeout_ms"}:
+        pool.call_timeout_ms = merged["call_timeout_ms"]
+        return True, f"Call timeout set to {pool.call_timeout_ms} ms"
+
+    target = get_target(target_id)
+    success, message = await reconnect_db(target.user, target.password, target.dsn, target_id, merged)
+    return success, (f"Pool resized to {merged['min']}-{merged['max']}" if success else message)
+
+def pool_status(target_id: str = DEFAULT_TARGET) -> Optional[dict]:
+    pool = pools.get(target_id)
+    if pool is None:
+        return None
+    return {
+        **pool.settings(),
+        "busy": pool.busy,
+        "opened": pool.opened,
+        "inflight": pool.inflight,
+        "draining": sum(1 for p in _retired if p.target_id == target_id),
+    }
+
+async def get_db_metrics(target_id: str = DEFAULT_TARGET) -> Dict[str, Any]:
     """Fetch system metrics from DB or Generate Mock Data"""
-    if MOCK_MODE:
+    pool = pools.get(target_id)
+    if get_target(target_id).mock or not pool:
         return _generate_mock_metrics()
-    
+
     # Real DB Query
     try:
-        if not pool:
-            return _generate_mock_metrics()
-            
-        async with pool.acquire() as conn:
-            async with conn.cursor() as cursor:
-                # Example: Get Average Active Sessions (AAS)
-                await cursor.execute("SELECT count(*) FROM v$session WHERE status = 'ACTIVE' AND type != 'BACKGROUND'")
-                row = await cursor.fetchone()
-                active_sessions = row[0] if row else 0
-                
-                # Mocking others for now as real queries are complex
-                base_mock = _generate_mock_metrics()
-                base_mock['active_sessions'] = active_sessions
-                return base_mock
-                
+        # Example: Get Average Active Sessions (AAS)
+        started = time.perf_counter()
+        row = await pool.fetchone("SELECT count(*) FROM v$session WHERE status = 'ACTIVE' AND type != 'BACKGROUND'")
+        instrumentation.COLLECTOR_QUERY.labels(target_id, "active_sessions").observe(time.perf_counter() - started)
+        active_sessions = row[0] if row else 0
+
+        # Mocking others for now as real queries are complex
+        base_mock = _generate_mock_metrics()
+        base_mock['active_sessions'] = active_sessions
+        return base_mock
+
     except Exception as e:
-        print(f"Query Error: {e}")
+        print(f"[{target_id}] Query Error: {e}")
+        instrumentation.MOCK_FALLBACK.labels(target_id, "db_query").inc()
         return _generate_mock_metrics()
 
 def _generate_mock_metrics():
@@ -0,0 +1,184 @@
+"""
+Self-instrumentation: Prometheus / OpenMetrics metrics about the monitor itself.
+
+Hot paths only pay for a histogram observe or a counter increment, usually on
+a label child bound once up front. Everything that describes current state
+(pool usage, WebSocket subscribers and send queues, cache counters, agent
+links) is read at scrape time by StateCollector, so it costs nothing between
+scrapes.
+
+prometheus_client is optional: without it every metric is a no-op and
+/metrics answers 503.
+"""
+import os
+import time
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Histogram, REGISTRY
+    from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+except ImportError:
+    prometheus_client = None
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true" and prometheus_client is not None
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Noop:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, value=1):
+        pass
+
+
+def _histogram(name, doc, labels):
+    if not METRICS_ENABLED:
+        return _Noop()
+    return Histogram(name, doc, labels, buckets=LATENCY_BUCKETS)
+
+
+def _counter(name, doc, labels):
+    if not METRICS_ENABLED:
+        return _Noop()
+    return Counter(name, doc, labels)
+
+
+HTTP_LATENCY = _histogram("oms_http_request_duration_seconds",
+                          "HTTP request latency by route template", ["method", "route", "status"])
+COLLECTOR_QUERY = _histogram("oms_collector_query_duration_seconds",
+                             "Latency of one collector query (DB or agent call)", ["target", "query"])
+COLLECTOR_SAMPLE = _histogram("oms_collector_sample_duration_seconds",
+                              "Wall time of one dashboard collector tick", ["target"])
+COLLECTOR_ERRORS = _counter("oms_collector_errors_total",
+                            "Collector ticks that failed", ["target", "reason"])
+LOOP_LAG = _histogram("oms_event_loop_lag_seconds",
+                      "Extra delay waking a sleeping task (PROFILING_ENABLED only)", [])
+MOCK_FALLBACK = _counter("oms_mock_fallback_total",
+                         "Times real data was replaced by mock data after an error", ["target", "source"])
+POOL_WAIT = _histogram("oms_db_pool_wait_seconds",
+                       "Time spent waiting for a pooled DB connection", ["target"])
+AGENT_LATENCY = _histogram("oms_agent_request_duration_seconds",
+                           "Server -> agent HTTP round-trip latency", ["agent"])
+AGENT_ERRORS = _counter("oms_agent_errors_total",
+                        "Server -> agent requests that failed", ["agent"])
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every HTTP request. The route label is the
+    matched route template (e.g. /api/performance/sql/{sql_id}), never the raw
+    path, to keep cardinality bounded. WebSockets pass straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_LATENCY.labels(scope["method"], route, str(status)).observe(time.perf_counter() - started)
+
+
+class StateCollector:
+    """Gauges read at scrape time from the live server objects"""
+
+    def describe(self):
+        # Skip the registration-time collect(): it would import half the app
+        return []
+
+    def collect(self):
+        from core import database
+        from core.targets import list_targets
+        from services.broadcaster import all_broadcasters
+        from services.agent_client import agent_stats
+        from services.cache import cache_stats
+
+        mock = GaugeMetricFamily("oms_target_mock", "1 if the target is served mock data", labels=["target"])
+        busy = GaugeMetricFamily("oms_db_pool_busy", "Connections in use", labels=["target"])
+        opened = GaugeMetricFamily("oms_db_pool_opened", "Connections open", labels=["target"])
+        for target in list_targets():
+            mock.add_metric([target.id], 1 if database.is_mock(target.id) else 0)
+            pool = database.get_pool(target.id)
+            if pool is not None:
+                busy.add_metric([target.id], pool.busy)
+                opened.add_metric([target.id], pool.opened)
+        yield mock
+        yield busy
+        yield opened
+
+        subscribers = GaugeMetricFamily("oms_ws_subscribers", "Connected dashboard WebSockets", labels=["target"])
+        depth = GaugeMetricFamily("oms_ws_send_queue_depth", "Frames waiting in subscriber send queues",
+                                  labels=["target"])
+        depth_max = GaugeMetricFamily("oms_ws_send_queue_depth_max", "Deepest subscriber send queue",
+                                      labels=["target"])
+        dropped = CounterMetricFamily("oms_ws_dropped_frames", "Frames discarded for slow subscribers",
+                                      labels=["target"])
+        age = GaugeMetricFamily("oms_collector_last_sample_age_seconds", "Seconds since the last good sample",
+                                labels=["target"])
+        failures = GaugeMetricFamily("oms_collector_consecutive_failures", "Failed ticks in a row",
+                                     labels=["target"])
+        now = time.time()
+        for target_id, b in list(all_broadcasters().items()):
+            sizes = [sub.queue.qsize() for sub in list(b.subscribers)]
+            subscribers.add_metric([target_id], len(sizes))
+            depth.add_metric([target_id], sum(sizes))
+            depth_max.add_metric([target_id], max(sizes, default=0))
+            dropped.add_metric([target_id], b.dropped_frames + sum(sub.dropped for sub in list(b.subscribers)))
+            if b.last_sample_at is not None:
+                age.add_metric([target_id], now - b.last_sample_at)
+            failures.add_metric([target_id], b.consecutive_failures)
+        yield subscribers
+        yield depth
+        yield depth_max
+        yield dropped
+        yield age
+        yield failures
+
+        cache = CounterMetricFamily("oms_cache_events", "Response cache events", labels=["cache", "event"])
+        for name, stats in cache_stats().items():
+            for event in ("hits", "stale_hits", "misses", "coalesced", "evictions", "errors"):
+                cache.add_metric([name, event], stats.get(event, 0))
+        yield cache
+
+        retries = CounterMetricFamily("oms_agent_retries", "Server -> agent retries", labels=["agent"])
+        for url, stats in agent_stats().items():
+            retries.add_metric([url], stats["retries"])
+        yield retries
+
+
+def metrics_response(accept: str = ""):
+    """Render the registry, in OpenMetrics format when the scraper asks for it"""
+    from fastapi.responses import Response, PlainTextResponse
+
+    if not METRICS_ENABLED:
+        return PlainTextResponse("Metrics disabled (set METRICS_ENABLED=true and install prometheus_client)",
+                                 status_code=503)
+    if "application/openmetrics-text" in accept:
+        from prometheus_client.openmetrics.exposition import generate_latest, CONTENT_TYPE_LATEST
+    else:
+        from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+if METRICS_ENABLED:
+    REGISTRY.register(StateCollector())
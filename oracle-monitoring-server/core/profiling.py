@@ -0,0 +1,218 @@
+"""
+Opt-in profiling (PROFILING_ENABLED=true).
+
+- ProfilingMiddleware times every HTTP request and splits it into phases:
+  agent calls, DB queries, JSON serialization (FastJSONResponse) and
+  everything else (event loop, handler code). The breakdown goes out as a
+  Server-Timing header, and requests slower than PROFILE_SLOW_MS are kept
+  in a ring buffer.
+- LoopLagMonitor measures how late the event loop wakes up a sleeping task.
+- SamplingProfiler samples every thread's stack for N seconds and returns
+  collapsed stacks ("frame;frame;frame count"), the input format of
+  flamegraph.pl and speedscope.
+
+Code that does a phase's work calls record(phase, seconds); outside a
+profiled request that is one ContextVar lookup.
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+import contextvars
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+from core import instrumentation
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "1000"))
+PROFILE_SLOW_KEEP = int(os.getenv("PROFILE_SLOW_KEEP", "200"))
+PROFILE_LOOP_INTERVAL = float(os.getenv("PROFILE_LOOP_INTERVAL", "0.25"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+# Optional shared secret for the admin endpoints (X-Admin-Token header)
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN")
+
+PHASES = ("agent", "db", "serialize")
+
+_current: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+    __slots__ = ("open", "seconds", "calls")
+
+    def __init__(self):
+        self.open = True
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+
+
+def record(phase: str, seconds: float):
+    """Add `seconds` to `phase` of the request being handled, if it is profiled"""
+    profile = _current.get()
+    # Tasks spawned by a request inherit its context; stop counting once it has finished
+    if profile is not None and profile.open:
+        profile.seconds[phase] = profile.seconds.get(phase, 0.0) + seconds
+        profile.calls[phase] = profile.calls.get(phase, 0) + 1
+
+
+class LoopLagMonitor:
+    """Sleeps PROFILE_LOOP_INTERVAL at a time; any extra delay is time the loop was busy"""
+
+    def __init__(self, interval: float = PROFILE_LOOP_INTERVAL, keep: int = 240):
+        self.interval = interval
+        self.recent: deque = deque(maxlen=keep)
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.recent.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            instrumentation.LOOP_LAG.observe(lag)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def status(self) -> dict:
+        recent = sorted(self.recent)
+        pick = lambda q: round(recent[min(len(recent) - 1, int(q * len(recent)))] * 1000, 2) if recent else None
+        return {"interval_ms": self.interval * 1000, "last_ms": round(self.recent[-1] * 1000, 2) if recent else None,
+                "p50_ms": pick(0.5), "p99_ms": pick(0.99), "max_ms": round(self.max_lag * 1000, 2)}
+
+
+class SamplingProfiler:
+    """Statistical profiler: a thread reads sys._current_frames() `hz` times a second"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def run(self, seconds: float, hz: float = 100.0) -> str:
+        """Sample for `seconds` and return collapsed stacks; raises RuntimeError if one is already running"""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already being recorded")
+        try:
+            return self._sample(min(seconds, PROFILE_MAX_SECONDS), 1.0 / hz)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float, period: float) -> str:
+        me = threading.get_ident()
+        names = {}
+        stacks: Counter = Counter()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(stack))] += 1
+            time.sleep(period)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware: phase timings per request, a Server-Timing header,
+    and capture of requests slower than PROFILE_SLOW_MS with their breakdown.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        lag_before = loop_monitor.max_lag
+        status = 500
+        first_byte: Optional[float] = None
+
+        async def send_wrapper(message):
+            nonlocal status, first_byte
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                first_byte = time.perf_counter() - started
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(profile, first_byte).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.open = False
+            _current.reset(token)
+            total = time.perf_counter() - started
+            if total * 1000 >= PROFILE_SLOW_MS:
+                slow_requests.appendleft({
+                    "ts": time.time(),
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": scope.get("query_string", b"").decode(errors="replace"),
+                    "route": getattr(scope.get("route"), "path", None),
+                    "status": status,
+                    "total_ms": round(total * 1000, 1),
+                    "first_byte_ms": round(first_byte * 1000, 1) if first_byte is not None else None,
+                    "phases_ms": _breakdown(profile, total),
+                    "calls": dict(profile.calls),
+                    # The loop was stalled this long (at most) while the request ran
+                    "loop_lag_max_ms": round(loop_monitor.max_lag * 1000, 1) if loop_monitor.max_lag > lag_before else None,
+                })
+
+
+def _breakdown(profile: RequestProfile, total: float) -> Dict[str, float]:
+    phases = {p: round(profile.seconds.get(p, 0.0) * 1000, 1) for p in PHASES}
+    # Agent/DB calls may overlap (gather); "other" never goes negative
+    phases["other"] = round(max(0.0, total * 1000 - sum(phases.values())), 1)
+    return phases
+
+
+def _server_timing(profile: RequestProfile, elapsed: float) -> str:
+    parts = [f"{p};dur={profile.seconds[p] * 1000:.1f}" for p in PHASES if p in profile.seconds]
+    parts.append(f"total;dur={elapsed * 1000:.1f}")
+    return ", ".join(parts)
+
+
+slow_requests: deque = deque(maxlen=PROFILE_SLOW_KEEP)
+loop_monitor = LoopLagMonitor()
+sampler = SamplingProfiler()
+
+
+def status() -> dict:
+    return {
+        "enabled": PROFILING_ENABLED,
+        "slow_threshold_ms": PROFILE_SLOW_MS,
+        "slow_requests": len(slow_requests),
+        "loop_lag": loop_monitor.status(),
+        "profiler_running": sampler.running,
+    }
+
+
+def recent_slow(limit: int = 50) -> List[dict]:
+    return list(slow_requests)[:limit]
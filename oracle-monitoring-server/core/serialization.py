@@ -0,0 +1,61 @@
+"""
+JSON encoding for HTTP responses and WebSocket frames.
+
+orjson is used when installed (several times faster than the stdlib and it
+encodes datetime natively); otherwise json with the same fallbacks for
+Decimal, dates and bytes. FastJSONResponse is the app's default response
+class, so every route goes through here. Routes with a typed response_model
+are serialized by pydantic-core, which skips FastAPI's jsonable_encoder.
+"""
+import json
+import time
+import base64
+import datetime
+from decimal import Decimal
+
+from fastapi.responses import JSONResponse
+
+from core import profiling
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, bytes):
+        return base64.b64encode(obj).decode()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+else:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def dumps_str(obj) -> str:
+    """For WebSocket text frames"""
+    return dumps(obj).decode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by dumps(); reports its encode time as the profiling `serialize` phase"""
+
+    def render(self, content) -> bytes:
+        started = time.perf_counter()
+        try:
+            return dumps(content)
+        finally:
+            profiling.record("serialize", time.perf_counter() - started)
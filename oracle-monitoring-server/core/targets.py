@@ -0,0 +1,119 @@
+import os
+import json
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+
+# Fleet definition: a JSON list of targets, e.g.
+# [{"id": "orcl1", "dsn": "db1:1521/orcl", "user": "system", "password": "...",
+#   "agent_url": "http://db1:8001"}]
+TARGETS_FILE = os.getenv("TARGETS_FILE")
+
+DEFAULT_TARGET = "default"
+
+
+class Target:
+    """One monitored database instance and how to reach it"""
+
+    def __init__(self, id: str, name: Optional[str] = None, dsn: Optional[str] = None,
+                 user: Optional[str] = None, password: Optional[str] = None,
+                 agent_url: Optional[str] = None, mock: bool = False, push: bool = False):
+        self.id = id
+        self.name = name or id
+        self.dsn = dsn
+        self.user = user
+        self.password = password
+        self.agent_url = agent_url
+        self.mock = mock
+        # Push targets are fed by their agent's batches instead of a server-side collector
+        self.push = push
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Target":
+        return cls(
+            id=d["id"],
+            name=d.get("name"),
+            dsn=d.get("dsn"),
+            user=d.get("user"),
+            password=d.get("password"),
+            agent_url=d.get("agent_url"),
+            mock=bool(d.get("mock", False)),
+            push=bool(d.get("push", False)),
+        )
+
+    def to_dict(self) -> dict:
+        # Never echo credentials back
+        return {
+            "id": self.id,
+            "name": self.name,
+            "dsn": self.dsn,
+            "user": self.user,
+            "agent_url": self.agent_url,
+            "mock": self.mock,
+            "push": self.push,
+        }
+
+
+_targets: Dict[str, Target] = {}
+
+
+def _default_target() -> Target:
+    return Target(
+        id=DEFAULT_TARGET,
+        dsn=os.getenv("DB_DSN", "localhost/orclpdb1"),
+        user=os.getenv("DB_USER", "system"),
+        password=os.getenv("DB_PASSWORD", "oracle"),
+        agent_url=os.getenv("ORACLE_AGENT_URL"),
+        mock=os.getenv("MOCK_MODE", "true").lower() == "true",
+    )
+
+
+def load_targets():
+    """Populate the registry from TARGETS_FILE, or the single env-configured target"""
+    _targets.clear()
+    if TARGETS_FILE:
+        with open(TARGETS_FILE) as f:
+            for d in json.load(f):
+                t = Target.from_dict(d)
+                _targets[t.id] = t
+        print(f"🎯 Loaded {len(_targets)} targets from {TARGETS_FILE}")
+    if not _targets:
+        t = _default_target()
+        _targets[t.id] = t
+
+
+def get_target(target_id: str = DEFAULT_TARGET) -> Target:
+    """Look up a target; raises KeyError if it isn't registered"""
+    if not _targets:
+        load_targets()
+    return _targets[target_id]
+
+
+def list_targets() -> List[Target]:
+    if not _targets:
+        load_targets()
+    return list(_targets.values())
+
+
+def register_target(target: Target):
+    if not _targets:
+        load_targets()
+    _targets[target.id] = target
+
+
+def remove_target(target_id: str) -> Optional[Target]:
+    return _targets.pop(target_id, None)
+
+
+def target_param(target: Optional[str] = None) -> str:
+    """
+    FastAPI dependency: the `?target=` query parameter, validated against the
+    registry. Defaults to the "default" target, or the first one in a fleet file.
+    """
+    if target is None:
+        targets = list_targets()
+        target = DEFAULT_TARGET if DEFAULT_TARGET in _targets else targets[0].id
+    try:
+        get_target(target)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown target: {target}")
+    return target
@@ -0,0 +1,412 @@
+import os
+import mmap
+import time
+import struct
+import bisect
+import asyncio
+import threading
+from collections import OrderedDict
+from urllib.parse import quote, unquote
+from typing import Dict, List, Optional, Tuple
+
+# Embedded time-series store.
+#
+# Layout: <TSDB_DIR>/<series>/<resolution>/<YYYYMMDD>.bin
+# Every file is append-only and holds fixed-width little-endian records sorted
+# by time, one column per series, so range reads are a binary search + slice.
+# Samples older than a series' last one are rejected to keep that order.
+#   raw:     (ts_ms int64, value float64)                          16 bytes
+#   rollups: (ts_ms int64, min, max, sum, count float64)          40 bytes
+
+TSDB_DIR = os.getenv("TSDB_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "tsdb"))
+
+RAW = "raw"
+# Rollup resolutions in seconds, finest first
+ROLLUPS = [("10s", 10), ("1m", 60), ("1h", 3600)]
+
+# Retention per resolution (days)
+RETENTION_DAYS = {
+    RAW: float(os.getenv("TSDB_RETENTION_RAW_DAYS", "1")),
+    "10s": float(os.getenv("TSDB_RETENTION_10S_DAYS", "7")),
+    "1m": float(os.getenv("TSDB_RETENTION_1M_DAYS", "30")),
+    "1h": float(os.getenv("TSDB_RETENTION_1H_DAYS", "400")),
+}
+
+# Nominal spacing of raw samples (the dashboard collector interval)
+TSDB_RAW_INTERVAL = float(os.getenv("DASHBOARD_INTERVAL", "2"))
+
+# Upper bound on points returned by a range query (picks the resolution)
+TSDB_MAX_POINTS = int(os.getenv("TSDB_MAX_POINTS", "2000"))
+
+# Append handles kept open at once (least recently used are closed; a fleet has thousands of
+# files). 0 sizes it from the process's descriptor limit, see _open_file_budget()
+TSDB_MAX_OPEN_FILES = int(os.getenv("TSDB_MAX_OPEN_FILES", "0"))
+# Samples queued for the flusher; beyond this (flusher stalled) new samples are dropped
+TSDB_MAX_PENDING = int(os.getenv("TSDB_MAX_PENDING", "1000000"))
+# Buffered writes are flushed (and retention checked) by a background task this often
+TSDB_FLUSH_INTERVAL = float(os.getenv("TSDB_FLUSH_INTERVAL", "5"))
+
+RAW_REC = struct.Struct("<qd")
+ROLLUP_REC = struct.Struct("<qdddd")
+DAY_MS = 86400 * 1000
+
+
+def _open_file_budget() -> int:
+    """
+    Half the descriptor limit, after raising the soft limit towards the hard
+    one: every series has 4 files (raw + rollups), and an LRU smaller than the
+    fleet's file count reopens files on every flush.
+    """
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 256
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    want = 65536 if hard == resource.RLIM_INFINITY else min(hard, 65536)
+    if soft != resource.RLIM_INFINITY and soft < want:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (want, hard))
+            soft = want
+        except (ValueError, OSError):
+            pass
+    return max(64, min(soft, 65536) // 2)
+
+
+def _day_key(ts_ms: int) -> str:
+    return time.strftime("%Y%m%d", time.gmtime(ts_ms / 1000))
+
+
+class _Bucket:
+    __slots__ = ("start", "min", "max", "sum", "count")
+
+    def __init__(self, start: int, value: float):
+        self.start = start
+        self.min = self.max = self.sum = value
+        self.count = 1
+
+    def add(self, value: float):
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.sum += value
+        self.count += 1
+
+    def point(self):
+        return {"t": self.start / 1000, "value": self.sum / self.count, "min": self.min, "max": self.max}
+
+
+class TimeSeriesStore:
+    """Append-only columnar store with automatic 10s/1m/1h rollups and retention"""
+
+    def __init__(self, root: str = TSDB_DIR, raw_interval: float = TSDB_RAW_INTERVAL):
+        self.root = root
+        # Nominal spacing of raw samples, used to estimate raw point counts
+        self.raw_interval = raw_interval
+        self._lock = threading.Lock()
+        self._files: "OrderedDict[Tuple[str, str], Tuple[str, object]]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, str], _Bucket] = {}
+        self._last_ts: Dict[str, int] = {}
+        self.max_open_files = TSDB_MAX_OPEN_FILES or _open_file_budget()
+        # Samples recorded on the event loop wait here for the flusher thread
+        self._pending: List[Tuple[str, float, float]] = []
+        self._pending_lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self.rejected = 0
+        self.dropped = 0
+        self._last_retention = 0.0
+        os.makedirs(self.root, exist_ok=True)
+
+    # ---- write path ----
+
+    def _series_dir(self, series: str) -> str:
+        return os.path.join(self.root, quote(series, safe=""))
+
+    def _write(self, series: str, res: str, ts_ms: int, payload: bytes):
+        key = (series, res)
+        day = _day_key(ts_ms)
+        current = self._files.get(key)
+        if current is None or current[0] != day:
+            if current is not None:
+                current[1].close()
+            path = os.path.join(self._series_dir(series), res)
+            os.makedirs(path, exist_ok=True)
+            current = (day, open(os.path.join(path, f"{day}.bin"), "ab"))
+            self._files[key] = current
+            while len(self._files) > self.max_open_files:
+                self._files.popitem(last=False)[1][1].close()
+        self._files.move_to_end(key)
+        current[1].write(payload)
+
+    def _last_record(self, series: str, res: str, day: Optional[str] = None):
+        """Newest record on disk for (series, res), from `day`'s file or the latest one"""
+        path = os.path.join(self._series_dir(series), res)
+        if day is None:
+            days = sorted(n for n in os.listdir(path) if n.endswith(".bin")) if os.path.isdir(path) else []
+            if not days:
+                return None, None
+            day = days[-1][:-4]
+        file_path = os.path.join(path, f"{day}.bin")
+        rec = RAW_REC if res == RAW else ROLLUP_REC
+        size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        if size < rec.size:
+            return None, None
+        with open(file_path, "rb") as f:
+            f.seek(size - size % rec.size - rec.size)
+            return file_path, rec.unpack(f.read(rec.size))
+
+    def _resume_bucket(self, series: str, res: str, start: int) -> Optional[_Bucket]:
+        """
+        A partial bucket persisted by close() before a restart: take it off
+        the file and keep filling it, so the bucket isn't written twice.
+        """
+        file_path, record = self._last_record(series, res, _day_key(start))
+        if record is None or record[0] != start:
+            return None
+        current = self._files.pop((series, res), None)
+        if current is not None:
+            current[1].close()
+        with open(file_path, "r+b") as f:
+            f.truncate(f.seek(0, os.SEEK_END) - ROLLUP_REC.size)
+        bucket = _Bucket(start, record[1])
+        bucket.max, bucket.sum, bucket.count = record[2], record[3], record[4]
+        return bucket
+
+    def append(self, series: str, value: float, ts: Optional[float] = None) -> bool:
+        """Add a sample; False (and not stored) if it is older than the series' last sample"""
+        ts_ms = int((ts if ts is not None else time.time()) * 1000)
+        value = float(value)
+        with self._lock:
+            last = self._last_ts.get(series)
+            if last is None:
+                _, record = self._last_record(series, RAW)
+                last = record[0] if record is not None else 0
+            if ts_ms < last:
+                # Late or replayed sample: appending it would break the time order of the files
+                self.rejected += 1
+                return False
+            self._last_ts[series] = ts_ms
+            self._write(series, RAW, ts_ms, RAW_REC.pack(ts_ms, value))
+            for res, seconds in ROLLUPS:
+                start = ts_ms - ts_ms % (seconds * 1000)
+                key = (series, res)
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._resume_bucket(series, res, start)
+                    if bucket is not None:
+                        self._buckets[key] = bucket
+                if bucket is not None and bucket.start == start:
+                    bucket.add(value)
+                    continue
+                # Bucket closed: persist it and open the next one
+                if bucket is not None:
+                    self._write(series, res, bucket.start,
+                                ROLLUP_REC.pack(bucket.start, bucket.min, bucket.max, bucket.sum, bucket.count))
+                self._buckets[key] = _Bucket(start, value)
+        return True
+
+    def enqueue(self, series: str, value: float, ts: Optional[float] = None):
+        """Queue a sample for drain(); no I/O, so it is safe on the event loop"""
+        item = (series, float(value), ts if ts is not None else time.time())
+        with self._pending_lock:
+            if len(self._pending) >= TSDB_MAX_PENDING:
+                self.dropped += 1
+                return
+            self._pending.append(item)
+
+    def drain(self):
+        """Append queued samples (blocking disk I/O)"""
+        # One drain at a time, so a later batch can't overtake an earlier one
+        with self._drain_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, []
+            # Grouped per series (a stable sort keeps each series' order): one file visit each
+            pending.sort(key=lambda p: p[0])
+            for series, value, ts in pending:
+                self.append(series, value, ts)
+
+    def flush(self):
+        """Blocking disk I/O: runs on the background flusher's thread"""
+        self.drain()
+        with self._lock:
+            files = [f for _, f in self._files.values()]
+        for f in files:
+            try:
+                f.flush()
+            except ValueError:
+                pass  # closed by LRU eviction meanwhile, which flushed it
+        # Retention is cheap (whole-file deletes) but only needs to run occasionally
+        if time.time() - self._last_retention > 3600:
+            self.enforce_retention()
+
+    def close(self):
+        self.drain()
+        with self._lock:
+            # Persist partially filled rollup buckets so a restart loses nothing
+            for (series, res), bucket in self._buckets.items():
+                self._write(series, res, bucket.start,
+                            ROLLUP_REC.pack(bucket.start, bucket.min, bucket.max, bucket.sum, bucket.count))
+            self._buckets.clear()
+            for _, f in self._files.values():
+                f.close()
+            self._files.clear()
+
+    def enforce_retention(self, now: Optional[float] = None):
+        now = now if now is not None else time.time()
+        self._last_retention = now
+        for series in self.list_series():
+            for res, days in RETENTION_DAYS.items():
+                cutoff = _day_key(int((now - days * 86400) * 1000))
+                path = os.path.join(self._series_dir(series), res)
+                if not os.path.isdir(path):
+                    continue
+                for name in os.listdir(path):
+                    # Day files strictly older than the cutoff day are dropped whole
+                    if name.endswith(".bin") and name[:-4] < cutoff:
+                        with self._lock:
+                            current = self._files.get((series, res))
+                            if current is not None and current[0] == name[:-4]:
+                                continue
+                        os.remove(os.path.join(path, name))
+
+    # ---- read path ----
+
+    def list_series(self, prefix: str = "") -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        names = [unquote(n) for n in os.listdir(self.root)]
+        return sorted(n for n in names if n.startswith(prefix))
+
+    def pick_resolution(self, start: float, end: float, max_points: int = TSDB_MAX_POINTS,
+                        now: Optional[float] = None) -> str:
+        """Finest resolution that is still retained for `start` and fits in max_points"""
+        now = now if now is not None else time.time()
+        window = max(end - start, 1)
+        candidates = [(RAW, self.raw_interval)] + ROLLUPS
+        for res, seconds in candidates:
+            if start < now - RETENTION_DAYS[res] * 86400:
+                continue
+            if window / seconds <= max_points:
+                return res
+        return ROLLUPS[-1][0]
+
+    def _read_file(self, path: str, rec: struct.Struct, start_ms: int, end_ms: int):
+        size = os.path.getsize(path)
+        n = size // rec.size
+        if n == 0:
+            return []
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), n * rec.size, access=mmap.ACCESS_READ) as data:
+            # Records are time-ordered: binary search the slice, only touch the pages we need
+            stamps = _RecordStamps(data, rec.size, n)
+            lo = bisect.bisect_left(stamps, start_ms)
+            hi = bisect.bisect_right(stamps, end_ms)
+            return [rec.unpack_from(data, i * rec.size) for i in range(lo, hi)]
+
+    def query(self, series: str, start: float, end: float,
+              max_points: int = TSDB_MAX_POINTS, resolution: Optional[str] = None) -> dict:
+        res = resolution or self.pick_resolution(start, end, max_points)
+        start_ms, end_ms = int(start * 1000), int(end * 1000)
+        rec = RAW_REC if res == RAW else ROLLUP_REC
+        path = os.path.join(self._series_dir(series), res)
+
+        # Queries run in worker threads: write what's queued so the newest samples show up
+        self.drain()
+        with self._lock:
+            current = self._files.get((series, res))
+            if current is not None:
+                current[1].flush()
+            open_bucket = self._buckets.get((series, res))
+            open_point = open_bucket.point() if open_bucket is not None else None
+
+        points = []
+        day_ms = start_ms - start_ms % DAY_MS
+        while day_ms <= end_ms:
+            file_path = os.path.join(path, f"{_day_key(day_ms)}.bin")
+            if os.path.exists(file_path):
+                for r in self._read_file(file_path, rec, start_ms, end_ms):
+                    if res == RAW:
+                        points.append({"t": r[0] / 1000, "value": r[1]})
+                    else:
+                        points.append({"t": r[0] / 1000, "value": r[3] / r[4], "min": r[1], "max": r[2]})
+            day_ms += DAY_MS
+
+        # Include the still-open rollup bucket so recent data is visible immediately
+        if open_point is not None and start <= open_point["t"] <= end:
+            points.append(open_point)
+        return {"series": series, "resolution": res, "points": points}
+
+
+class _RecordStamps:
+    """Sequence view over the timestamp column of a packed record buffer (for bisect)"""
+
+    def __init__(self, data, rec_size: int, count: int):
+        self.data = data
+        self.rec_size = rec_size
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return struct.unpack_from("<q", self.data, i * self.rec_size)[0]
+
+
+_store: Optional[TimeSeriesStore] = None
+
+
+def get_store() -> TimeSeriesStore:
+    global _store
+    if _store is None:
+        _store = TimeSeriesStore()
+    return _store
+
+
+def close_store():
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
+
+
+_flush_task: Optional[asyncio.Task] = None
+
+
+async def _flush_loop():
+    while True:
+        await asyncio.sleep(TSDB_FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(get_store().flush)
+        except Exception as e:
+            print(f"⚠️ TSDB flush failed: {e}")
+
+
+def start_flusher():
+    """Write queued samples, flush and enforce retention off the event loop, on a timer"""
+    global _flush_task
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.create_task(_flush_loop())
+
+
+def stop_flusher():
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        _flush_task = None
+
+
+def record_sample(target_id: str, metrics: dict, ts: Optional[float] = None):
+    """Queue the numeric fields of a dashboard sample under `<target>/<metric>` (written by the flusher)"""
+    store = get_store()
+    for key in ("cpu_load", "memory_usage", "active_sessions", "disk_io"):
+        value = metrics.get(key)
+        if isinstance(value, (int, float)):
+            store.enqueue(f"{target_id}/{key}", value, ts)
+    for event in metrics.get("wait_events", []):
+        store.enqueue(f"{target_id}/wait/{event['name']}", event["value"], ts)
+
+
+def record_ash(target_id: str, counts: Dict[str, float], ts: Optional[float] = None):
+    """Queue ASH active-session counts per wait class (written by the flusher)"""
+    store = get_store()
+    for wait_class, value in counts.items():
+        store.enqueue(f"{target_id}/ash/{wait_class}", value, ts)
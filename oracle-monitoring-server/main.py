@@ -1,8 +1,16 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from routers import performance, alerts, settings, editor, dashboard
+from routers import performance, alerts, settings, editor, dashboard, fleet, ingest, admin
+from services.broadcaster import get_broadcaster, shutdown_broadcasters
+from services.agent_client import get_agent_client, close_agent_clients
+from services.alerts import close_engine
+from services.plans import close_store as close_plan_store
+from core import database, tsdb, instrumentation, profiling
+from core.serialization import FastJSONResponse
+from core.targets import load_targets, list_targets
 
-app = FastAPI()
+# orjson-backed (stdlib json fallback) for every route unless it returns its own Response
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # Enable CORS
 app.add_middleware(
@@ -12,20 +20,67 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(instrumentation.MetricsMiddleware)
+if profiling.PROFILING_ENABLED:
+    # Outermost, so the timings cover every other middleware too
+    app.add_middleware(profiling.ProfilingMiddleware)
 
 app.include_router(performance.router)
 app.include_router(alerts.router)
 app.include_router(settings.router)
 app.include_router(editor.router)
 app.include_router(dashboard.router)
+app.include_router(fleet.router)
+app.include_router(ingest.router)
+app.include_router(admin.router)
+
+@app.on_event("startup")
+async def startup_event():
+    load_targets()
+    if profiling.PROFILING_ENABLED:
+        profiling.loop_monitor.start()
+        print(f"🔬 Profiling enabled (slow request threshold {profiling.PROFILE_SLOW_MS:.0f} ms)")
+    await database.init_db()
+    tsdb.start_flusher()
+    for target in list_targets():
+        # Open the shared agent client up front so the first click doesn't pay for it
+        get_agent_client(target.id)
+        # Collect continuously so history is retained even with no dashboard open
+        get_broadcaster(target.id).start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    profiling.loop_monitor.stop()
+    await shutdown_broadcasters()
+    await close_agent_clients()
+    await database.close_db()
+    tsdb.stop_flusher()
+    tsdb.close_store()
+    close_engine()
+    close_plan_store()
 
 @app.get("/")
 def read_root():
     return {"status": "ok", "service": "oracle-monitoring-server"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    """Prometheus / OpenMetrics exposition of the server's own metrics"""
+    return instrumentation.metrics_response(request.headers.get("accept", ""))
+
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "db_connection": "mock (initialized)"}
+    targets = {}
+    for target in list_targets():
+        pool = database.get_pool(target.id)
+        if database.is_mock(target.id):
+            targets[target.id] = {"db_connection": "mock (initialized)"}
+        else:
+            targets[target.id] = {
+                "db_connection": "async" if pool.is_async else "thick (threaded)",
+                "pool": {"busy": pool.busy, "opened": pool.opened}
+            }
+    return {"status": "healthy", "targets": targets}
 
 if __name__ == "__main__":
     import uvicorn
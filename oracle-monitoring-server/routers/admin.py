@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Header, HTTPException, Query, Depends
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import asyncio
+import time
+from core import profiling
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["admin"]
+)
+
+def require_profiling(x_admin_token: Optional[str] = Header(None)):
+    if not profiling.PROFILING_ENABLED:
+        raise HTTPException(status_code=503, detail="Profiling is disabled (set PROFILING_ENABLED=true)")
+    if profiling.PROFILE_ADMIN_TOKEN and x_admin_token != profiling.PROFILE_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@router.get("/profiling")
+async def get_profiling_status():
+    """Whether profiling is on, the slow-request threshold and event-loop lag"""
+    return profiling.status()
+
+@router.get("/slow-requests", dependencies=[Depends(require_profiling)])
+async def get_slow_requests(limit: int = Query(50, ge=1, le=1000)):
+    """Requests slower than PROFILE_SLOW_MS, newest first, with their phase breakdown"""
+    return profiling.recent_slow(limit)
+
+@router.post("/profile", dependencies=[Depends(require_profiling)])
+async def record_profile(seconds: float = Query(10, gt=0, le=profiling.PROFILE_MAX_SECONDS),
+                         hz: float = Query(100, ge=1, le=1000)):
+    """
+    Sample every thread's stack for `seconds` and return collapsed stacks
+    (one "frame;frame;... count" line per stack) for flamegraph.pl or speedscope.
+    """
+    try:
+        stacks = await asyncio.to_thread(profiling.sampler.run, seconds, hz)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    name = time.strftime("profile-%Y%m%d-%H%M%S.folded")
+    return PlainTextResponse(stacks, headers={"Content-Disposition": f'attachment; filename="{name}"'})
@@ -1,8 +1,7 @@
-from fastapi import APIRouter
-from typing import List
+from fastapi import APIRouter, Query, Response
+from typing import List, Optional
 from pydantic import BaseModel
-import random
-import datetime
+from services.alerts import get_engine, SEVERITIES
 
 router = APIRouter(prefix="/api/alerts", tags=["alerts"])
 
@@ -12,34 +11,42 @@ class Alert(BaseModel):
     severity: str
     message: str
     source: str
+    target: Optional[str] = None
+    rule: Optional[str] = None
+    metric: Optional[str] = None
+    value: Optional[float] = None
+    state: Optional[str] = None
+    resolved_at: Optional[float] = None
 
 @router.get("/history", response_model=List[Alert])
-async def get_alerts():
-    severities = ["CRITICAL", "WARNING", "INFO"]
-    sources = ["Database", "Listener", "OS", "Network"]
-    msgs = [
-        "Tablespace USERS usage > 90%",
-        "High CPU Load on Instance ORCL1 (95%)",
-        "Blocking Session Detected (SID 142 blocked by 12)",
-        "Listener TNS-12541: No listener",
-        "Archivelog destination is 85% full",
-        "Swap usage increased to 15%",
-        "Long running query detected (> 300s)"
-    ]
-    
-    alerts = []
-    now = datetime.datetime.now()
-    for i in range(25):
-        t = now - datetime.timedelta(minutes=random.randint(0, 1440)) # last 24h
-        sev = random.choices(severities, weights=[1, 2, 5])[0]
-        alerts.append({
-            "id": i,
-            "time": t.strftime("%Y-%m-%d %H:%M:%S"),
-            "severity": sev,
-            "message": random.choice(msgs),
-            "source": random.choice(sources)
-        })
-    
-    # Sort by time desc
-    alerts.sort(key=lambda x: x['time'], reverse=True)
-    return alerts
+async def get_alerts(response: Response,
+                     start: Optional[float] = None, end: Optional[float] = None,
+                     severity: Optional[List[str]] = Query(None),
+                     source: Optional[List[str]] = Query(None),
+                     target: Optional[List[str]] = Query(None),
+                     state: Optional[str] = Query(None, pattern="^(FIRING|RESOLVED)$"),
+                     limit: int = Query(100, ge=1, le=1000),
+                     before_id: Optional[int] = None):
+    """
+    Fired alerts, newest first. Filter by time range (epoch seconds), severity,
+    source, target and state. For the next page pass the `X-Next-Before-Id`
+    response header back as `before_id`.
+    """
+    items, next_before = get_engine().history.query(
+        start=start, end=end,
+        severity=[s.upper() for s in severity] if severity else None,
+        source=source, target=target, state=state,
+        limit=limit, before_id=before_id,
+    )
+    if next_before is not None:
+        response.headers["X-Next-Before-Id"] = str(next_before)
+    return items
+
+@router.get("/active", response_model=List[Alert])
+async def get_active_alerts(target: Optional[str] = None):
+    """Alerts currently firing (not yet cleared by their rule's hysteresis)"""
+    return get_engine().active(target)
+
+@router.get("/rules")
+async def get_rules():
+    return {"severities": SEVERITIES, "rules": [r.to_dict() for r in get_engine().rules]}
@@ -1,25 +1,126 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from services.monitoring import MonitoringService
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Depends
+from typing import List, Optional
+from pydantic import BaseModel
 import asyncio
-import json
+import time
+from services.monitoring import MonitoringService
+from services.broadcaster import get_broadcaster
+from services import wsproto
+from core import tsdb
+from core.targets import target_param, get_target
 
 router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
 service = MonitoringService()
 
-@router.get("/metrics")
-async def get_metrics():
-    return await service.get_dashboard_data()
+class TopSqlSummary(BaseModel):
+    sql_id: str
+    elapsed_time: float
+    cpu_time: float
+    executions: int
+
+class WaitEvent(BaseModel):
+    name: str
+    value: float
+    color: str
+
+class DashboardMetrics(BaseModel):
+    cpu_load: float
+    memory_usage: Optional[float] = None     # not reported by older push-mode agents
+    active_sessions: int
+    disk_io: float
+    health_status: str
+    timestamp: str
+    top_sql: List[TopSqlSummary] = []
+    wait_events: List[WaitEvent] = []
+
+@router.get("/metrics", response_model=DashboardMetrics)
+async def get_metrics(target: str = Depends(target_param)):
+    if get_target(target).push:
+        # Push targets only have what their agent sent; never fall back to mock data
+        data = get_broadcaster(target).latest_data
+        if data is None:
+            raise HTTPException(status_code=404, detail=f"No samples pushed for target {target} yet")
+        return data
+    return await service.get_dashboard_data(target)
+
+@router.get("/history")
+async def get_history(metric: str = "cpu_load", target: str = Depends(target_param),
+                      start: Optional[float] = None, end: Optional[float] = None,
+                      minutes: int = 60, max_points: int = tsdb.TSDB_MAX_POINTS,
+                      resolution: Optional[str] = None):
+    """
+    Range query over persisted samples. `start`/`end` are epoch seconds; the
+    resolution (raw/10s/1m/1h) is picked from the window unless given.
+    """
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - minutes * 60
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if resolution and resolution not in tsdb.RETENTION_DAYS:
+        raise HTTPException(status_code=400, detail=f"Unknown resolution: {resolution}")
+    store = tsdb.get_store()
+    return await asyncio.to_thread(store.query, f"{target}/{metric}", start, end, max_points, resolution)
+
+@router.get("/history/series")
+async def get_history_series(target: str = Depends(target_param)):
+    """List the metrics that have persisted history for a target"""
+    prefix = f"{target}/"
+    return [name[len(prefix):] for name in tsdb.get_store().list_series(prefix)]
+
+async def _send_frames(websocket: WebSocket, sub):
+    while True:
+        frame = await sub.next()
+        if isinstance(frame, bytes):
+            await websocket.send_bytes(frame)
+        else:
+            await websocket.send_text(frame)
+
+async def _receive_control(websocket: WebSocket, broadcaster, sub):
+    """Client -> server messages; v2 clients may send {"type": "resync"} as a text or (msgpack) binary frame"""
+    while True:
+        frame = await websocket.receive()
+        if frame["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(frame.get("code", 1000))
+        message = wsproto.decode_control(frame.get("text"), frame.get("bytes"), sub.fmt)
+        if sub.version >= 2 and message is not None and message.get("type") == "resync":
+            broadcaster.resync(sub)
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, target: str = Depends(target_param),
+                             v: int = 1, groups: Optional[str] = None, format: str = "json"):
+    """
+    Live dashboard feed. Without `v` every tick is the full metrics dict as
+    JSON; `v=2` switches to snapshot + delta frames for the requested metric
+    `groups`, optionally as binary msgpack (see services/wsproto.py).
+    """
     await websocket.accept()
     try:
-        while True:
-            data = await service.get_dashboard_data()
-            await websocket.send_text(json.dumps(data))
-            await asyncio.sleep(2) # Update every 2 seconds
-    except WebSocketDisconnect:
-        print("Client disconnected")
-    except Exception as e:
-        print(f"WebSocket Error: {e}")
-        await websocket.close()
+        selected = wsproto.parse_groups(groups) if v >= 2 else None
+        if format not in wsproto.FORMATS:
+            raise ValueError(f"format must be one of {wsproto.FORMATS}")
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    if format == "msgpack" and wsproto.msgpack is None:
+        print("⚠️ msgpack frames requested but 'msgpack' is not installed, sending JSON")
+        format = "json"
+
+    broadcaster = get_broadcaster(target)
+    sub = broadcaster.subscribe(version=min(v, wsproto.VERSION), groups=selected, fmt=format)
+    tasks = [asyncio.create_task(_send_frames(websocket, sub)),
+             asyncio.create_task(_receive_control(websocket, broadcaster, sub))]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        error = next((t.exception() for t in done if t.exception() is not None), None)
+        if error is None or isinstance(error, WebSocketDisconnect):
+            print("Client disconnected")
+        else:
+            print(f"WebSocket Error: {error}")
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+    finally:
+        for t in tasks:
+            t.cancel()
+        broadcaster.unsubscribe(sub)
@@ -1,83 +1,367 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel
-import random
 import os
-import httpx
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from pydantic import BaseModel
+import uuid
 import random
-from typing import List, Any
+import csv
+import io
+import codecs
+import httpx
+from typing import List, Optional
+from services.agent_client import get_agent_client, AGENT_CONNECT_TIMEOUT
+from services.sqlscript import run_script, SCRIPT_MAX_ROWS
+from core.targets import target_param
+from core.serialization import dumps_str
 
 router = APIRouter(
     prefix="/api/editor",
     tags=["editor"]
 )
 
-AGENT_URL = os.getenv("ORACLE_AGENT_URL")
+NDJSON = "application/x-ndjson"
+EXPORT_FORMATS = ("csv", "parquet", "arrow")
+# Bytes read from an uploaded script per step; parsing and execution keep pace with reading
+UPLOAD_CHUNK_BYTES = 64 * 1024
+# How long the server waits for a non-streamed editor result before cancelling it on the agent
+EDITOR_TIMEOUT = float(os.getenv("EDITOR_TIMEOUT", "300"))
 
 class QueryRequest(BaseModel):
     sql: str
+    stream: bool = False              # Relay rows as NDJSON while the agent fetches them
+    max_rows: Optional[int] = None    # Page size; a `next_cursor` is returned if more rows exist
+    cursor: Optional[str] = None      # Resume token from a previous page
+    fetch_size: int = 1000
+    query_id: Optional[str] = None    # Set by the server if omitted; use it with /cancel/{query_id}
+    timeout_ms: Optional[int] = None  # Per round-trip call timeout on the agent
+    export: Optional[str] = None      # csv / parquet / arrow: rows are encoded by the agent as they are fetched
+    export_mode: str = "stream"       # stream: chunked download; file: temp file on the agent, see /exports/{id}
+
+class QueryResult(BaseModel):
+    status: str
+    message: Optional[str] = None
+    query_id: Optional[str] = None
+    columns: Optional[List[str]] = None
+    rows: Optional[List[list]] = None
+    next_cursor: Optional[str] = None
+    resume_exact: Optional[bool] = None   # False: the statement has no stable order, pages can overlap or skip rows
+    warning: Optional[str] = None
+
+async def _cancel_on_agent(agent, query_id: str):
+    """Best effort: stop a statement nobody is waiting for anymore"""
+    try:
+        await agent.post(f"/queries/{query_id}/cancel")
+    except Exception as e:
+        print(f"Cancel of {query_id} failed: {e}")
 
-@router.post("/execute")
-async def execute_query(request: QueryRequest):
+async def _agent_call(agent, path: str, payload: dict, raw: bool = False):
     """
-    Execute SQL query via Agent if configured, else Mock.
+    POST an editor statement; if the result doesn't arrive in EDITOR_TIMEOUT, cancel it on the agent.
+    With `raw`, a successful body is passed through as-is instead of being decoded and re-encoded.
     """
-    if AGENT_URL:
+    try:
+        resp = await agent.post(path, json=payload, timeout=httpx.Timeout(EDITOR_TIMEOUT, connect=AGENT_CONNECT_TIMEOUT))
+        if resp.status_code == 200:
+            if raw:
+                return Response(content=resp.content, media_type="application/json")
+            return resp.json()
+        else:
+            return {"status": "error", "message": f"Agent Error: {resp.text}"}
+    except httpx.TimeoutException:
+        await _cancel_on_agent(agent, payload["query_id"])
+        return {"status": "error", "query_id": payload["query_id"],
+                "message": f"No result after {EDITOR_TIMEOUT:.0f}s; the query was cancelled"}
+    except Exception as e:
+        return {"status": "error", "message": f"Failed to connect to Agent: {str(e)}"}
+
+# Agent response headers passed through on relayed streams (exports are downloads)
+RELAY_HEADERS = ("content-disposition", "x-query-id")
+
+async def _relay_stream(agent, payload: Optional[dict], method: str = "POST", path: str = "/execute"):
+    """Pipe the agent's body (NDJSON or export file) through chunk by chunk, never buffering the result"""
+    try:
+        resp = await agent.stream(method, path, json=payload)
+    except Exception as e:
+        return {"status": "error", "message": f"Failed to connect to Agent: {str(e)}"}
+
+    if resp.status_code != 200:
+        text = (await resp.aread()).decode(errors="replace")
+        await resp.aclose()
+        return {"status": "error", "message": f"Agent Error: {text}"}
+
+    async def body():
+        finished = False
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.post(f"{AGENT_URL}/execute", json={"sql": request.sql})
-                if resp.status_code == 200:
-                    return resp.json()
-                else:
-                    return {"status": "error", "message": f"Agent Error: {resp.text}"}
-        except Exception as e:
-            return {"status": "error", "message": f"Failed to connect to Agent: {str(e)}"}
-
-    # Mock Exec logic
+            async for chunk in resp.aiter_raw():
+                yield chunk
+            finished = True
+        finally:
+            await resp.aclose()
+            if not finished and payload is not None:
+                # Client went away mid-result: free the agent's editor connection now
+                await _cancel_on_agent(agent, payload["query_id"])
+
+    headers = {k: v for k, v in resp.headers.items() if k in RELAY_HEADERS}
+    return StreamingResponse(body(), media_type=resp.headers.get("content-type", NDJSON), headers=headers)
+
+def _mock_result(request: QueryRequest):
+    """Mock Exec logic, expressed as the same meta/rows/end messages the agent streams"""
     sql_upper = request.sql.strip().upper()
-    
+
     # Simple Mock Logic based on query type
-    columns = []
-    rows = []
-    
-    if sql_upper.startswith("SELECT"):
-        columns = ["ID", "NAME", "STATUS", "CREATED_AT", "VALUE"]
-        for i in range(1, 11):
-            rows.append([
-                i, 
-                f"Item_{i}_{random.randint(1000,9999)}", 
-                random.choice(["ACTIVE", "INACTIVE", "PENDING"]),
-                "2023-01-01 12:00:00",
-                random.randint(10, 1000)
-            ])
-    else:
+    if not sql_upper.startswith("SELECT"):
         # DML
-        return {
-            "status": "success",
+        yield {
+            "type": "end",
             "message": f"Statement executed successfully. {random.randint(1, 100)} rows affected."
         }
-        
-    return {
-        "status": "success",
-        "columns": columns,
-        "rows": rows,
-        "message": "Query executed successfully."
-    }
+        return
 
-@router.post("/upload")
-async def upload_sql_file(file: UploadFile = File(...)):
+    yield {"type": "meta", "columns": ["ID", "NAME", "STATUS", "CREATED_AT", "VALUE"]}
+    rows = []
+    for i in range(1, 11):
+        rows.append([
+            i,
+            f"Item_{i}_{random.randint(1000,9999)}",
+            random.choice(["ACTIVE", "INACTIVE", "PENDING"]),
+            "2023-01-01 12:00:00",
+            random.randint(10, 1000)
+        ])
+    if request.max_rows is not None:
+        rows = rows[:request.max_rows]
+    yield {"type": "rows", "rows": rows}
+    yield {"type": "end", "row_count": len(rows), "next_cursor": None}
+
+@router.post("/execute", response_model=QueryResult, response_model_exclude_unset=True)
+async def execute_query(request: QueryRequest, target: str = Depends(target_param)):
     """
-    Upload and execute SQL file content.
+    Execute SQL query via the target's Agent if configured, else Mock.
     """
+    if request.export is not None:
+        if request.export not in EXPORT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"export must be one of {EXPORT_FORMATS}")
+        if request.export_mode not in ("stream", "file"):
+            raise HTTPException(status_code=400, detail="export_mode must be 'stream' or 'file'")
+
+    agent = get_agent_client(target)
+    if agent:
+        request.query_id = request.query_id or uuid.uuid4().hex
+        if (request.export_mode == "stream") if request.export else request.stream:
+            return await _relay_stream(agent, request.model_dump())
+        return await _agent_call(agent, "/execute", request.model_dump(), raw=True)
+
+    if request.export:
+        return _mock_export(request)
+    if request.stream:
+        lines = (dumps_str(msg) + "\n" for msg in _mock_result(request))
+        return StreamingResponse(lines, media_type=NDJSON)
+
+    result = {"status": "success", "message": "Query executed successfully."}
+    for msg in _mock_result(request):
+        if msg["type"] == "meta":
+            result["columns"] = msg["columns"]
+        elif msg["type"] == "rows":
+            result["rows"] = msg["rows"]
+        elif "message" in msg:
+            return {"status": "success", "message": msg["message"]}
+        else:
+            result["next_cursor"] = msg["next_cursor"]
+    return result
+
+def _mock_export(request: QueryRequest):
+    if request.export != "csv" or request.export_mode != "stream":
+        raise HTTPException(status_code=400, detail="Without an agent only streamed CSV export is available")
+
+    def lines():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for msg in _mock_result(request):
+            if msg["type"] == "meta":
+                writer.writerow(msg["columns"])
+            elif msg["type"] == "rows":
+                writer.writerows(msg["rows"])
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+
+    return StreamingResponse(lines(), media_type="text/csv",
+                             headers={"Content-Disposition": 'attachment; filename="mock.csv"'})
+
+async def _agent_export(target: str, method: str, path: str):
+    agent = get_agent_client(target)
+    if not agent:
+        raise HTTPException(status_code=404, detail="No agent configured for this target")
+    try:
+        resp = await agent.request(method, path)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Failed to connect to Agent: {str(e)}")
+    if resp.status_code != 200:
+        raise HTTPException(status_code=resp.status_code, detail=resp.json().get("detail", resp.text))
+    return resp.json()
+
+@router.get("/exports/{export_id}")
+async def get_export(export_id: str, target: str = Depends(target_param)):
+    """Progress of a file export started with export_mode=file"""
+    return await _agent_export(target, "GET", f"/exports/{export_id}")
+
+@router.get("/exports/{export_id}/download")
+async def download_export(export_id: str, target: str = Depends(target_param)):
+    """Relay a finished export file from the agent without buffering it"""
+    agent = get_agent_client(target)
+    if not agent:
+        raise HTTPException(status_code=404, detail="No agent configured for this target")
+    result = await _relay_stream(agent, None, "GET", f"/exports/{export_id}/download")
+    if isinstance(result, dict):
+        raise HTTPException(status_code=502, detail=result["message"])
+    return result
+
+@router.delete("/exports/{export_id}")
+async def delete_export(export_id: str, target: str = Depends(target_param)):
+    """Cancel a running export or delete its file on the agent"""
+    return await _agent_export(target, "DELETE", f"/exports/{export_id}")
+
+@router.post("/cancel/{query_id}")
+async def cancel_query(query_id: str, target: str = Depends(target_param)):
+    """Interrupt a running editor query on the target's Agent"""
+    agent = get_agent_client(target)
+    if not agent:
+        raise HTTPException(status_code=404, detail="No agent configured for this target")
+    try:
+        resp = await agent.post(f"/queries/{query_id}/cancel")
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Failed to connect to Agent: {str(e)}")
+    if resp.status_code != 200:
+        raise HTTPException(status_code=resp.status_code, detail=resp.json().get("detail", resp.text))
+    return resp.json()
+
+@router.get("/queries")
+async def list_queries(target: str = Depends(target_param)):
+    """Running editor queries, queue wait and pool usage as reported by the Agent"""
+    agent = get_agent_client(target)
+    if not agent:
+        return {"active": [], "mock": True}
+    try:
+        resp = await agent.get("/queries")
+        return resp.json()
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Failed to connect to Agent: {str(e)}")
+
+async def _read_script(file: UploadFile):
+    """Decode the upload chunk by chunk (UTF-8, optional BOM) without reading it whole"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+async def _open_session(agent) -> str:
+    """A dedicated agent connection for one script (its statements share session and transaction)"""
+    resp = await agent.post("/sessions")
+    if resp.status_code != 200:
+        raise RuntimeError(f"Agent Error: {resp.text}")
+    return resp.json()["session_id"]
+
+async def _close_session(agent, session_id: str, commit: bool) -> Optional[str]:
+    """Commit or roll back a script session; the error message if that failed"""
     try:
-        content = await file.read()
-        sql_text = content.decode("utf-8")
-        
-        # In real scenario, we would parse and execute multiple statements.
-        # Here we just treat it as one execution for demo.
-        
-        return await execute_query(QueryRequest(sql=sql_text))
-        
+        resp = await agent.request("DELETE", f"/sessions/{session_id}", params={"commit": str(commit).lower()})
+        if resp.status_code != 200:
+            return f"Agent Error: {resp.text}"
+        result = resp.json()
+        return None if result.get("status") == "success" else result.get("message", "unknown error")
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to process file: {str(e)}")
+        print(f"Closing script session {session_id} failed: {e}")
+        return f"Failed to connect to Agent: {str(e)}"
+
+def _script_executors(agent, session_id: Optional[str] = None):
+    """(execute, execute_many) coroutines running on the Agent's script session, else Mock"""
+
+    async def execute(sql: str) -> dict:
+        if agent:
+            # max_rows only caps the agent's fetch loop (the statement runs unmodified);
+            # fetch_size keeps it from array-fetching more rows than the script keeps
+            return await _agent_call(agent, "/execute",
+                                     {"sql": sql, "max_rows": SCRIPT_MAX_ROWS, "fetch_size": SCRIPT_MAX_ROWS,
+                                      "query_id": uuid.uuid4().hex, "session_id": session_id})
+        result = {"status": "success"}
+        for msg in _mock_result(QueryRequest(sql=sql, max_rows=SCRIPT_MAX_ROWS)):
+            result.update(msg)
+        return result
+
+    async def execute_many(sql: str, rows: List[list], types: List[Optional[str]]) -> dict:
+        if agent:
+            return await _agent_call(agent, "/execute-many",
+                                     {"sql": sql, "rows": rows, "types": types, "query_id": uuid.uuid4().hex,
+                                      "session_id": session_id})
+        return {"status": "success", "row_count": len(rows), "message": f"Executed. Rows affected: {len(rows)}"}
+
+    return execute, execute_many
+
+@router.post("/upload")
+async def upload_sql_file(file: UploadFile = File(...), target: str = Depends(target_param),
+                          stream: bool = False, on_error: str = "stop"):
+    """
+    Upload and execute a multi-statement SQL script.
+    Statements run one by one as the file is parsed; consecutive INSERTs of the
+    same shape are sent as one array-DML batch. With `stream=true` progress is
+    returned as NDJSON (one line per statement/batch, then an `end` summary).
+
+    The whole script runs on one agent connection, so ALTER SESSION and the
+    script's own COMMIT / ROLLBACK / SAVEPOINT behave as in SQL*Plus. Like
+    SQL*Plus, what is left uncommitted is committed at the end, unless the
+    script stopped on an error (on_error=stop), which rolls it back.
+    """
+    if on_error not in ("stop", "continue"):
+        raise HTTPException(status_code=400, detail="on_error must be 'stop' or 'continue'")
+    agent = get_agent_client(target)
+
+    async def progress():
+        session_id = None
+        try:
+            if agent:
+                try:
+                    session_id = await _open_session(agent)
+                except Exception as e:
+                    yield {"type": "end", "status": "error", "message": f"Could not start the script: {e}"}
+                    return
+            execute, execute_many = _script_executors(agent, session_id)
+            async for msg in run_script(_read_script(file), execute, execute_many, on_error == "stop"):
+                if msg["type"] == "end":
+                    commit = not msg["stopped"]
+                    if session_id is not None:
+                        closing, session_id = session_id, None
+                        error = await _close_session(agent, closing, commit)
+                        if error is not None:
+                            verb = "Commit" if commit else "Rollback"
+                            msg.update(status="error", message=f"{verb} at the end of the script failed: {error}")
+                            commit = False
+                    msg["committed"] = commit
+                yield msg
+        except UnicodeDecodeError as e:
+            yield {"type": "end", "status": "error", "committed": False,
+                   "message": f"Failed to process file: {str(e)}"}
+        finally:
+            if session_id is not None:
+                # Unreadable upload or client gone mid-script: leave nothing half-applied
+                await _close_session(agent, session_id, commit=False)
+
+    if stream:
+        async def lines():
+            async for msg in progress():
+                yield dumps_str(msg) + "\n"
+        return StreamingResponse(lines(), media_type=NDJSON)
+
+    # Non-streaming: run the whole script, keep only the summary and the first errors
+    errors = []
+    async for msg in progress():
+        if msg.get("status") == "error" and msg["type"] != "end" and len(errors) < 20:
+            errors.append({"line": msg["line"], "message": msg.get("message")})
+        if msg["type"] == "end":
+            end = msg
+    if "message" not in end:
+        end["message"] = (f"Executed {end['statements']} statements "
+                          f"({end['batches']} INSERT batches, {end['skipped']} SQL*Plus commands skipped, "
+                          f"{end['errors']} errors).")
+    return {"status": end["status"], "message": end["message"], "summary": end, "errors": errors}
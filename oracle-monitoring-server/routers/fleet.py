@@ -0,0 +1,92 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import Optional
+import time
+from core import database
+from core.targets import Target, list_targets, register_target, remove_target, get_target
+from services.broadcaster import get_broadcaster, remove_broadcaster, all_broadcasters, DASHBOARD_INTERVAL
+
+router = APIRouter(prefix="/api/fleet", tags=["fleet"])
+
+# A target whose last good sample is older than this many intervals is STALE
+STALE_INTERVALS = 5
+
+class TargetInfo(BaseModel):
+    id: str
+    name: Optional[str] = None
+    dsn: Optional[str] = None
+    user: Optional[str] = None
+    password: Optional[str] = None
+    agent_url: Optional[str] = None
+    mock: bool = False
+    push: bool = False
+
+@router.get("/targets")
+async def get_targets():
+    return [t.to_dict() for t in list_targets()]
+
+@router.post("/targets")
+async def add_target(info: TargetInfo):
+    """Register a target, open its pool and start its collector"""
+    try:
+        get_target(info.id)
+        raise HTTPException(status_code=409, detail=f"Target already exists: {info.id}")
+    except KeyError:
+        pass
+    target = Target.from_dict(info.model_dump())
+    register_target(target)
+    await database.init_target_db(target)
+    get_broadcaster(target.id).start()
+    return target.to_dict()
+
+@router.delete("/targets/{target_id}")
+async def delete_target(target_id: str):
+    if remove_target(target_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown target: {target_id}")
+    remove_broadcaster(target_id)
+    await database.close_target_db(target_id)
+    return {"status": "success", "message": f"Removed {target_id}"}
+
+def _target_status(b, now: float) -> str:
+    if b is None or b.last_sample_at is None:
+        return "DOWN" if b is not None and b.consecutive_failures else "PENDING"
+    if now - b.last_sample_at > STALE_INTERVALS * b.interval:
+        return "STALE"
+    return (b.latest_data or {}).get("health_status", "HEALTHY")
+
+@router.get("/summary")
+async def get_fleet_summary():
+    """Health of every target from its collector's last sample, in one response"""
+    now = time.time()
+    broadcasters = all_broadcasters()
+    targets = []
+    counts = {}
+    cpu_values = []
+    total_sessions = 0
+    for t in list_targets():
+        b = broadcasters.get(t.id)
+        status = _target_status(b, now)
+        counts[status] = counts.get(status, 0) + 1
+        data = (b.latest_data if b else None) or {}
+        if "cpu_load" in data:
+            cpu_values.append(data["cpu_load"])
+        total_sessions += data.get("active_sessions", 0)
+        targets.append({
+            "id": t.id,
+            "name": t.name,
+            "status": status,
+            "mock": database.is_mock(t.id),
+            "cpu_load": data.get("cpu_load"),
+            "active_sessions": data.get("active_sessions"),
+            "sample_age_s": round(now - b.last_sample_at, 1) if b and b.last_sample_at else None,
+            "collector": b.status() if b else None,
+        })
+    return {
+        "targets": len(targets),
+        "interval_s": DASHBOARD_INTERVAL,
+        "status_counts": counts,
+        "total_active_sessions": total_sessions,
+        "avg_cpu_load": round(sum(cpu_values) / len(cpu_values), 1) if cpu_values else None,
+        "max_cpu_load": max(cpu_values) if cpu_values else None,
+        "items": targets,
+    }
@@ -0,0 +1,34 @@
+from typing import Optional
+from fastapi import APIRouter, Request, HTTPException, Header
+from fastapi.concurrency import run_in_threadpool
+from services.ingest import (decode_batch, validate_batch, apply_batch, publish_live, check_token,
+                             ingest_status, IngestError)
+
+router = APIRouter(prefix="/api/ingest", tags=["ingest"])
+
+@router.post("/batch")
+async def ingest_batch(request: Request, x_ingest_token: Optional[str] = Header(None)):
+    """
+    Accept a compressed batch of samples pushed by an agent.
+    Body: msgpack or JSON (Content-Type), zstd/gzip compressed (Content-Encoding).
+    The ack echoes the batch seq; re-sent batches are acked as duplicates.
+    """
+    try:
+        check_token(x_ingest_token)
+        body = await request.body()
+        batch = validate_batch(decode_batch(
+            body,
+            request.headers.get("content-type", "application/json"),
+            request.headers.get("content-encoding", "identity"),
+        ))
+        # Disk writes and alert evaluation stay off the event loop
+        ack, live = await run_in_threadpool(apply_batch, batch)
+    except IngestError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    publish_live(live)
+    return ack
+
+@router.get("/status")
+async def get_ingest_status():
+    """Last batch received from each pushing agent"""
+    return ingest_status()
@@ -1,65 +1,136 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query, Depends, HTTPException
 from pydantic import BaseModel
-from typing import List
-import random
+from typing import List, Optional
 import os
-import httpx
-from datetime import datetime, timedelta
+import random
+import time
+import asyncio
+import datetime
+from core import tsdb
+from core.targets import target_param
+from services.agent_client import get_agent_client
+from services.cache import get_cache, cache_stats
+from services.ingest import pushed_top_sql, pushed_blocking
+from services.monitoring import MonitoringService
+from services import plans
 
 router = APIRouter(
     prefix="/api/performance",
     tags=["performance"]
 )
 
-# Agent URL (e.g., http://db-server-ip:8001)
-AGENT_URL = os.getenv("ORACLE_AGENT_URL")
-
 # Models
 class AshData(BaseModel):
     time: str
-    active_sessions: int
+    active_sessions: float
     wait_class: str
 
 class SqlData(BaseModel):
-    sql_id: str
-    sql_text: str
+    sql_id: Optional[str] = None          # first sample sql_id for fingerprint / signature groups
+    sql_text: str = ""
     cpu_time: float
     elapsed_time: float
     executions: int
-    parsing_schema: str
-    module: str
+    parsing_schema: Optional[str] = None
+    module: Optional[str] = None
+    buffer_gets: Optional[int] = None
+    disk_reads: Optional[int] = None
+    plan_hash_values: Optional[List[int]] = None
+    # group_by=fingerprint|signature only
+    key: Optional[str] = None
+    fingerprint: Optional[str] = None
+    force_matching_signature: Optional[str] = None
+    sql_ids: Optional[List[str]] = None
+    statements: Optional[int] = None
+    new_cursors: Optional[int] = None
+
+# Per-endpoint cache TTLs (seconds); stale entries are served for STALE_FACTOR x TTL while refreshing
+CACHE_TTL_ASH = float(os.getenv("CACHE_TTL_ASH", "5"))
+CACHE_TTL_TOP_SQL = float(os.getenv("CACHE_TTL_TOP_SQL", "10"))
+CACHE_TTL_SQL_DETAIL = float(os.getenv("CACHE_TTL_SQL_DETAIL", "30"))
+CACHE_STALE_FACTOR = float(os.getenv("CACHE_STALE_FACTOR", "3"))
+
+cache = get_cache("performance")
+
+async def _cached(key, fetch, ttl):
+    return await cache.get_or_fetch(key, fetch, ttl, ttl * CACHE_STALE_FACTOR)
 
 # Endpoints
 @router.get("/ash", response_model=List[AshData])
-async def get_ash_history():
-    """Return mock ASH history (last 30 minutes)"""
-    data = []
-    now = datetime.datetime.now()
-    wait_classes = ["User I/O", "System I/O", "Concurrency", "CPU"]
-    
-    # Generate 30 data points
-    for i in range(30):
-        t = now - datetime.timedelta(minutes=30 - i)
-        # For stacked area chart, we might need multiple entries per timestamp or aggregate
-        # Here simplifying: Total Active Sessions
-        data.append({
-            "time": t.strftime("%H:%M"),
-            "active_sessions": random.randint(10, 150),
-            "wait_class": random.choice(wait_classes)
-        })
-    return data
+async def get_ash_history(minutes: int = 30, target: str = Depends(target_param)):
+    """Return ASH history (active sessions per wait class) from the time-series store"""
+    return await _cached(("ash", target, minutes), lambda: _fetch_ash(minutes, target), CACHE_TTL_ASH)
+
+async def _fetch_ash(minutes: int, target: str):
+    store = tsdb.get_store()
+    end = time.time()
+    start = end - minutes * 60
+    prefix = f"{target}/ash/"
+    series = store.list_series(prefix)
+    # Keep the chart to a few hundred points per wait class
+    max_points = max(1, tsdb.TSDB_MAX_POINTS // max(len(series), 1))
+    results = await asyncio.gather(*[
+        asyncio.to_thread(store.query, name, start, end, max_points) for name in series
+    ])
+
+    fmt = "%H:%M:%S" if minutes <= 60 else ("%H:%M" if minutes <= 1440 else "%m-%d %H:%M")
+    points = []
+    for name, result in zip(series, results):
+        wait_class = name[len(prefix):]
+        points.extend((p["t"], p["value"], wait_class) for p in result["points"])
+    # Order by timestamp, not by the formatted label (which wraps at midnight)
+    points.sort(key=lambda p: p[0])
+    return [{
+        "time": datetime.datetime.fromtimestamp(t).strftime(fmt),
+        "active_sessions": round(value, 2),
+        "wait_class": wait_class
+    } for t, value, wait_class in points]
+
+# Typed and exclude_unset: pydantic-core serializes the rows (no jsonable_encoder) and
+# each row keeps exactly the fields its source (agent, push, mock) provided
+@router.get("/top-sql", response_model=List[SqlData], response_model_exclude_unset=True)
+async def get_top_sql(window: str = Query("5m", pattern="^(1m|5m|15m|1h)$"),
+                      group_by: str = Query("sql_id", pattern="^(sql_id|fingerprint|signature)$"),
+                      target: str = Depends(target_param)):
+    """
+    Return Top SQL by elapsed time over the last `window` (agent interval deltas).
+    group_by=fingerprint|signature sums statements that differ only in literals.
+    """
+    return await _cached(("top-sql", target, window, group_by),
+                         lambda: _fetch_top_sql(window, target, group_by), CACHE_TTL_TOP_SQL)
+
+@router.get("/blocking")
+async def get_blocking(target: str = Depends(target_param)):
+    """
+    Blocking trees from one v$session snapshot: root blockers (largest first)
+    with their waiters nested under `children`, chain depth, sessions blocked
+    per root and any wait-for cycles.
+    """
+    if get_agent_client(target) is None:
+        pushed = pushed_blocking(target)
+        if pushed is not None:
+            return pushed
+    return await MonitoringService().get_blocking(target)
 
-@router.get("/top-sql")
-async def get_top_sql():
-    """Return Top SQL by elapsed time"""
-    if AGENT_URL:
+@router.get("/cache-stats")
+async def get_cache_stats():
+    """Hit / miss / eviction counters for the performance caches and the plan cache"""
+    return {**cache_stats(), "plans": plans.get_store().stats()}
+
+async def _fetch_top_sql(window: str, target: str, group_by: str = "sql_id"):
+    agent = get_agent_client(target)
+    if agent:
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(f"{AGENT_URL}/metrics/top-sql")
-                if resp.status_code == 200:
-                    return resp.json()
-        except:
-             pass
+            resp = await agent.get("/metrics/top-sql", params={"window": window, "group_by": group_by})
+            if resp.status_code == 200:
+                return resp.json()
+        except Exception as e:
+            print(f"[{target}] Agent Error (top-sql): {e}")
+    else:
+        # Push-mode agents: answer from the interval deltas they uploaded
+        pushed = pushed_top_sql(target, window, group_by=group_by)
+        if pushed is not None:
+            return pushed
 
     # Mock Data Fallback
     sql_texts = [
@@ -91,8 +162,31 @@ async def get_top_sql():
     return data
 
 @router.get("/sql/{sql_id}")
-async def get_sql_details(sql_id: str):
+async def get_sql_details(sql_id: str, target: str = Depends(target_param)):
     """Return detailed SQL info including plan"""
+    return await _cached(("sql", target, sql_id), lambda: _fetch_sql_details(sql_id, target), CACHE_TTL_SQL_DETAIL)
+
+@router.get("/sql/{sql_id}/plans")
+async def get_sql_plan_history(sql_id: str, target: str = Depends(target_param)):
+    """Every plan seen for a statement, newest first, from the plan-history index (no DB access)"""
+    return plans.get_store().plan_history(target, sql_id)
+
+@router.get("/sql/{sql_id}/plan/{plan_hash_value}")
+async def get_sql_plan(sql_id: str, plan_hash_value: int, target: str = Depends(target_param)):
+    """One execution plan; served from the plan cache, fetched through the agent only once"""
+    lines = await plans.fetch_plan(get_agent_client(target), target, sql_id, plan_hash_value)
+    if lines is None:
+        raise HTTPException(status_code=404, detail=f"No plan {plan_hash_value} for SQL {sql_id}")
+    return lines
+
+async def _fetch_sql_details(sql_id: str, target: str):
+    agent = get_agent_client(target)
+    if agent:
+        details = await plans.sql_details(agent, target, sql_id)
+        if details is None:
+            raise HTTPException(status_code=404, detail=f"SQL {sql_id} not found")
+        return details
+
     # Mock data based on SQL ID
     return {
         "sql_id": sql_id,
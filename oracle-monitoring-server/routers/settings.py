@@ -1,8 +1,12 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Depends
+from pydantic import BaseModel, Field
+from typing import Optional
 import os
 import socket
-from core.database import reconnect_db
+import asyncio
+from core.database import reconnect_db, load_driver, configure_pool, pool_status
+from services.agent_client import agent_stats
+from core.targets import target_param
 
 router = APIRouter(prefix="/api/settings", tags=["settings"])
 
@@ -14,6 +18,12 @@ class ConnectionInfo(BaseModel):
     password: str
     mode: str = "SERVICE_NAME" # SERVICE_NAME or SID
 
+class PoolSettings(BaseModel):
+    min: Optional[int] = Field(None, ge=0)
+    max: Optional[int] = Field(None, ge=1)
+    increment: Optional[int] = Field(None, ge=1)
+    call_timeout_ms: Optional[int] = Field(None, ge=0)
+
 def check_tcp_connection(host: str, port: int, timeout: int = 3):
     """Fail fast if host is unreachable"""
     try:
@@ -48,11 +58,7 @@ async def test_connection(info: ConnectionInfo):
     try:
         # Try importing driver
         try:
-            import oracledb as db_driver
-            try:
-                db_driver.init_oracle_client()
-            except Exception:
-                pass
+            db_driver = load_driver()
         except ImportError:
             try:
                 import cx_Oracle as db_driver
@@ -68,14 +74,19 @@ async def test_connection(info: ConnectionInfo):
         else:
             dsn = f"{info.host}:{info.port}/{info.service_name}"
 
-        # Try connecting
-        connection = db_driver.connect(
-            user=info.username,
-            password=info.password,
-            dsn=dsn
-        )
-        version = connection.version
-        connection.close()
+        # Try connecting (off the event loop, a slow listener must not stall the server)
+        def _probe():
+            connection = db_driver.connect(
+                user=info.username,
+                password=info.password,
+                dsn=dsn
+            )
+            try:
+                return connection.version
+            finally:
+                connection.close()
+
+        version = await asyncio.to_thread(_probe)
         
         return {
             "status": "success",
@@ -89,13 +100,13 @@ async def test_connection(info: ConnectionInfo):
         }
 
 @router.post("/connect")
-async def connect_to_db(info: ConnectionInfo):
-    """Apply Oracle DB Connection globally"""
+async def connect_to_db(info: ConnectionInfo, target: str = Depends(target_param)):
+    """Apply Oracle DB Connection to a target"""
     
     # Construct DSN based on Mode
     try:
         if info.mode == "SID":
-            import oracledb as db_driver
+            db_driver = load_driver()
             dsn = db_driver.makedsn(info.host, info.port, sid=info.service_name)
         else:
             dsn = f"{info.host}:{info.port}/{info.service_name}"
@@ -103,7 +114,8 @@ async def connect_to_db(info: ConnectionInfo):
         success, message = await reconnect_db(
             user=info.username,
             password=info.password,
-            dsn=dsn
+            dsn=dsn,
+            target_id=target
         )
         
         if success:
@@ -116,3 +128,27 @@ async def connect_to_db(info: ConnectionInfo):
             "status": "error", 
             "message": f"Connection Apply Failed: {str(e)}"
         }
+
+@router.get("/agents")
+async def get_agent_stats():
+    """Latency / error counters for each server -> agent link"""
+    return agent_stats()
+
+@router.get("/pool")
+async def get_pool_settings(target: str = Depends(target_param)):
+    """Current pool settings and usage for a target"""
+    status = pool_status(target)
+    if status is None:
+        return {"status": "mock", "message": f"Target {target} has no live pool"}
+    return {"status": "success", "pool": status}
+
+@router.put("/pool")
+async def update_pool_settings(settings: PoolSettings, target: str = Depends(target_param)):
+    """
+    Change pool sizing / call timeout at runtime. Size changes build and warm a
+    new pool, switch to it and drain the old one; no restart needed.
+    """
+    success, message = await configure_pool(target, **settings.model_dump(exclude_none=True))
+    if not success:
+        return {"status": "error", "message": message}
+    return {"status": "success", "message": message, "pool": pool_status(target)}
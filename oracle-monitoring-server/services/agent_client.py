@@ -0,0 +1,188 @@
+import os
+import time
+import random
+import asyncio
+from typing import Dict, Optional
+
+import httpx
+
+from core.targets import get_target, DEFAULT_TARGET
+from core import instrumentation, profiling
+
+# Connection pool / timeout settings for the server -> agent link
+AGENT_MAX_CONNECTIONS = int(os.getenv("AGENT_MAX_CONNECTIONS", "20"))
+AGENT_MAX_KEEPALIVE = int(os.getenv("AGENT_MAX_KEEPALIVE", "10"))
+AGENT_KEEPALIVE_EXPIRY = float(os.getenv("AGENT_KEEPALIVE_EXPIRY", "30"))
+AGENT_CONNECT_TIMEOUT = float(os.getenv("AGENT_CONNECT_TIMEOUT", "3"))
+AGENT_READ_TIMEOUT = float(os.getenv("AGENT_READ_TIMEOUT", "30"))
+AGENT_HTTP2 = os.getenv("AGENT_HTTP2", "false").lower() == "true"
+
+# Retry with full-jitter exponential backoff
+AGENT_RETRIES = int(os.getenv("AGENT_RETRIES", "2"))
+AGENT_BACKOFF_BASE = float(os.getenv("AGENT_BACKOFF_BASE", "0.1"))
+AGENT_BACKOFF_MAX = float(os.getenv("AGENT_BACKOFF_MAX", "2"))
+
+RETRY_STATUS = {502, 503, 504}
+
+
+class AgentStats:
+    """Latency and error counters for one agent link"""
+
+    def __init__(self, agent: str = ""):
+        self._latency = instrumentation.AGENT_LATENCY.labels(agent)
+        self._errors = instrumentation.AGENT_ERRORS.labels(agent)
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.latency_total_ms = 0.0
+        self.latency_max_ms = 0.0
+        self.latency_ewma_ms = None
+        self.last_error = None
+        self.last_error_at = None
+
+    def record(self, elapsed_ms: float, error: Optional[str] = None):
+        self.requests += 1
+        self._latency.observe(elapsed_ms / 1000)
+        self.latency_total_ms += elapsed_ms
+        self.latency_max_ms = max(self.latency_max_ms, elapsed_ms)
+        if self.latency_ewma_ms is None:
+            self.latency_ewma_ms = elapsed_ms
+        else:
+            self.latency_ewma_ms = 0.8 * self.latency_ewma_ms + 0.2 * elapsed_ms
+        if error:
+            self.errors += 1
+            self._errors.inc()
+            self.last_error = error
+            self.last_error_at = time.time()
+
+    def to_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "latency_avg_ms": round(self.latency_total_ms / self.requests, 2) if self.requests else None,
+            "latency_ewma_ms": round(self.latency_ewma_ms, 2) if self.latency_ewma_ms is not None else None,
+            "latency_max_ms": round(self.latency_max_ms, 2),
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at,
+        }
+
+
+class AgentClient:
+    """
+    Long-lived, keep-alive pooled HTTP client for one agent.
+
+    Idempotent GETs are retried on transport errors and 502/503/504. Other
+    methods are only retried when the connection could not be established,
+    so a statement is never sent to the database twice.
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.stats = AgentStats(self.base_url)
+        http2 = AGENT_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("⚠️ AGENT_HTTP2 requested but 'h2' is not installed, using HTTP/1.1")
+                http2 = False
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=AGENT_MAX_CONNECTIONS,
+                max_keepalive_connections=AGENT_MAX_KEEPALIVE,
+                keepalive_expiry=AGENT_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(AGENT_READ_TIMEOUT, connect=AGENT_CONNECT_TIMEOUT),
+        )
+
+    async def _backoff(self, attempt: int):
+        self.stats.retries += 1
+        await asyncio.sleep(random.uniform(0, min(AGENT_BACKOFF_MAX, AGENT_BACKOFF_BASE * (2 ** attempt))))
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            return await self._request(method, path, **kwargs)
+        finally:
+            profiling.record("agent", time.perf_counter() - started)
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        idempotent = method.upper() in ("GET", "HEAD")
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                resp = await self._client.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                self.stats.record((time.perf_counter() - started) * 1000, f"{type(e).__name__}: {e}")
+                retryable = idempotent or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if retryable and attempt < AGENT_RETRIES:
+                    await self._backoff(attempt)
+                    attempt += 1
+                    continue
+                raise
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if resp.status_code >= 500:
+                self.stats.record(elapsed_ms, f"HTTP {resp.status_code}")
+                if idempotent and resp.status_code in RETRY_STATUS and attempt < AGENT_RETRIES:
+                    await self._backoff(attempt)
+                    attempt += 1
+                    continue
+            else:
+                self.stats.record(elapsed_ms)
+            return resp
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def stream(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send a request and return the response with an unread body; caller must aclose() it"""
+        started = time.perf_counter()
+        # Streams are long-lived: only connection setup is bounded
+        req = self._client.build_request(method, path, timeout=httpx.Timeout(None, connect=AGENT_CONNECT_TIMEOUT), **kwargs)
+        try:
+            resp = await self._client.send(req, stream=True)
+            profiling.record("agent", time.perf_counter() - started)
+        except httpx.TransportError as e:
+            self.stats.record((time.perf_counter() - started) * 1000, f"{type(e).__name__}: {e}")
+            raise
+        self.stats.record((time.perf_counter() - started) * 1000,
+                          f"HTTP {resp.status_code}" if resp.status_code >= 500 else None)
+        return resp
+
+    async def close(self):
+        await self._client.aclose()
+
+
+_clients: Dict[str, AgentClient] = {}
+
+
+def get_client_for_url(url: Optional[str]) -> Optional[AgentClient]:
+    """Return the shared client for an agent URL, or None"""
+    if not url:
+        return None
+    if url not in _clients:
+        _clients[url] = AgentClient(url)
+    return _clients[url]
+
+
+def get_agent_client(target_id: str = DEFAULT_TARGET) -> Optional[AgentClient]:
+    """Return the shared client for a target's agent, or None if it has no agent"""
+    return get_client_for_url(get_target(target_id).agent_url)
+
+
+def agent_stats() -> Dict[str, dict]:
+    return {url: c.stats.to_dict() for url, c in _clients.items()}
+
+
+async def close_agent_clients():
+    for c in list(_clients.values()):
+        await c.close()
+    _clients.clear()
@@ -0,0 +1,500 @@
+import os
+import json
+import math
+import time
+import bisect
+import datetime
+import threading
+from collections import deque
+from fnmatch import fnmatchcase
+from typing import Dict, List, Optional, Tuple
+
+# Declarative rules: a JSON list in the format of DEFAULT_RULES below
+ALERT_RULES_FILE = os.getenv("ALERT_RULES_FILE")
+ALERT_HISTORY_FILE = os.getenv(
+    "ALERT_HISTORY_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "alerts.jsonl"),
+)
+ALERT_HISTORY_MAX = int(os.getenv("ALERT_HISTORY_MAX", "50000"))
+
+SEVERITIES = ["INFO", "WARNING", "CRITICAL"]
+RULE_TYPES = ("threshold", "sustained", "rate", "anomaly")
+
+# Metric names are the tsdb series names without the target prefix:
+# cpu_load, memory_usage, active_sessions, disk_io, wait/<event>, ash/<wait class>,
+# blocking/<summary field> (see blocking_values)
+DEFAULT_RULES = [
+    {"id": "cpu_load_high", "metric": "cpu_load", "type": "threshold", "op": ">",
+     "levels": {"WARNING": 70, "CRITICAL": 90}, "for_samples": 2, "hysteresis": 5,
+     "source": "OS", "message": "High CPU load on {target} ({value:.0f}%)"},
+    {"id": "cpu_load_spike", "metric": "cpu_load", "type": "rate", "op": ">", "window": 6, "per": 60,
+     "levels": {"WARNING": 30}, "source": "OS",
+     "message": "CPU load on {target} rising fast ({value:+.0f}%/min)"},
+    {"id": "memory_pressure", "metric": "memory_usage", "type": "sustained", "op": ">",
+     "levels": {"WARNING": 90}, "for_samples": 6, "hysteresis": 3, "source": "OS",
+     "message": "Memory usage on {target} above 90% for 6 samples ({value:.0f}%)"},
+    {"id": "active_sessions_anomaly", "metric": "active_sessions", "type": "anomaly", "op": ">",
+     "levels": {"WARNING": 3, "CRITICAL": 5}, "alpha": 0.05, "min_samples": 30, "for_samples": 2,
+     "source": "Database",
+     "message": "Active sessions on {target} unusually high ({raw:.0f}, {value:.1f} sigma above baseline)"},
+    {"id": "blocking_sessions", "metric": "blocking/blocked_sessions", "type": "threshold", "op": ">",
+     "levels": {"WARNING": 0, "CRITICAL": 20}, "for_samples": 2, "source": "Database",
+     "message": "Blocking Session Detected on {target} ({value:.0f} sessions waiting)"},
+    {"id": "blocking_long_wait", "metric": "blocking/longest_wait_seconds", "type": "threshold", "op": ">",
+     "levels": {"WARNING": 60, "CRITICAL": 300}, "hysteresis": 30, "source": "Database",
+     "message": "Session on {target} blocked for {value:.0f}s"},
+    {"id": "blocking_cycle", "metric": "blocking/sessions_in_cycles", "type": "threshold", "op": ">",
+     "levels": {"CRITICAL": 0}, "for_samples": 2, "source": "Database",
+     "message": "Blocking cycle on {target} ({value:.0f} sessions)"},
+]
+
+
+class Rule:
+    """One alert rule; `levels` maps severity -> threshold on the rule's signal"""
+
+    def __init__(self, id: str, metric: str, type: str = "threshold", op: str = ">",
+                 levels: Optional[Dict[str, float]] = None, for_samples: int = 1, clear_samples: int = 1,
+                 hysteresis: float = 0.0, window: int = 5, per: float = 60.0, alpha: float = 0.05,
+                 min_samples: int = 30, source: str = "Database", message: Optional[str] = None):
+        if type not in RULE_TYPES:
+            raise ValueError(f"Rule {id}: type must be one of {RULE_TYPES}")
+        if op not in (">", "<"):
+            raise ValueError(f"Rule {id}: op must be '>' or '<'")
+        if not levels or any(s not in SEVERITIES for s in levels):
+            raise ValueError(f"Rule {id}: levels must map {SEVERITIES} to thresholds")
+        self.id = id
+        self.metric = metric
+        self.type = type
+        self.op = op
+        # Most severe first, so the first breached level wins
+        self.levels: List[Tuple[str, float]] = sorted(
+            levels.items(), key=lambda kv: SEVERITIES.index(kv[0]), reverse=True)
+        self.for_samples = max(1, for_samples)
+        self.clear_samples = max(1, clear_samples)
+        self.hysteresis = hysteresis
+        self.window = max(2, window)
+        self.per = per
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.source = source
+        self.message = message or "{metric} on {target} is {value:.2f}"
+        self.wildcard = any(c in metric for c in "*?[")
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Rule":
+        return cls(**d)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id, "metric": self.metric, "type": self.type, "op": self.op,
+            "levels": dict(self.levels), "for_samples": self.for_samples,
+            "clear_samples": self.clear_samples, "hysteresis": self.hysteresis,
+            "window": self.window, "per": self.per, "alpha": self.alpha,
+            "min_samples": self.min_samples, "source": self.source, "message": self.message,
+        }
+
+    def breached(self, signal: float, margin: float = 0.0) -> Optional[str]:
+        """Most severe level crossed by `signal`; `margin` moves thresholds back (hysteresis)"""
+        for severity, level in self.levels:
+            if self.op == ">" and signal > level - margin:
+                return severity
+            if self.op == "<" and signal < level + margin:
+                return severity
+        return None
+
+
+class RuleState:
+    """O(1) rolling state for one (rule, target, metric)"""
+    __slots__ = ("ring", "n", "mean", "var", "breach", "ok", "active_id", "active_severity")
+
+    def __init__(self, rule: Rule):
+        self.ring = deque(maxlen=rule.window) if rule.type == "rate" else None
+        self.n = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.breach = 0             # consecutive breaching samples
+        self.ok = 0                 # consecutive clear samples while active
+        self.active_id: Optional[int] = None
+        self.active_severity: Optional[str] = None
+
+    def signal(self, rule: Rule, value: float, ts: float) -> Optional[float]:
+        if rule.type in ("threshold", "sustained"):
+            return value
+        if rule.type == "rate":
+            self.ring.append((ts, value))
+            if len(self.ring) < 2:
+                return None
+            t0, v0 = self.ring[0]
+            return (value - v0) / (ts - t0) * rule.per if ts > t0 else None
+        # anomaly: z-score against an exponentially weighted mean/variance
+        z = None
+        if self.n >= rule.min_samples:
+            std = math.sqrt(self.var)
+            z = (value - self.mean) / std if std > 1e-9 else 0.0
+        self.n += 1
+        if self.n == 1:
+            self.mean = value
+        else:
+            diff = value - self.mean
+            incr = rule.alpha * diff
+            self.mean += incr
+            self.var = (1 - rule.alpha) * (self.var + diff * incr)
+        return z
+
+
+def _fmt_time(ts: float) -> str:
+    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class AlertHistory:
+    """
+    Append-only alert log with contiguous ids, so an id maps straight to its
+    list position. Per-field indexes (severity, source, target) hold sorted
+    id lists, and a time index holds (ts, id) sorted by firing time: alerts
+    raised from a replayed agent backlog keep their real time even though
+    they are logged after newer ones. A query narrows the time range to ids
+    and walks the smallest matching index newest-first (by id), giving keyset
+    pagination via `before_id`. Persisted as JSONL (fire/resolve records)
+    and compacted.
+    """
+
+    INDEXED = ("severity", "source", "target")
+
+    def __init__(self, path: Optional[str] = ALERT_HISTORY_FILE, max_entries: int = ALERT_HISTORY_MAX):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries: List[dict] = []
+        self.times: List[Tuple[float, int]] = []
+        self.base_id = 1
+        self.index: Dict[str, Dict[str, List[int]]] = {f: {} for f in self.INDEXED}
+        self._lock = threading.Lock()
+        self._file = None
+        self._lines = 0
+        if path:
+            self._load()
+
+    @property
+    def next_id(self) -> int:
+        return self.base_id + len(self.entries)
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line
+                    self._lines += 1
+                    if rec.pop("op", None) == "resolve":
+                        self._apply_resolve(rec["id"], rec["resolved_at"])
+                    else:
+                        if not self.entries:
+                            self.base_id = rec["id"]
+                        if rec["id"] == self.next_id:
+                            self._insert(rec)
+            self._trim()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "a")
+
+    def _insert(self, entry: dict):
+        self.entries.append(entry)
+        if self.times and entry["ts"] < self.times[-1][0]:
+            bisect.insort(self.times, (entry["ts"], entry["id"]))
+        else:
+            self.times.append((entry["ts"], entry["id"]))
+        for field in self.INDEXED:
+            self.index[field].setdefault(str(entry.get(field)), []).append(entry["id"])
+
+    def _trim(self):
+        if len(self.entries) <= self.max_entries:
+            return
+        # Drop a chunk at a time so trimming is amortised O(1) per insert
+        drop = len(self.entries) - self.max_entries + self.max_entries // 10
+        self.entries = self.entries[drop:]
+        self.times = [t for t in self.times if t[1] >= self.base_id + drop]
+        self.base_id += drop
+        for field in self.INDEXED:
+            for key in list(self.index[field]):
+                ids = self.index[field][key]
+                cut = bisect.bisect_left(ids, self.base_id)
+                if cut >= len(ids):
+                    del self.index[field][key]
+                elif cut:
+                    self.index[field][key] = ids[cut:]
+
+    def _write(self, rec: dict):
+        if self._file is None:
+            return
+        self._file.write(json.dumps(rec) + "\n")
+        self._file.flush()
+        self._lines += 1
+        if self._lines > 2 * self.max_entries:
+            self._compact()
+
+    def _compact(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry) + "\n")
+        self._file.close()
+        os.replace(tmp, self.path)
+        self._file = open(self.path, "a")
+        self._lines = len(self.entries)
+
+    def add(self, entry: dict) -> dict:
+        with self._lock:
+            entry["id"] = self.next_id
+            entry["time"] = _fmt_time(entry["ts"])
+            self._insert(entry)
+            self._write(entry)
+            self._trim()
+        return entry
+
+    def _apply_resolve(self, alert_id: int, resolved_at: float):
+        pos = alert_id - self.base_id
+        if 0 <= pos < len(self.entries):
+            self.entries[pos]["state"] = "RESOLVED"
+            self.entries[pos]["resolved_at"] = resolved_at
+
+    def resolve(self, alert_id: int, resolved_at: float):
+        with self._lock:
+            self._apply_resolve(alert_id, resolved_at)
+            self._write({"op": "resolve", "id": alert_id, "resolved_at": resolved_at})
+
+    def get(self, alert_id: int) -> Optional[dict]:
+        pos = alert_id - self.base_id
+        return self.entries[pos] if 0 <= pos < len(self.entries) else None
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None,
+              severity: Optional[List[str]] = None, source: Optional[List[str]] = None,
+              target: Optional[List[str]] = None, state: Optional[str] = None,
+              limit: int = 100, before_id: Optional[int] = None) -> Tuple[List[dict], Optional[int]]:
+        """Newest-first page of matching alerts and the `before_id` of the next page (or None)"""
+        with self._lock:
+            if not self.entries:
+                return [], None
+            lo_id, hi_id = self.base_id, self.next_id
+            if before_id is not None:
+                hi_id = min(hi_id, before_id)
+            in_range = None
+            if start is not None or end is not None:
+                lo = bisect.bisect_left(self.times, (start, 0)) if start is not None else 0
+                hi = bisect.bisect_right(self.times, (end, math.inf)) if end is not None else len(self.times)
+                # Ids are almost always in time order already, which makes the sort linear
+                in_range = sorted(i for _, i in self.times[lo:hi])
+                if not in_range:
+                    return [], None
+                # Id window around the range; replayed alerts in it that are outside the range are skipped below
+                lo_id = max(lo_id, in_range[0])
+                hi_id = min(hi_id, in_range[-1] + 1)
+
+            filters = {"severity": severity, "source": source, "target": target}
+            candidates = in_range if in_range is not None and len(in_range) < hi_id - lo_id else None
+            for field, wanted in filters.items():
+                if not wanted:
+                    continue
+                ids = sorted(i for w in wanted for i in self.index[field].get(w, []))
+                if candidates is None or len(ids) < len(candidates):
+                    candidates = ids
+            if candidates is None:
+                candidates = range(self.base_id, self.next_id)
+
+            items: List[dict] = []
+            i = bisect.bisect_left(candidates, hi_id) - 1
+            while i >= 0 and candidates[i] >= lo_id:
+                entry = self.entries[candidates[i] - self.base_id]
+                i -= 1
+                if any(wanted and str(entry.get(field)) not in wanted for field, wanted in filters.items()):
+                    continue
+                if (start is not None and entry["ts"] < start) or (end is not None and entry["ts"] > end):
+                    continue
+                if state and entry.get("state") != state:
+                    continue
+                if len(items) == limit:
+                    return items, items[-1]["id"]
+                items.append(dict(entry))
+            return items, None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class AlertEngine:
+    """
+    Evaluates every rule against each incoming sample. State is O(1) per
+    (rule, target, metric): a counter for sustained breaches, a fixed ring
+    for rate-of-change, and an EWMA mean/variance for anomalies. An alert
+    fires once when a level has been breached for `for_samples` samples,
+    escalates if a higher level is crossed, and resolves only after
+    `clear_samples` samples back inside the threshold minus `hysteresis`.
+    """
+
+    def __init__(self, rules: List[Rule], history: AlertHistory):
+        self.history = history
+        # Pushed batches are evaluated in worker threads, polled samples on the event loop
+        self._lock = threading.Lock()
+        self.set_rules(rules)
+
+    def set_rules(self, rules: List[Rule]):
+        exact: Dict[str, List[Rule]] = {}
+        wildcard: List[Rule] = []
+        for rule in rules:
+            if rule.wildcard:
+                wildcard.append(rule)
+            else:
+                exact.setdefault(rule.metric, []).append(rule)
+        with self._lock:
+            self.rules = rules
+            self._exact = exact
+            self._wildcard = wildcard
+            self._states: Dict[Tuple[str, str, str], RuleState] = {}
+            # Firing alerts per target, kept up to date on transitions (has_active runs every tick)
+            self._active: Dict[str, int] = {}
+
+    def evaluate(self, target_id: str, values: Dict[str, float], ts: Optional[float] = None) -> List[dict]:
+        """Feed one sample; returns alerts fired (or escalated) by it"""
+        ts = ts if ts is not None else time.time()
+        fired = []
+        with self._lock:
+            for metric, value in values.items():
+                rules = self._exact.get(metric, [])
+                if self._wildcard:
+                    rules = rules + [r for r in self._wildcard if fnmatchcase(metric, r.metric)]
+                for rule in rules:
+                    alert = self._step(rule, target_id, metric, float(value), ts)
+                    if alert is not None:
+                        fired.append(alert)
+        return fired
+
+    def _step(self, rule: Rule, target_id: str, metric: str, value: float, ts: float) -> Optional[dict]:
+        key = (rule.id, target_id, metric)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = RuleState(rule)
+        signal = state.signal(rule, value, ts)
+        if signal is None:
+            return None
+
+        severity = rule.breached(signal)
+        state.breach = state.breach + 1 if severity else 0
+
+        if state.active_id is not None:
+            # Still breached once hysteresis is taken into account?
+            if rule.breached(signal, rule.hysteresis) is None:
+                state.ok += 1
+                if state.ok >= rule.clear_samples:
+                    self.history.resolve(state.active_id, ts)
+                    state.active_id = state.active_severity = None
+                    state.ok = 0
+                    self._active[target_id] -= 1
+                return None
+            state.ok = 0
+            if severity and SEVERITIES.index(severity) > SEVERITIES.index(state.active_severity):
+                # Escalation: record the new severity; the old entry is superseded
+                self.history.resolve(state.active_id, ts)
+                return self._fire(rule, state, target_id, metric, severity, signal, value, ts)
+            return None
+
+        if severity and state.breach >= rule.for_samples:
+            return self._fire(rule, state, target_id, metric, severity, signal, value, ts)
+        return None
+
+    def _fire(self, rule, state, target_id, metric, severity, signal, value, ts) -> dict:
+        try:
+            message = rule.message.format(target=target_id, metric=metric, value=signal, raw=value)
+        except (KeyError, ValueError, IndexError):
+            message = f"{rule.id}: {metric} on {target_id} = {signal:.2f}"
+        entry = self.history.add({
+            "ts": ts,
+            "severity": severity,
+            "message": message,
+            "source": rule.source,
+            "target": target_id,
+            "rule": rule.id,
+            "metric": metric,
+            "value": round(signal, 3),
+            "state": "FIRING",
+            "resolved_at": None,
+        })
+        if state.active_id is None:
+            self._active[target_id] = self._active.get(target_id, 0) + 1
+        state.active_id = entry["id"]
+        state.active_severity = severity
+        print(f"🚨 [{target_id}] {severity}: {message}")
+        return entry
+
+    def has_active(self, target_id: str) -> bool:
+        return self._active.get(target_id, 0) > 0
+
+    def active(self, target_id: Optional[str] = None) -> List[dict]:
+        alerts = []
+        with self._lock:
+            states = list(self._states.items())
+        for (_, target, _), state in states:
+            if state.active_id is not None and (target_id is None or target == target_id):
+                entry = self.history.get(state.active_id)
+                if entry is not None:
+                    alerts.append(dict(entry))
+        return sorted(alerts, key=lambda a: a["id"], reverse=True)
+
+
+def sample_values(metrics: dict) -> Dict[str, float]:
+    """Flatten a dashboard sample to the metric names rules refer to"""
+    values = {}
+    for key in ("cpu_load", "memory_usage", "active_sessions", "disk_io"):
+        value = metrics.get(key)
+        if isinstance(value, (int, float)):
+            values[key] = value
+    for event in metrics.get("wait_events", []):
+        values[f"wait/{event['name']}"] = event["value"]
+    return values
+
+
+BLOCKING_FIELDS = ("blocked_sessions", "root_blockers", "max_depth", "max_blocked_per_root",
+                   "longest_wait_seconds", "sessions_in_cycles")
+
+
+def blocking_values(report: dict) -> Dict[str, float]:
+    """Blocking-analysis summary as blocking/<field> metrics"""
+    return {f"blocking/{k}": report[k] for k in BLOCKING_FIELDS if isinstance(report.get(k), (int, float))}
+
+
+def load_rules() -> List[Rule]:
+    if ALERT_RULES_FILE:
+        with open(ALERT_RULES_FILE) as f:
+            rules = [Rule.from_dict(d) for d in json.load(f)]
+        print(f"🚨 Loaded {len(rules)} alert rules from {ALERT_RULES_FILE}")
+        return rules
+    return [Rule.from_dict(d) for d in DEFAULT_RULES]
+
+
+_engine: Optional[AlertEngine] = None
+
+
+def get_engine() -> AlertEngine:
+    global _engine
+    if _engine is None:
+        _engine = AlertEngine(load_rules(), AlertHistory())
+    return _engine
+
+
+def evaluate_sample(target_id: str, metrics: dict, ts: Optional[float] = None) -> List[dict]:
+    return get_engine().evaluate(target_id, sample_values(metrics), ts)
+
+
+def evaluate_ash(target_id: str, counts: Dict[str, float], ts: Optional[float] = None) -> List[dict]:
+    return get_engine().evaluate(target_id, {f"ash/{k}": v for k, v in counts.items()}, ts)
+
+
+def evaluate_blocking(target_id: str, report: dict, ts: Optional[float] = None) -> List[dict]:
+    return get_engine().evaluate(target_id, blocking_values(report), ts)
+
+
+def close_engine():
+    global _engine
+    if _engine is not None:
+        _engine.history.close()
+        _engine = None
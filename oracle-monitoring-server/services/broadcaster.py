@@ -0,0 +1,267 @@
+import asyncio
+import os
+import time
+import random
+from typing import Dict, FrozenSet, Optional, Set
+
+from services.monitoring import MonitoringService
+from services import alerts
+from services.agent_client import get_agent_client
+from services.scheduler import AdaptiveInterval, is_stressed, SCHED_BOOST_SECONDS
+from services.wsproto import TickFrames
+from core import tsdb, instrumentation
+from core.targets import DEFAULT_TARGET, get_target
+
+# Sampling interval and per-client send queue depth
+DASHBOARD_INTERVAL = float(os.getenv("DASHBOARD_INTERVAL", "2"))
+WS_QUEUE_DEPTH = int(os.getenv("WS_QUEUE_DEPTH", "8"))
+# ASH wait-class counts change per minute at most; sample them (and blocking trees) less often
+ASH_SAMPLE_INTERVAL = float(os.getenv("ASH_SAMPLE_INTERVAL", "10"))
+# Share of wall time each family's queries may take before its interval is stretched
+DASHBOARD_COST_BUDGET = float(os.getenv("DASHBOARD_COST_BUDGET", "0.25"))
+ASH_COST_BUDGET = float(os.getenv("ASH_COST_BUDGET", "0.1"))
+
+# Fleet scheduling: at most COLLECT_CONCURRENCY targets sample at once, and a
+# sample that takes longer than COLLECT_TIMEOUT is abandoned for that tick
+COLLECT_CONCURRENCY = int(os.getenv("COLLECT_CONCURRENCY", "32"))
+COLLECT_TIMEOUT = float(os.getenv("COLLECT_TIMEOUT", "5"))
+
+_collect_slots: Optional[asyncio.Semaphore] = None
+
+
+def _slots() -> asyncio.Semaphore:
+    # Created lazily so it binds to the running event loop
+    global _collect_slots
+    if _collect_slots is None:
+        _collect_slots = asyncio.Semaphore(COLLECT_CONCURRENCY)
+    return _collect_slots
+
+
+class Subscriber:
+    """
+    One connected client: a bounded send queue. v1 clients get drop-oldest
+    backpressure; v2 clients get a snapshot in place of whatever was dropped,
+    since their deltas only apply in sequence.
+    """
+
+    def __init__(self, maxsize: int = WS_QUEUE_DEPTH, version: int = 1,
+                 groups: Optional[FrozenSet[str]] = None, fmt: str = "json"):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.version = version
+        self.groups = groups
+        self.fmt = fmt
+        self.needs_snapshot = True
+
+    def offer(self, frames: TickFrames):
+        if self.version == 1:
+            # Never block the collector: if the client is slow, discard its oldest frame
+            if self.queue.full():
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except asyncio.QueueEmpty:
+                    pass
+            self.queue.put_nowait(frames.legacy())
+            return
+
+        if self.needs_snapshot or self.queue.full():
+            # A fresh snapshot supersedes everything still queued
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(frames.snapshot(self.groups, self.fmt))
+            self.needs_snapshot = False
+        else:
+            self.queue.put_nowait(frames.delta(self.groups, self.fmt))
+
+    async def next(self):
+        return await self.queue.get()
+
+
+class DashboardBroadcaster:
+    """
+    Single collector per target. Samples once per interval, persists the sample
+    to the time-series store and fans the same serialized payload out to every
+    subscriber. The collector keeps running without subscribers so history is
+    never lost.
+    """
+
+    def __init__(self, target_id: str = DEFAULT_TARGET, interval: float = DASHBOARD_INTERVAL,
+                 passive: bool = False):
+        self.target_id = target_id
+        self.schedule = AdaptiveInterval(interval, DASHBOARD_COST_BUDGET)
+        self.ash_schedule = AdaptiveInterval(ASH_SAMPLE_INTERVAL, ASH_COST_BUDGET)
+        self._agent_boost_until = 0.0
+        # Passive broadcasters never sample; pushed batches are published into them
+        self.passive = passive
+        self.service = MonitoringService()
+        self.subscribers: Set[Subscriber] = set()
+        self.seq = 0
+        self.latest: Optional[TickFrames] = None
+        self.latest_data: Optional[dict] = None
+        self.last_sample_at: Optional[float] = None
+        self.last_sample_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.consecutive_failures = 0
+        # Drops from subscribers that have since disconnected
+        self.dropped_frames = 0
+        self._task: Optional[asyncio.Task] = None
+        self._sample_latency = instrumentation.COLLECTOR_SAMPLE.labels(target_id)
+
+    @property
+    def interval(self) -> float:
+        """Current (adaptive) dashboard sampling interval"""
+        return self.schedule.current
+
+    def subscribe(self, version: int = 1, groups: Optional[FrozenSet[str]] = None,
+                  fmt: str = "json") -> Subscriber:
+        sub = Subscriber(version=version, groups=groups, fmt=fmt)
+        # New clients get the last sample immediately instead of waiting a full tick
+        if self.latest is not None:
+            sub.offer(self.latest)
+        self.subscribers.add(sub)
+        if not self.passive:
+            self.start()
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        if sub in self.subscribers:
+            self.subscribers.discard(sub)
+            self.dropped_frames += sub.dropped
+
+    def start(self):
+        if self.passive:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def resync(self, sub: Subscriber):
+        """Send a v2 client a full snapshot now (it lost track of the delta sequence)"""
+        sub.needs_snapshot = True
+        if self.latest is not None:
+            sub.offer(self.latest)
+
+    def broadcast(self, data: dict):
+        # Frames are encoded lazily, once per (groups, format), and shared by all subscribers
+        self.seq += 1
+        self.latest = TickFrames(self.seq, data, self.latest.data if self.latest is not None else None)
+        for sub in list(self.subscribers):
+            sub.offer(self.latest)
+
+    def publish(self, data: dict, ts: float):
+        """Fan out a sample that was collected elsewhere (agent push mode)"""
+        self.latest_data = data
+        self.last_sample_at = ts
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.broadcast(data)
+
+    async def _sample(self, with_ash: bool):
+        ash = blocking = None
+        async with _slots():
+            started = time.perf_counter()
+            data = await self.service.get_dashboard_data(self.target_id)
+            self.schedule.observe(time.perf_counter() - started)
+            if with_ash:
+                started = time.perf_counter()
+                ash = await self.service.get_ash_sample(self.target_id)
+                blocking = await self.service.get_blocking(self.target_id)
+                self.ash_schedule.observe(time.perf_counter() - started)
+        return data, ash, blocking
+
+    async def _boost_agent(self):
+        """Ask the target's agent to sample faster while alerts are active"""
+        agent = get_agent_client(self.target_id)
+        if agent is None:
+            return
+        try:
+            await agent.post("/scheduler/boost", params={"seconds": SCHED_BOOST_SECONDS})
+        except Exception as e:
+            print(f"[{self.target_id}] Agent Error (boost): {e}")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        # Spread targets across the interval so a fleet doesn't poll in lockstep
+        await asyncio.sleep(random.uniform(0, self.interval))
+        next_ash = 0.0
+        while True:
+            started = loop.time()
+            boosted = alerts.get_engine().has_active(self.target_id)
+            stressed = is_stressed(self.latest_data)
+            try:
+                now = time.time()
+                with_ash = now >= next_ash
+                data, ash, blocking = await asyncio.wait_for(self._sample(with_ash), COLLECT_TIMEOUT)
+                self.latest_data = data
+                self.broadcast(data)
+
+                tsdb.record_sample(self.target_id, data, now)
+                alerts.evaluate_sample(self.target_id, data, now)
+                if ash is not None:
+                    next_ash = now + self.ash_schedule.jittered(self.ash_schedule.next(stressed, boosted))
+                    tsdb.record_ash(self.target_id, ash, now)
+                    alerts.evaluate_ash(self.target_id, ash, now)
+                if blocking is not None:
+                    alerts.evaluate_blocking(self.target_id, blocking, now)
+                self.last_sample_at = now
+                self.last_sample_ms = (loop.time() - started) * 1000
+                self._sample_latency.observe(self.last_sample_ms / 1000)
+                self.consecutive_failures = 0
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.consecutive_failures += 1
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                self.last_error = "Sample timed out" if timed_out else str(e)
+                instrumentation.COLLECTOR_ERRORS.labels(self.target_id, "timeout" if timed_out else "error").inc()
+                print(f"Collector Error ({self.target_id}): {self.last_error}")
+            if boosted and time.time() >= self._agent_boost_until:
+                # Renewed halfway through so the agent stays boosted while the alert lasts
+                self._agent_boost_until = time.time() + SCHED_BOOST_SECONDS / 2
+                asyncio.create_task(self._boost_agent())
+            # Keep a steady cadence regardless of how long the sample took
+            interval = self.schedule.jittered(self.schedule.next(stressed, boosted))
+            elapsed = loop.time() - started
+            await asyncio.sleep(max(0.0, interval - elapsed))
+
+    def status(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "subscribers": len(self.subscribers),
+            "last_sample_at": self.last_sample_at,
+            "last_sample_ms": round(self.last_sample_ms, 1) if self.last_sample_ms is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "schedule": {"dashboard": self.schedule.status(), "ash": self.ash_schedule.status()},
+        }
+
+
+_broadcasters: Dict[str, DashboardBroadcaster] = {}
+
+
+def get_broadcaster(target_id: str = DEFAULT_TARGET) -> DashboardBroadcaster:
+    if target_id not in _broadcasters:
+        _broadcasters[target_id] = DashboardBroadcaster(target_id, passive=get_target(target_id).push)
+    return _broadcasters[target_id]
+
+
+def all_broadcasters() -> Dict[str, DashboardBroadcaster]:
+    return _broadcasters
+
+
+def remove_broadcaster(target_id: str):
+    b = _broadcasters.pop(target_id, None)
+    if b is not None:
+        b.stop()
+
+
+async def shutdown_broadcasters():
+    for b in _broadcasters.values():
+        b.stop()
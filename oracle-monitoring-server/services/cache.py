@@ -0,0 +1,125 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+
+
+class _Entry:
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value, fresh_until, stale_until):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class TTLCache:
+    """
+    Bounded LRU cache with per-call TTLs, single-flight fetches and
+    stale-while-revalidate.
+
+    Concurrent callers for the same key share one in-flight fetch. Once an
+    entry is past its TTL but still inside the stale window it is served
+    immediately while one background refresh runs. Failed fetches are never
+    cached; a stale value is kept if its refresh fails.
+    """
+
+    def __init__(self, name: str, max_entries: int = CACHE_MAX_ENTRIES):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def _store(self, key, value, ttl: float, stale_ttl: float):
+        now = time.monotonic()
+        self._entries[key] = _Entry(value, now + ttl, now + ttl + stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _start_fetch(self, key, fetch: Callable[[], Awaitable[Any]], ttl: float, stale_ttl: float) -> asyncio.Task:
+        async def run():
+            try:
+                value = await fetch()
+                self._store(key, value, ttl, stale_ttl)
+                return value
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                self._inflight.pop(key, None)
+
+        task = asyncio.create_task(run())
+        self._inflight[key] = task
+        return task
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]],
+                           ttl: float, stale_ttl: float = 0.0):
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now < entry.fresh_until:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry.value
+            if now < entry.stale_until:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                if key not in self._inflight:
+                    task = self._start_fetch(key, fetch, ttl, stale_ttl)
+                    # Background refresh errors are counted, not raised
+                    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                return entry.value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = self._start_fetch(key, fetch, ttl, stale_ttl)
+        # Shield so one cancelled caller doesn't cancel the fetch for everyone else
+        return await asyncio.shield(task)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "errors": self.errors,
+            "hit_ratio": round((self.hits + self.stale_hits + self.coalesced) / lookups, 3) if lookups else None,
+        }
+
+
+_caches: Dict[str, TTLCache] = {}
+
+
+def get_cache(name: str) -> TTLCache:
+    if name not in _caches:
+        _caches[name] = TTLCache(name)
+    return _caches[name]
+
+
+def cache_stats() -> Dict[str, dict]:
+    return {name: c.stats() for name, c in _caches.items()}
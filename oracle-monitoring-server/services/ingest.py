@@ -0,0 +1,394 @@
+import io
+import os
+import json
+import time
+import zlib
+import datetime
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from pydantic import BaseModel, ConfigDict, TypeAdapter, ValidationError
+
+from core import tsdb
+from core.targets import Target, get_target, register_target
+from services.monitoring import derive_health
+from services import alerts
+from services.scheduler import SCHED_BOOST_SECONDS
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Shared secret agents send as X-Ingest-Token (PUSH_TOKEN on the agent); unset = no check
+INGEST_TOKEN = os.getenv("INGEST_TOKEN")
+# Unknown agents pushing data become push-only targets automatically (only with INGEST_TOKEN set)
+INGEST_AUTO_REGISTER = os.getenv("INGEST_AUTO_REGISTER", "false").lower() == "true"
+# Decompressed batch size limit (protects against compression bombs)
+INGEST_MAX_BYTES = int(os.getenv("INGEST_MAX_BYTES", str(64 * 1024 * 1024)))
+# Out-of-order sequence numbers remembered per agent epoch
+INGEST_DEDUP_WINDOW = int(os.getenv("INGEST_DEDUP_WINDOW", "1024"))
+INGEST_MAX_EPOCHS = 1024
+# Samples older than this are backlog replayed from an agent's spool: stored, not broadcast as live
+INGEST_LIVE_SECONDS = float(os.getenv("INGEST_LIVE_SECONDS", "60"))
+# Pushed Top-SQL interval deltas kept per target
+PUSHED_TOP_SQL_KEEP_SECONDS = 3900
+
+TOP_SQL_WINDOWS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600}
+# Same palette as the polled dashboard's wait events
+WAIT_CLASS_COLORS = {"User I/O": "#84cc16", "System I/O": "#06b6d4", "Concurrency": "#8b5cf6",
+                     "Commit": "#f59e0b", "CPU": "#ef4444"}
+OTHER_COLOR = "#64748b"
+
+class IngestSample(BaseModel):
+    kind: str
+    ts: float
+    data: Union[Dict[str, Any], List[Dict[str, Any]]]
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    seconds: Optional[float] = None
+
+
+class IngestBatch(BaseModel):
+    agent_id: str
+    epoch: int
+    seq: int
+    target: Optional[str] = None
+    created: Optional[float] = None
+    samples: List[IngestSample]
+
+
+# Per-kind payloads: the fields the server reads must be there and numeric, anything
+# else the agent sends is kept as is
+class SessionMetricsData(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    cpu_load: float
+    active_sessions: int
+    disk_io: float
+    memory_usage: Optional[float] = None
+
+
+class TopSqlRow(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    sql_id: str
+    elapsed_time: float           # microseconds
+    cpu_time: float
+    executions: int
+    sql_text: Optional[str] = None
+    module: Optional[str] = None
+    parsing_schema: Optional[str] = None
+
+
+class TopSqlGroup(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    key: str
+    sql_ids: List[str]
+    statements: int
+    elapsed_time: float
+    cpu_time: float
+    buffer_gets: float = 0
+    disk_reads: float = 0
+    executions: int = 0
+    new_cursors: int = 0
+
+
+class BlockingData(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    blocked_sessions: Optional[int] = None
+    root_blockers: Optional[int] = None
+    max_depth: Optional[int] = None
+    max_blocked_per_root: Optional[int] = None
+    longest_wait_seconds: Optional[float] = None
+    sessions_in_cycles: Optional[int] = None
+    roots: Optional[List[Dict[str, Any]]] = None
+
+
+SAMPLE_DATA = {
+    "session_metrics": TypeAdapter(SessionMetricsData),
+    "ash": TypeAdapter(Dict[str, float]),
+    "top_sql": TypeAdapter(List[TopSqlRow]),
+    "blocking": TypeAdapter(BlockingData),
+}
+TOP_SQL_GROUPS = TypeAdapter(Dict[str, List[TopSqlGroup]])
+
+
+class IngestError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SeqTracker:
+    """Idempotency for one (agent_id, epoch): contiguous high-water mark plus a window of later seqs"""
+
+    def __init__(self):
+        self.contiguous = 0
+        self.seen = set()
+
+    def is_duplicate(self, seq: int) -> bool:
+        return seq <= self.contiguous or seq in self.seen
+
+    def mark(self, seq: int):
+        self.seen.add(seq)
+        while self.contiguous + 1 in self.seen:
+            self.contiguous += 1
+            self.seen.discard(self.contiguous)
+        # Gaps (batches the agent had to drop) must not pin memory forever
+        if len(self.seen) > INGEST_DEDUP_WINDOW:
+            self.contiguous = min(self.seen)
+            self.seen = {s for s in self.seen if s > self.contiguous}
+
+
+_trackers: "OrderedDict[tuple, SeqTracker]" = OrderedDict()
+_pushed_top_sql: Dict[str, deque] = {}
+_pushed_blocking: Dict[str, dict] = {}
+_pushed_ash: Dict[str, Dict[str, float]] = {}
+_agents: Dict[str, dict] = {}
+
+
+def _tracker(agent_id: str, epoch: int) -> SeqTracker:
+    key = (agent_id, epoch)
+    tracker = _trackers.get(key)
+    if tracker is None:
+        tracker = _trackers[key] = SeqTracker()
+        while len(_trackers) > INGEST_MAX_EPOCHS:
+            _trackers.popitem(last=False)
+    _trackers.move_to_end(key)
+    return tracker
+
+
+def _decompress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd" and zstandard is None:
+        raise IngestError(415, "zstd batches need the 'zstandard' package on the server")
+    try:
+        if encoding in ("", "identity"):
+            data = body
+        elif encoding == "gzip":
+            d = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+            data = d.decompress(body, INGEST_MAX_BYTES + 1)
+        elif encoding == "zstd":
+            with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body)) as reader:
+                data = reader.read(INGEST_MAX_BYTES + 1)
+        else:
+            raise IngestError(415, f"Unsupported Content-Encoding: {encoding}")
+    except IngestError:
+        raise
+    except Exception as e:
+        raise IngestError(400, f"Corrupt batch body: {e}")
+    if len(data) > INGEST_MAX_BYTES:
+        raise IngestError(413, "Batch too large")
+    return data
+
+
+def decode_batch(body: bytes, content_type: str, encoding: str) -> dict:
+    data = _decompress(body, encoding.lower().strip())
+    content_type = content_type.split(";")[0].strip().lower()
+    try:
+        if content_type == "application/msgpack":
+            if msgpack is None:
+                raise IngestError(415, "msgpack batches need the 'msgpack' package on the server")
+            return msgpack.unpackb(data, raw=False)
+        if content_type == "application/json":
+            return json.loads(data)
+    except IngestError:
+        raise
+    except Exception as e:
+        raise IngestError(400, f"Malformed batch: {e}")
+    raise IngestError(415, f"Unsupported Content-Type: {content_type}")
+
+
+def check_token(token: Optional[str]):
+    if INGEST_TOKEN and token != INGEST_TOKEN:
+        raise IngestError(401, "Invalid ingest token")
+
+
+def _resolve_target(target_id: str) -> Target:
+    try:
+        return get_target(target_id)
+    except KeyError:
+        # Without a token anyone who can reach the server could create fleet targets
+        if not (INGEST_AUTO_REGISTER and INGEST_TOKEN):
+            raise IngestError(404, f"Unknown target: {target_id} (register it, or set INGEST_AUTO_REGISTER=true "
+                                   f"together with INGEST_TOKEN)")
+        target = Target(id=target_id, mock=True, push=True)
+        register_target(target)
+        print(f"🎯 Registered push target: {target_id}")
+        return target
+
+
+def _invalid(e: ValidationError, prefix: tuple = ()) -> IngestError:
+    problems = "; ".join(f"{'.'.join(map(str, prefix + tuple(err['loc'])))}: {err['msg']}" for err in e.errors()[:5])
+    return IngestError(422, f"Invalid batch: {problems}")
+
+
+def validate_batch(batch) -> IngestBatch:
+    """
+    Check a decoded batch down to each sample's fields; the error names the
+    offending one, e.g. samples.3.data.0.elapsed_time. A 422 makes the agent
+    drop the batch, where a 500 from bad data further in would be retried forever.
+    """
+    try:
+        parsed = IngestBatch.model_validate(batch)
+    except ValidationError as e:
+        raise _invalid(e)
+    for i, sample in enumerate(parsed.samples):
+        adapter = SAMPLE_DATA.get(sample.kind)
+        if adapter is None:
+            continue  # unknown kinds (newer agents) are ignored by apply_batch
+        try:
+            sample.data = adapter.dump_python(adapter.validate_python(sample.data))
+        except ValidationError as e:
+            raise _invalid(e, ("samples", i, "data"))
+        if sample.kind == "top_sql":
+            try:
+                sample.groups = TOP_SQL_GROUPS.dump_python(TOP_SQL_GROUPS.validate_python(sample.groups))
+            except ValidationError as e:
+                raise _invalid(e, ("samples", i, "groups"))
+    return parsed
+
+
+def _dashboard_extras(target_id: str) -> dict:
+    """Fields of the polled dashboard payload the agent's session samples don't carry"""
+    top = pushed_top_sql(target_id, "5m", 3) or []
+    counts = _pushed_ash.get(target_id, {})
+    return {
+        "memory_usage": None,
+        "top_sql": [{k: r[k] for k in ("sql_id", "elapsed_time", "cpu_time", "executions")} for r in top],
+        "wait_events": [{"name": wc, "value": round(v, 2), "color": WAIT_CLASS_COLORS.get(wc, OTHER_COLOR)}
+                        for wc, v in sorted(counts.items(), key=lambda kv: kv[1], reverse=True)],
+    }
+
+
+_apply_lock = threading.Lock()
+
+
+def apply_batch(batch: IngestBatch) -> Tuple[dict, List[Tuple[str, dict, float]]]:
+    """
+    Record a validated batch (blocking: disk writes and alert evaluation, run
+    it in a thread). Returns the ack and the live (target, sample, ts) to
+    publish on the event loop. Re-sent batches are acked without re-applying.
+    """
+    with _apply_lock:
+        return _apply(batch)
+
+
+def _apply(batch: IngestBatch) -> Tuple[dict, List[Tuple[str, dict, float]]]:
+    target = _resolve_target(batch.target or batch.agent_id)
+    tracker = _tracker(batch.agent_id, batch.epoch)
+    if tracker.is_duplicate(batch.seq):
+        return {"status": "ok", "ack": batch.seq, "duplicate": True}, []
+
+    live = []
+    extras = None
+    # Session samples last, so they pick up the ASH / Top-SQL data from the same batch
+    for sample in sorted(batch.samples, key=lambda s: s.kind == "session_metrics"):
+        kind, ts, data = sample.kind, sample.ts, sample.data
+        if kind == "session_metrics":
+            if extras is None:
+                extras = _dashboard_extras(target.id)
+            data = derive_health({**extras, **data, "timestamp": datetime.datetime.fromtimestamp(ts).isoformat()})
+            tsdb.record_sample(target.id, data, ts)
+            alerts.evaluate_sample(target.id, data, ts)
+            if ts >= time.time() - INGEST_LIVE_SECONDS:
+                live.append((target.id, data, ts))
+        elif kind == "ash":
+            tsdb.record_ash(target.id, data, ts)
+            alerts.evaluate_ash(target.id, data, ts)
+            _pushed_ash[target.id] = data
+        elif kind == "top_sql":
+            history = _pushed_top_sql.setdefault(target.id, deque())
+            history.append((ts, data, sample.groups))
+            while history and history[0][0] < time.time() - PUSHED_TOP_SQL_KEEP_SECONDS:
+                history.popleft()
+        elif kind == "blocking":
+            alerts.evaluate_blocking(target.id, data, ts)
+            if data.get("roots") is not None:
+                _pushed_blocking[target.id] = data
+
+    tracker.mark(batch.seq)
+    _agents[batch.agent_id] = {
+        "target": target.id,
+        "epoch": batch.epoch,
+        "last_seq": batch.seq,
+        "last_batch_at": time.time(),
+        "samples": len(batch.samples),
+    }
+    ack = {"status": "ok", "ack": batch.seq, "duplicate": False}
+    if alerts.get_engine().has_active(target.id):
+        # The agent samples faster while an alert is active on its target
+        ack["boost"] = SCHED_BOOST_SECONDS
+    return ack, live
+
+
+def publish_live(live: List[Tuple[str, dict, float]]):
+    """Fan pushed samples out to dashboard subscribers (event loop only)"""
+    from services.broadcaster import get_broadcaster
+
+    for target_id, data, ts in live:
+        get_broadcaster(target_id).publish(data, ts)
+
+
+def pushed_top_sql(target_id: str, window: str, limit: int = 15,
+                   group_by: str = "sql_id") -> Optional[List[dict]]:
+    """Top SQL over `window` from pushed interval deltas, or None if the target never pushed any"""
+    history = _pushed_top_sql.get(target_id)
+    if not history:
+        return None
+    since = time.time() - TOP_SQL_WINDOWS[window]
+    if group_by != "sql_id":
+        return _merge_groups([groups.get(group_by, []) for ts, _, groups in history if ts >= since], limit)
+    totals: Dict[str, dict] = {}
+    for ts, rows, _ in history:
+        if ts < since:
+            continue
+        for r in rows:
+            agg = totals.setdefault(r["sql_id"], {
+                "sql_id": r["sql_id"],
+                "sql_text": r.get("sql_text") or "",
+                "module": r.get("module") or "",
+                "parsing_schema": r.get("parsing_schema") or "",
+                "elapsed_time": 0, "cpu_time": 0, "executions": 0,
+            })
+            agg["elapsed_time"] += r["elapsed_time"]
+            agg["cpu_time"] += r["cpu_time"]
+            agg["executions"] += r["executions"]
+    result = sorted(totals.values(), key=lambda d: d["elapsed_time"], reverse=True)[:limit]
+    for r in result:
+        # Agent deltas are in microseconds
+        r["elapsed_time"] = round(r["elapsed_time"] / 1e6, 3)
+        r["cpu_time"] = round(r["cpu_time"] / 1e6, 3)
+    return result
+
+
+def pushed_blocking(target_id: str) -> Optional[dict]:
+    """Latest blocking report a push-mode agent uploaded"""
+    return _pushed_blocking.get(target_id)
+
+
+def _merge_groups(interval_groups: List[List[dict]], limit: int) -> List[dict]:
+    """Sum pushed fingerprint/signature groups (same shape as the agent's top-sql?group_by=...)"""
+    totals: Dict[str, dict] = {}
+    for groups in interval_groups:
+        for g in groups:
+            agg = totals.get(g["key"])
+            if agg is None:
+                totals[g["key"]] = {**g, "sql_ids": list(g["sql_ids"])}
+                continue
+            for field in ("elapsed_time", "cpu_time", "buffer_gets", "disk_reads", "executions", "new_cursors"):
+                agg[field] += g.get(field, 0)
+            agg["statements"] = max(agg["statements"], g["statements"])
+            agg["sql_ids"] += [s for s in g["sql_ids"] if s not in agg["sql_ids"]][:5 - len(agg["sql_ids"])]
+    result = sorted(totals.values(), key=lambda d: d["elapsed_time"], reverse=True)[:limit]
+    for r in result:
+        r["sql_id"] = r["sql_ids"][0] if r["sql_ids"] else None
+        r["elapsed_time"] = round(r["elapsed_time"] / 1e6, 3)
+        r["cpu_time"] = round(r["cpu_time"] / 1e6, 3)
+    return result
+
+
+def ingest_status() -> Dict[str, dict]:
+    return dict(_agents)
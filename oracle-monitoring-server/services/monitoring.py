@@ -1,22 +1,104 @@
 from core.database import get_db_metrics
+from core.targets import DEFAULT_TARGET
+from core import instrumentation
+from services.agent_client import get_agent_client
+from typing import Dict
 import datetime
+import random
+import time
+
+ASH_WAIT_CLASSES = ["User I/O", "System I/O", "Concurrency", "CPU"]
+
+def derive_health(metrics: dict) -> dict:
+    """Add derived metrics if not present"""
+    if "health_status" not in metrics:
+        load = metrics.get("cpu_load", 0)
+        if load > 90:
+            metrics["health_status"] = "CRITICAL"
+        elif load > 70:
+            metrics["health_status"] = "WARNING"
+        else:
+            metrics["health_status"] = "HEALTHY"
+    return metrics
 
 class MonitoringService:
-    async def get_dashboard_data(self):
+    async def get_dashboard_data(self, target_id: str = DEFAULT_TARGET):
         """Aggregate data for main dashboard"""
-        base_metrics = await get_db_metrics()
+        base_metrics = await get_db_metrics(target_id)
         
         # Add timestamp
         base_metrics["timestamp"] = datetime.datetime.now().isoformat()
         
-        # Add derived metrics if not present
-        if "health_status" not in base_metrics:
-            load = base_metrics.get("cpu_load", 0)
-            if load > 90:
-                base_metrics["health_status"] = "CRITICAL"
-            elif load > 70:
-                base_metrics["health_status"] = "WARNING"
-            else:
-                base_metrics["health_status"] = "HEALTHY"
-                
-        return base_metrics
+        return derive_health(base_metrics)
+
+    async def get_ash_sample(self, target_id: str = DEFAULT_TARGET) -> Dict[str, float]:
+        """Active sessions per wait class for the most recent ASH minute"""
+        agent = get_agent_client(target_id)
+        if agent:
+            try:
+                started = time.perf_counter()
+                resp = await agent.get("/metrics/ash")
+                instrumentation.COLLECTOR_QUERY.labels(target_id, "ash").observe(time.perf_counter() - started)
+                rows = resp.json() if resp.status_code == 200 else None
+                if isinstance(rows, list) and rows:
+                    latest = max(r["time"] for r in rows)
+                    counts: Dict[str, float] = {}
+                    for r in rows:
+                        if r["time"] == latest:
+                            counts[r["wait_class"]] = counts.get(r["wait_class"], 0) + r["active_sessions"]
+                    return counts
+            except Exception as e:
+                print(f"[{target_id}] Agent Error (ash): {e}")
+            instrumentation.MOCK_FALLBACK.labels(target_id, "agent_ash").inc()
+
+        # Mock Data Fallback
+        return {wc: random.randint(2, 40) for wc in ASH_WAIT_CLASSES}
+
+    async def get_blocking(self, target_id: str = DEFAULT_TARGET) -> dict:
+        """Blocking trees from the agent's latest v$session snapshot"""
+        agent = get_agent_client(target_id)
+        if agent:
+            try:
+                started = time.perf_counter()
+                resp = await agent.get("/metrics/blocking")
+                instrumentation.COLLECTOR_QUERY.labels(target_id, "blocking").observe(time.perf_counter() - started)
+                if resp.status_code == 200:
+                    return resp.json()
+            except Exception as e:
+                print(f"[{target_id}] Agent Error (blocking): {e}")
+            instrumentation.MOCK_FALLBACK.labels(target_id, "agent_blocking").inc()
+
+        # Mock Data Fallback: now and then one short row-lock chain
+        return mock_blocking()
+
+
+def mock_blocking() -> dict:
+    waiters = random.choice([0, 0, 0, 1, 2, 4])
+    root = {"sid": 142, "serial": 3071, "username": "APP_MAIN", "program": "JDBC Thin Client",
+            "status": "INACTIVE", "event": "SQL*Net message from client", "sql_id": None,
+            "seconds_in_wait": random.randint(30, 600), "final_blocking_session": None,
+            "depth": 0, "blocked_count": waiters, "max_depth": min(waiters, 2), "children": []}
+    longest = 0
+    parent = root
+    for i in range(waiters):
+        wait = random.randint(1, 300)
+        longest = max(longest, wait)
+        node = {"sid": 200 + i, "serial": 1000 + i, "username": "APP_MAIN", "program": "OrderEntry",
+                "status": "ACTIVE", "event": "enq: TX - row lock contention", "sql_id": "7h35uxf5uhmm1",
+                "seconds_in_wait": wait, "final_blocking_session": 142,
+                "depth": parent["depth"] + 1, "blocked_count": 0, "children": []}
+        parent["children"].append(node)
+        if i == 1:
+            parent = node
+    return {
+        "ts": time.time(),
+        "sessions": random.randint(80, 200),
+        "blocked_sessions": waiters,
+        "root_blockers": 1 if waiters else 0,
+        "max_depth": root["max_depth"],
+        "max_blocked_per_root": waiters,
+        "longest_wait_seconds": longest,
+        "sessions_in_cycles": 0,
+        "cycles": [],
+        "roots": [root] if waiters else [],
+    }
@@ -0,0 +1,295 @@
+"""
+Execution-plan cache and plan-history index for SQL detail pages.
+
+A plan for a given (sql_id, plan_hash_value) never changes, so plan lines
+are fetched from the agent once and kept as content-addressed blobs
+(blobs/<sha256>.json). The same plan seen on several targets is stored once.
+SQL text is stored per sql_id, which is itself a hash of the text.
+
+history.jsonl indexes every (target, sql_id, plan_hash_value) ever observed
+with first/last seen times, the latest statistics and the plan digest. A
+repeat visit, or a look at how a statement's plan changed over time, needs
+no database round-trip.
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+PLAN_CACHE_DIR = os.getenv(
+    "PLAN_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "plans"),
+)
+PLAN_CACHE_MEMORY = int(os.getenv("PLAN_CACHE_MEMORY", "1000"))        # plan blobs kept in memory
+# An unchanged plan's last_seen is only re-persisted after this long
+PLAN_HISTORY_TOUCH_SECONDS = float(os.getenv("PLAN_HISTORY_TOUCH_SECONDS", "300"))
+# Plans fetched in parallel for one detail page (the current one is always fetched)
+PLAN_PREFETCH = int(os.getenv("PLAN_PREFETCH", "4"))
+
+
+# sql_ids are 13 base-32 characters; anything else is never used in a file name
+_SAFE_ID = re.compile(r"^[A-Za-z0-9_]{1,64}$")
+
+
+def plan_digest(lines: List[dict]) -> str:
+    return hashlib.sha256(json.dumps(lines, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def _atomic_write(path: str, data: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class PlanStore:
+    def __init__(self, directory: Optional[str] = PLAN_CACHE_DIR, memory: int = PLAN_CACHE_MEMORY):
+        self.directory = directory
+        self.memory = memory
+        self.blobs: "OrderedDict[str, List[dict]]" = OrderedDict()
+        self.texts: Dict[str, str] = {}
+        self.history: Dict[Tuple[str, str], Dict[int, dict]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._lines = 0
+        self._entries = 0
+        if directory:
+            os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+            os.makedirs(os.path.join(directory, "texts"), exist_ok=True)
+            self._load()
+
+    # --- persistence ---
+
+    @property
+    def _history_path(self) -> str:
+        return os.path.join(self.directory, "history.jsonl")
+
+    def _load(self):
+        if os.path.exists(self._history_path):
+            with open(self._history_path) as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line
+                    self._lines += 1
+                    key = (rec.pop("target"), rec.pop("sql_id"))
+                    # Later records supersede earlier ones
+                    self.history.setdefault(key, {})[rec["plan_hash_value"]] = rec
+            self._entries = sum(len(plans) for plans in self.history.values())
+        self._file = open(self._history_path, "a")
+
+    def _write(self, target: str, sql_id: str, entry: dict):
+        if self._file is None:
+            return
+        self._file.write(json.dumps({"target": target, "sql_id": sql_id, **entry}) + "\n")
+        self._file.flush()
+        self._lines += 1
+        if self._lines > 2 * self._entries + 1000:
+            self._compact()
+
+    def _compact(self):
+        tmp = self._history_path + ".tmp"
+        with open(tmp, "w") as f:
+            for (target, sql_id), plans in self.history.items():
+                for entry in plans.values():
+                    f.write(json.dumps({"target": target, "sql_id": sql_id, **entry}) + "\n")
+        self._file.close()
+        os.replace(tmp, self._history_path)
+        self._file = open(self._history_path, "a")
+        self._lines = self._entries
+
+    # --- plan blobs ---
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "blobs", f"{digest}.json")
+
+    def _remember(self, digest: str, lines: List[dict]):
+        self.blobs[digest] = lines
+        self.blobs.move_to_end(digest)
+        while len(self.blobs) > self.memory:
+            self.blobs.popitem(last=False)
+
+    def blob(self, digest: str) -> Optional[List[dict]]:
+        with self._lock:
+            lines = self.blobs.get(digest)
+            if lines is not None:
+                self.blobs.move_to_end(digest)
+                return lines
+        if not self.directory or not os.path.exists(self._blob_path(digest)):
+            return None
+        with open(self._blob_path(digest)) as f:
+            lines = json.load(f)
+        with self._lock:
+            self._remember(digest, lines)
+        return lines
+
+    def get_plan(self, target: str, sql_id: str, plan_hash_value: int) -> Optional[List[dict]]:
+        entry = self.history.get((target, sql_id), {}).get(plan_hash_value)
+        lines = self.blob(entry["digest"]) if entry and entry.get("digest") else None
+        if lines is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return lines
+
+    def put_plan(self, target: str, sql_id: str, plan_hash_value: int, lines: List[dict]) -> str:
+        digest = plan_digest(lines)
+        with self._lock:
+            if self.directory and not os.path.exists(self._blob_path(digest)):
+                _atomic_write(self._blob_path(digest), json.dumps(lines))
+            self._remember(digest, lines)
+            plans = self.history.setdefault((target, sql_id), {})
+            entry = plans.get(plan_hash_value)
+            if entry is None:
+                now = time.time()
+                entry = plans[plan_hash_value] = {"plan_hash_value": plan_hash_value, "first_seen": now,
+                                                  "last_seen": now, "stats": None}
+                self._entries += 1
+            if entry.get("digest") != digest:
+                entry["digest"] = digest
+                self._write(target, sql_id, entry)
+        return digest
+
+    # --- SQL text ---
+
+    def get_text(self, sql_id: str) -> Optional[str]:
+        text = self.texts.get(sql_id)
+        if text is None and self.directory and _SAFE_ID.match(sql_id):
+            path = os.path.join(self.directory, "texts", f"{sql_id}.sql")
+            if os.path.exists(path):
+                with open(path) as f:
+                    text = self.texts[sql_id] = f.read()
+        return text
+
+    def put_text(self, sql_id: str, text: str):
+        self.texts[sql_id] = text
+        if self.directory and _SAFE_ID.match(sql_id):
+            _atomic_write(os.path.join(self.directory, "texts", f"{sql_id}.sql"), text)
+
+    # --- plan history ---
+
+    def observe(self, target: str, sql_id: str, plans: List[dict], now: Optional[float] = None):
+        """Record the plans (with statistics) currently in the shared pool for a statement"""
+        now = now if now is not None else time.time()
+        with self._lock:
+            known = self.history.setdefault((target, sql_id), {})
+            for stats in plans:
+                phv = stats["plan_hash_value"]
+                seen = stats.get("last_active_time") or now
+                entry = known.get(phv)
+                if entry is None:
+                    entry = known[phv] = {"plan_hash_value": phv, "first_seen": seen, "last_seen": seen,
+                                          "digest": None, "stats": stats}
+                    self._entries += 1
+                    self._write(target, sql_id, entry)
+                    continue
+                touched = seen - entry["last_seen"] >= PLAN_HISTORY_TOUCH_SECONDS
+                entry["stats"] = stats
+                entry["last_seen"] = max(entry["last_seen"], seen)
+                if touched:
+                    self._write(target, sql_id, entry)
+
+    def plan_history(self, target: str, sql_id: str) -> List[dict]:
+        """Plans seen for a statement, most recently active first"""
+        plans = self.history.get((target, sql_id), {})
+        return sorted((dict(e) for e in plans.values()), key=lambda e: e["last_seen"], reverse=True)
+
+    def stats(self) -> dict:
+        return {
+            "statements": len(self.history),
+            "plans": sum(len(p) for p in self.history.values()),
+            "blobs_in_memory": len(self.blobs),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_store: Optional[PlanStore] = None
+
+
+def get_store() -> PlanStore:
+    global _store
+    if _store is None:
+        _store = PlanStore()
+    return _store
+
+
+def close_store():
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
+
+
+async def fetch_plan(agent, target: str, sql_id: str, plan_hash_value: int) -> Optional[List[dict]]:
+    """Plan lines from the cache, or from the agent (then cached for good)"""
+    store = get_store()
+    lines = store.get_plan(target, sql_id, plan_hash_value)
+    if lines is not None or agent is None:
+        return lines
+    resp = await agent.get(f"/metrics/sql/{sql_id}/plan/{plan_hash_value}")
+    if resp.status_code != 200:
+        return None
+    lines = resp.json()
+    store.put_plan(target, sql_id, plan_hash_value, lines)
+    return lines
+
+
+async def sql_details(agent, target: str, sql_id: str) -> Optional[dict]:
+    """
+    Current statistics from the agent, merged with the plan history. Only
+    plans not seen before are fetched. If the agent is unreachable or the
+    cursor has aged out, the last known state is served with `live: false`.
+    """
+    store = get_store()
+    live = False
+    try:
+        resp = await agent.get(f"/metrics/sql/{sql_id}",
+                               params={"text": "false" if store.get_text(sql_id) else "true"})
+        if resp.status_code == 200:
+            body = resp.json()
+            if body.get("sql_text"):
+                store.put_text(sql_id, body["sql_text"])
+            store.observe(target, sql_id, body["plans"])
+            live = True
+    except httpx.HTTPError as e:
+        print(f"[{target}] Agent Error (sql {sql_id}): {e}")
+
+    history = store.plan_history(target, sql_id)
+    if not history:
+        return None
+    current = history[0]
+
+    missing = [e["plan_hash_value"] for e in history if not e.get("digest")]
+    if live and missing:
+        # The current plan first; a few older ones alongside so history views stay offline
+        wanted = [current["plan_hash_value"]] + [p for p in missing if p != current["plan_hash_value"]][:PLAN_PREFETCH - 1]
+        await asyncio.gather(*[fetch_plan(agent, target, sql_id, p) for p in wanted], return_exceptions=True)
+        history = store.plan_history(target, sql_id)
+        current = history[0]
+
+    plan = store.get_plan(target, sql_id, current["plan_hash_value"]) or []
+    return {
+        "sql_id": sql_id,
+        "sql_text": store.get_text(sql_id) or "",
+        "plan_hash_value": current["plan_hash_value"],
+        "stats": current["stats"],
+        "plan": plan,
+        "plan_history": history,
+        "live": live,
+    }
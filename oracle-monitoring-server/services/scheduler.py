@@ -0,0 +1,65 @@
+"""
+Adaptive sampling intervals for the server-side collectors.
+
+Same policy as the agent's scheduler: each family has a base interval and a
+query-cost budget (share of wall time its queries may take). Faster while
+an alert is active on the target, slower while the target is under stress
+or its queries are slow, and jittered so a fleet never polls in lockstep.
+"""
+import os
+import random
+from typing import Optional
+
+SCHED_JITTER = float(os.getenv("SCHED_JITTER", "0.1"))                # +-10% per tick
+SCHED_MIN_INTERVAL = float(os.getenv("SCHED_MIN_INTERVAL", "1"))
+SCHED_MAX_INTERVAL = float(os.getenv("SCHED_MAX_INTERVAL", "300"))
+SCHED_BOOST_FACTOR = float(os.getenv("SCHED_BOOST_FACTOR", "2"))
+# How long an agent samples faster after being told an alert is active
+SCHED_BOOST_SECONDS = float(os.getenv("SCHED_BOOST_SECONDS", "300"))
+SCHED_STRESS_FACTOR = float(os.getenv("SCHED_STRESS_FACTOR", "2"))
+SCHED_STRESS_CPU = float(os.getenv("SCHED_STRESS_CPU", "90"))          # cpu_load counted as stress
+SCHED_COST_ALPHA = 0.3                                                  # EWMA weight of the latest sample
+
+
+class AdaptiveInterval:
+    def __init__(self, base: float, budget: float):
+        self.base = base
+        self.budget = budget
+        self.current = base
+        self.cost: Optional[float] = None     # smoothed sample time, seconds
+        self.boosted = False
+        self.stressed = False
+
+    def observe(self, seconds: float):
+        self.cost = seconds if self.cost is None else (1 - SCHED_COST_ALPHA) * self.cost + SCHED_COST_ALPHA * seconds
+
+    def next(self, stressed: bool = False, boosted: bool = False) -> float:
+        """Interval until the next sample, before jitter"""
+        self.stressed, self.boosted = stressed, boosted
+        if boosted:
+            interval = self.base / SCHED_BOOST_FACTOR
+        elif stressed:
+            interval = self.base * SCHED_STRESS_FACTOR
+        else:
+            interval = self.base
+        if self.cost is not None and self.budget > 0:
+            interval = max(interval, self.cost / self.budget)
+        self.current = min(max(interval, SCHED_MIN_INTERVAL), SCHED_MAX_INTERVAL)
+        return self.current
+
+    def jittered(self, interval: float) -> float:
+        return interval * random.uniform(1 - SCHED_JITTER, 1 + SCHED_JITTER)
+
+    def status(self) -> dict:
+        return {
+            "base": self.base,
+            "interval": round(self.current, 2),
+            "budget": self.budget,
+            "cost_ms": round(self.cost * 1000, 1) if self.cost is not None else None,
+            "boosted": self.boosted,
+            "stressed": self.stressed,
+        }
+
+
+def is_stressed(metrics: Optional[dict]) -> bool:
+    return bool(metrics) and isinstance(metrics.get("cpu_load"), (int, float)) and metrics["cpu_load"] >= SCHED_STRESS_CPU
@@ -0,0 +1,321 @@
+import os
+import re
+import time
+from typing import AsyncIterator, Awaitable, Callable, List, NamedTuple, Optional, Tuple
+
+# Rows per executemany() call when consecutive INSERTs share a shape
+SCRIPT_BATCH_ROWS = int(os.getenv("SCRIPT_BATCH_ROWS", "500"))
+# Rows returned for a SELECT inside a script (only the count is reported)
+SCRIPT_MAX_ROWS = int(os.getenv("SCRIPT_MAX_ROWS", "100"))
+
+# Next token that changes lexer state outside strings/comments
+_SPECIAL = re.compile(r"--|/\*|(?<![\w$#])[nN]?[qQ]'.|'|\"|;")
+_QQUOTE_CLOSE = {"[": "]", "(": ")", "{": "}", "<": ">"}
+
+# Statements SQL*Plus sends to the PL/SQL parser: `;` is part of the body, `/` ends it
+_PLSQL_HEAD = re.compile(
+    r"\s*(DECLARE|BEGIN|CREATE\s+(OR\s+REPLACE\s+)?((NON)?EDITIONABLE\s+)?"
+    r"(FUNCTION|PROCEDURE|PACKAGE|TRIGGER|TYPE|LIBRARY|JAVA))\b",
+    re.IGNORECASE,
+)
+# Client-side SQL*Plus commands: not SQL, reported as skipped
+_SQLPLUS_CMD = re.compile(
+    r"\s*(@|(SET(?!\s+(TRANSACTION|ROLE|CONSTRAINTS?)\b)|PROMPT|REM|REMARK|SPO|SPOOL|WHENEVER|"
+    r"EXIT|QUIT|SHO|SHOW|DEF|DEFINE|UNDEF|UNDEFINE|COL|COLUMN|TTITLE|BTITLE|BREAK|COMPUTE|"
+    r"CLEAR|PAUSE|EXEC|EXECUTE|CONN|CONNECT)\b)",
+    re.IGNORECASE,
+)
+
+
+class Statement(NamedTuple):
+    text: str
+    line: int       # 1-based line where the statement starts
+    kind: str       # "sql", "plsql" or "sqlplus"
+
+
+class ScriptSplitter:
+    """
+    Incremental Oracle script splitter. Text is fed in arbitrary chunks and
+    complete statements are returned as soon as their terminator is seen, so
+    only the statement being parsed is ever held in memory.
+
+    Understands '...' and "..." quoting, q'[...]' literals, -- and /* */
+    comments, `;` terminators, and `/` on its own line ending PL/SQL blocks
+    (DECLARE/BEGIN/CREATE PROCEDURE|FUNCTION|PACKAGE|TRIGGER|TYPE ...).
+    """
+
+    def __init__(self):
+        self._partial = ""          # incomplete trailing line
+        self._line_no = 0
+        self._buf: List[str] = []
+        self._head = ""             # leading code (no comments) of the current statement
+        self._start_line = 0
+        self._state = None          # None, "'", '"', "/*" or a q-quote closing sequence
+
+    def feed(self, text: str) -> List[Statement]:
+        out: List[Statement] = []
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._line(line + "\n", out)
+        return out
+
+    def finish(self) -> List[Statement]:
+        out: List[Statement] = []
+        if self._partial:
+            self._line(self._partial, out)
+            self._partial = ""
+        self._emit(out)
+        return out
+
+    # --- lexer ---
+
+    def _line(self, line: str, out: List[Statement]):
+        self._line_no += 1
+        if self._state is None:
+            stripped = line.strip()
+            if stripped == "/":
+                # Ends a PL/SQL block; after a `;`-terminated statement the buffer is empty
+                self._emit(out)
+                return
+            cmd = _SQLPLUS_CMD.match(line) if not self._head else None
+            if cmd:
+                self._buf = []
+                if cmd.group(1).upper() in ("EXEC", "EXECUTE"):
+                    # EXEC proc(...) is SQL*Plus shorthand for an anonymous block
+                    call = stripped[len(cmd.group(1)):].strip().rstrip(";")
+                    out.append(Statement(f"BEGIN {call}; END;", self._line_no, "plsql"))
+                else:
+                    out.append(Statement(stripped, self._line_no, "sqlplus"))
+                return
+
+        pos = 0
+        while pos < len(line):
+            if self._state is None:
+                m = _SPECIAL.search(line, pos)
+                if m is None:
+                    self._code(line[pos:])
+                    return
+                self._code(line[pos:m.start()])
+                tok = m.group()
+                if tok == "--":
+                    self._buf.append(line[m.start():])
+                    return
+                if tok == ";" and not self._is_plsql():
+                    self._emit(out)
+                    pos = m.end()
+                    continue
+                self._code(tok)
+                if tok == "/*":
+                    self._state = "/*"
+                elif tok in ("'", '"'):
+                    self._state = tok
+                elif tok != ";":
+                    delim = tok[-1]
+                    self._state = _QQUOTE_CLOSE.get(delim, delim) + "'"
+                pos = m.end()
+            else:
+                closing = "*/" if self._state == "/*" else self._state
+                end = line.find(closing, pos)
+                if end < 0:
+                    self._buf.append(line[pos:])
+                    return
+                end += len(closing)
+                if self._state == "'" and line.startswith("'", end):
+                    # '' is an escaped quote inside a literal
+                    self._buf.append(line[pos:end + 1])
+                    pos = end + 1
+                    continue
+                self._buf.append(line[pos:end])
+                self._state = None
+                pos = end
+
+    def _code(self, text: str):
+        if not text:
+            return
+        self._buf.append(text)
+        if not self._head:
+            text = text.lstrip()
+            if not text:
+                return
+            self._start_line = self._line_no
+        if len(self._head) < 200:
+            self._head += text
+
+    def _is_plsql(self) -> bool:
+        return bool(_PLSQL_HEAD.match(self._head))
+
+    def _emit(self, out: List[Statement]):
+        if self._head:
+            text = "".join(self._buf).strip()
+            out.append(Statement(text, self._start_line, "plsql" if self._is_plsql() else "sql"))
+        self._buf = []
+        self._head = ""
+
+
+# --- INSERT batching ---
+
+_INSERT = re.compile(
+    r"\s*INSERT\s+INTO\s+([\w$#.\"]+)\s*(\([^()]*\))?\s*VALUES\s*\((.*)\)\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+_LITERAL = re.compile(
+    r"\s*(?:'((?:[^']|'')*)'|([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)|(NULL))\s*(,|$)",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def insert_shape(sql: str) -> Optional[Tuple[str, List[Optional[str]], List[Optional[str]]]]:
+    """
+    For `INSERT INTO t [(cols)] VALUES (<literals>)` return (template with
+    :1..:n binds, values as text, kinds "s"/"n"/None for NULL); None otherwise.
+    """
+    m = _INSERT.match(sql)
+    if not m:
+        return None
+    table, cols, values_text = m.groups()
+    values: List[Optional[str]] = []
+    kinds: List[Optional[str]] = []
+    pos = 0
+    while pos < len(values_text):
+        lit = _LITERAL.match(values_text, pos)
+        if lit is None:
+            return None
+        string, number, null, sep = lit.groups()
+        if string is not None:
+            values.append(string.replace("''", "'"))
+            kinds.append("s")
+        elif number is not None:
+            values.append(number)
+            kinds.append("n")
+        else:
+            values.append(None)
+            kinds.append(None)
+        pos = lit.end()
+        if not sep:
+            break
+    if pos < len(values_text) or not values:
+        return None
+    binds = ", ".join(f":{i + 1}" for i in range(len(values)))
+    template = f"INSERT INTO {table}{' ' + cols if cols else ''} VALUES ({binds})"
+    return template, values, kinds
+
+
+class InsertBatch:
+    """Consecutive INSERTs sharing a template and column kinds (NULL fits any kind)"""
+
+    def __init__(self, template: str, kinds: List[Optional[str]], statement: Statement, index: int):
+        self.template = template
+        self.kinds = list(kinds)
+        self.rows: List[List[Optional[str]]] = []
+        self.first_text = statement.text
+        self.line = statement.line
+        self.index = index
+
+    def accepts(self, template: str, kinds: List[Optional[str]]) -> bool:
+        if template != self.template or len(self.rows) >= SCRIPT_BATCH_ROWS:
+            return False
+        return all(a is None or b is None or a == b for a, b in zip(self.kinds, kinds))
+
+    def add(self, values: List[Optional[str]], kinds: List[Optional[str]]):
+        self.rows.append(values)
+        self.kinds = [a or b for a, b in zip(self.kinds, kinds)]
+
+
+Execute = Callable[[str], Awaitable[dict]]
+ExecuteMany = Callable[[str, List[List[Optional[str]]], List[Optional[str]]], Awaitable[dict]]
+
+
+async def _statements(chunks: AsyncIterator[str]) -> AsyncIterator[Statement]:
+    splitter = ScriptSplitter()
+    async for chunk in chunks:
+        for stmt in splitter.feed(chunk):
+            yield stmt
+    for stmt in splitter.finish():
+        yield stmt
+
+
+async def run_script(chunks: AsyncIterator[str], execute: Execute, execute_many: ExecuteMany,
+                     stop_on_error: bool = True) -> AsyncIterator[dict]:
+    """
+    Split a script as it streams in and run each statement as soon as it is
+    complete, yielding one progress message per statement (or INSERT batch)
+    and a final "end" summary.
+    """
+    started = time.perf_counter()
+    totals = {"statements": 0, "batches": 0, "skipped": 0, "errors": 0}
+    batch: Optional[InsertBatch] = None
+
+    async def flush_batch() -> dict:
+        nonlocal batch
+        current, batch = batch, None
+        t0 = time.perf_counter()
+        if len(current.rows) == 1:
+            # A lone INSERT runs as written rather than through executemany
+            return _progress("statement", current.index, current.line, await execute(current.first_text), t0)
+        totals["batches"] += 1
+        result = await execute_many(current.template, current.rows, current.kinds)
+        return _progress("batch", current.index, current.line, result, t0, statements=len(current.rows))
+
+    def failed(msg: dict) -> bool:
+        if msg["status"] != "error":
+            return False
+        totals["errors"] += 1
+        return stop_on_error
+
+    stopped = False
+    async for stmt in _statements(chunks):
+        if stmt.kind == "sqlplus":
+            totals["skipped"] += 1
+            yield {"type": "skipped", "line": stmt.line, "command": stmt.text[:200]}
+            continue
+        totals["statements"] += 1
+        shape = insert_shape(stmt.text) if stmt.kind == "sql" else None
+        if batch is not None and (shape is None or not batch.accepts(shape[0], shape[2])):
+            msg = await flush_batch()
+            yield msg
+            if failed(msg):
+                stopped = True
+                break
+        if shape is not None:
+            template, values, kinds = shape
+            if batch is None:
+                batch = InsertBatch(template, kinds, stmt, totals["statements"])
+            batch.add(values, kinds)
+            continue
+        t0 = time.perf_counter()
+        msg = _progress("statement", totals["statements"], stmt.line, await execute(stmt.text), t0)
+        yield msg
+        if failed(msg):
+            stopped = True
+            break
+
+    if batch is not None and not stopped:
+        msg = await flush_batch()
+        failed(msg)
+        yield msg
+
+    yield {
+        "type": "end",
+        "status": "error" if totals["errors"] else "success",
+        "stopped": stopped,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        **totals,
+    }
+
+
+def _progress(kind: str, index: int, line: int, result: dict, t0: float, **extra) -> dict:
+    msg = {
+        "type": kind,
+        "index": index,
+        "line": line,
+        "status": result.get("status", "success"),
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+        **extra,
+    }
+    for key in ("message", "row_count", "row_offset"):
+        if result.get(key) is not None:
+            msg[key] = result[key]
+    if "rows" in result and "row_count" not in msg:
+        msg["row_count"] = len(result["rows"])
+    return msg
@@ -0,0 +1,171 @@
+"""
+Dashboard WebSocket protocol.
+
+v1 (default, what the bundled client speaks): the full metrics dict as a JSON
+text frame every tick.
+
+v2, opted into with query parameters:
+
+    /api/dashboard/ws?v=2&groups=system,waits&format=msgpack
+
+    groups  comma-separated subset of GROUPS (default: all)
+    format  json (text frames, default) or msgpack (binary frames)
+
+The first frame is a snapshot of the subscribed fields, every later frame a
+delta against the previous one:
+
+    {"v": 2, "type": "snapshot", "seq": 41, "data": {...}}
+    {"v": 2, "type": "delta", "seq": 42, "base": 41,
+     "set": {"/cpu_load": 37.2, "/wait_events/0/value": 12}, "del": []}
+
+`set` and `del` are keyed by JSON Pointer. A delta only applies to the state
+at `base`; when a slow client has frames dropped the server sends a fresh
+snapshot instead, and a client can ask for one any time with a
+{"type": "resync"} text message. permessage-deflate is negotiated by uvicorn's
+WebSocket implementation when the client offers it.
+
+Frames are built once per tick and (groups, format) and shared by every
+subscriber on that combination.
+"""
+import json
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from core.serialization import dumps_str
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+VERSION = 2
+
+GROUPS = {
+    "system": ("cpu_load", "memory_usage", "disk_io", "health_status"),
+    "sessions": ("active_sessions",),
+    "top_sql": ("top_sql",),
+    "waits": ("wait_events",),
+}
+# Fields not listed in GROUPS belong here; `timestamp` goes to every subscriber
+DEFAULT_GROUP = "system"
+ALWAYS = ("timestamp",)
+FORMATS = ("json", "msgpack")
+
+_KEY_GROUP = {key: group for group, keys in GROUPS.items() for key in keys}
+
+_MISSING = object()
+
+
+def parse_groups(text: Optional[str]) -> Optional[FrozenSet[str]]:
+    """`None` means every group"""
+    if not text:
+        return None
+    groups = frozenset(g.strip() for g in text.split(",") if g.strip())
+    unknown = groups - set(GROUPS)
+    if unknown:
+        raise ValueError(f"Unknown metric groups: {', '.join(sorted(unknown))} (known: {', '.join(GROUPS)})")
+    return groups
+
+
+def _wanted(key: str, groups: Optional[FrozenSet[str]]) -> bool:
+    return groups is None or key in ALWAYS or _KEY_GROUP.get(key, DEFAULT_GROUP) in groups
+
+
+def _ptr(*parts) -> str:
+    return "".join("/" + str(p).replace("~", "~0").replace("/", "~1") for p in parts)
+
+
+def diff(prev: dict, cur: dict) -> Tuple[Dict[str, dict], List[str]]:
+    """
+    Changes from `prev` to `cur` as ({top-level key: {pointer: value}}, [deleted keys]).
+    Lists of dicts with the same length (top_sql, wait_events) are diffed per
+    item and field, so static parts such as colors are never resent.
+    """
+    changes: Dict[str, dict] = {}
+    for key, value in cur.items():
+        old = prev.get(key, _MISSING)
+        if old == value:
+            continue
+        if isinstance(value, list) and isinstance(old, list) and len(value) == len(old):
+            patch = {}
+            for i, (a, b) in enumerate(zip(old, value)):
+                if a == b:
+                    continue
+                if isinstance(a, dict) and isinstance(b, dict) and a.keys() == b.keys():
+                    for field, v in b.items():
+                        if a[field] != v:
+                            patch[_ptr(key, i, field)] = v
+                else:
+                    patch[_ptr(key, i)] = b
+            changes[key] = patch
+        else:
+            changes[key] = {_ptr(key): value}
+    deleted = [key for key in prev if key not in cur]
+    return changes, deleted
+
+
+def encode(message: dict, fmt: str):
+    if fmt == "msgpack":
+        return msgpack.packb(message, use_bin_type=True)
+    return dumps_str(message)
+
+
+def decode_control(text: Optional[str], data: Optional[bytes], fmt: str) -> Optional[dict]:
+    """Client -> server control message from a text or binary frame; None if it isn't one"""
+    try:
+        if text is not None:
+            message = json.loads(text)
+        elif data is not None and fmt == "msgpack":
+            message = msgpack.unpackb(data, raw=False)
+        elif data is not None:
+            message = json.loads(data)
+        else:
+            return None
+    except Exception:
+        return None
+    return message if isinstance(message, dict) else None
+
+
+class TickFrames:
+    """
+    Every frame one tick can produce. Each frame is built on first use and
+    cached, so N subscribers on the same (groups, format) cost one encode.
+    Only the previous tick's data is kept, never the previous TickFrames.
+    """
+
+    def __init__(self, seq: int, data: dict, prev_data: Optional[dict] = None):
+        self.seq = seq
+        self.data = data
+        self._prev_data = prev_data
+        self._changes = None
+        self._legacy: Optional[str] = None
+        self._frames: Dict[tuple, object] = {}
+
+    def legacy(self) -> str:
+        if self._legacy is None:
+            self._legacy = dumps_str(self.data)
+        return self._legacy
+
+    def snapshot(self, groups: Optional[FrozenSet[str]], fmt: str):
+        key = ("snapshot", groups, fmt)
+        if key not in self._frames:
+            data = {k: v for k, v in self.data.items() if _wanted(k, groups)}
+            self._frames[key] = encode({"v": VERSION, "type": "snapshot", "seq": self.seq, "data": data}, fmt)
+        return self._frames[key]
+
+    def delta(self, groups: Optional[FrozenSet[str]], fmt: str):
+        if self._prev_data is None:
+            return self.snapshot(groups, fmt)
+        key = ("delta", groups, fmt)
+        if key not in self._frames:
+            if self._changes is None:
+                self._changes = diff(self._prev_data, self.data)
+            changes, deleted = self._changes
+            patch = {}
+            for k, p in changes.items():
+                if _wanted(k, groups):
+                    patch.update(p)
+            self._frames[key] = encode({
+                "v": VERSION, "type": "delta", "seq": self.seq, "base": self.seq - 1,
+                "set": patch, "del": [_ptr(k) for k in deleted if _wanted(k, groups)],
+            }, fmt)
+        return self._frames[key]
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# Modules are imported as in main.py (`from core import ...`), from the server directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep on-disk state (time series, alert history, plan cache) out of the source tree
+_tmp = tempfile.mkdtemp(prefix="oms-tests-")
+os.environ.setdefault("TSDB_DIR", os.path.join(_tmp, "tsdb"))
+os.environ.setdefault("ALERT_HISTORY_FILE", os.path.join(_tmp, "alerts.jsonl"))
+os.environ.setdefault("PLAN_CACHE_DIR", os.path.join(_tmp, "plans"))
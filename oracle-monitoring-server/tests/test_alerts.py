@@ -0,0 +1,117 @@
+from services.alerts import AlertEngine, AlertHistory, Rule, blocking_values, sample_values
+
+
+def engine(*rules):
+    return AlertEngine(list(rules), AlertHistory(path=None))
+
+
+def feed(eng, metric, values, target="db1", start=0.0, step=10.0):
+    fired = []
+    for i, value in enumerate(values):
+        fired += eng.evaluate(target, {metric: value}, ts=start + i * step)
+    return fired
+
+
+def test_threshold_fires_after_for_samples_once():
+    eng = engine(Rule("cpu", "cpu_load", levels={"WARNING": 80}, for_samples=3))
+    assert feed(eng, "cpu_load", [90, 90]) == []
+    assert not eng.has_active("db1")
+    fired = feed(eng, "cpu_load", [90, 95, 99], start=20)
+    assert [a["severity"] for a in fired] == ["WARNING"]
+    assert eng.has_active("db1") and not eng.has_active("db2")
+    assert [a["rule"] for a in eng.active("db1")] == ["cpu"]
+
+
+def test_breach_streak_resets_on_a_clear_sample():
+    eng = engine(Rule("cpu", "cpu_load", levels={"WARNING": 80}, for_samples=2))
+    assert feed(eng, "cpu_load", [90, 50, 90, 50]) == []
+    assert len(feed(eng, "cpu_load", [90, 90], start=40)) == 1
+
+
+def test_escalation_supersedes_the_lower_alert():
+    eng = engine(Rule("cpu", "cpu_load", levels={"WARNING": 80, "CRITICAL": 95}))
+    first, second = feed(eng, "cpu_load", [85, 99])
+    assert (first["severity"], second["severity"]) == ("WARNING", "CRITICAL")
+    assert eng.history.get(first["id"])["state"] == "RESOLVED"
+    assert [a["id"] for a in eng.active()] == [second["id"]]
+    # Falling back to WARNING neither de-escalates nor fires again
+    assert feed(eng, "cpu_load", [85], start=20) == []
+
+
+def test_hysteresis_and_clear_samples_delay_resolve():
+    eng = engine(Rule("cpu", "cpu_load", levels={"WARNING": 80}, hysteresis=10, clear_samples=2))
+    (alert,) = feed(eng, "cpu_load", [90])
+    # 75 is below the threshold but inside the hysteresis band: still firing
+    feed(eng, "cpu_load", [75, 75, 60], start=10)
+    assert eng.history.get(alert["id"])["state"] == "FIRING"
+    feed(eng, "cpu_load", [60], start=40)
+    assert eng.history.get(alert["id"])["state"] == "RESOLVED"
+    assert eng.history.get(alert["id"])["resolved_at"] == 40
+    assert not eng.has_active("db1") and eng.active() == []
+
+
+def test_below_operator():
+    eng = engine(Rule("hit", "hit_ratio", op="<", levels={"WARNING": 90}))
+    assert feed(eng, "hit_ratio", [95]) == []
+    assert len(feed(eng, "hit_ratio", [85], start=10)) == 1
+
+
+def test_rate_rule_uses_the_window():
+    eng = engine(Rule("spike", "cpu_load", type="rate", window=3, per=60, levels={"WARNING": 30}))
+    # +10 per 10 s = 60 per minute, measured over the oldest sample in the ring
+    assert feed(eng, "cpu_load", [10]) == []
+    assert len(feed(eng, "cpu_load", [20], start=10)) == 1
+
+
+def test_anomaly_waits_for_min_samples():
+    eng = engine(Rule("anom", "active_sessions", type="anomaly", min_samples=10, alpha=0.2,
+                      levels={"WARNING": 3}))
+    baseline = [10, 11, 9, 10, 12, 10, 9, 11, 10, 10, 11, 9]
+    assert feed(eng, "active_sessions", baseline) == []
+    assert len(feed(eng, "active_sessions", [40], start=1000)) == 1
+
+
+def test_wildcard_rules_keep_state_per_metric():
+    eng = engine(Rule("waits", "wait/*", levels={"WARNING": 5}))
+    eng.evaluate("db1", {"wait/User I/O": 9, "wait/Commit": 1}, ts=0)
+    assert [a["metric"] for a in eng.active()] == ["wait/User I/O"]
+    eng.evaluate("db1", {"wait/User I/O": 1, "wait/Commit": 9}, ts=10)
+    assert [a["metric"] for a in eng.active()] == ["wait/Commit"]
+
+
+def test_has_active_counts_per_target():
+    eng = engine(Rule("cpu", "cpu_load", levels={"WARNING": 80}), Rule("mem", "memory_usage", levels={"WARNING": 80}))
+    eng.evaluate("db1", {"cpu_load": 90, "memory_usage": 90}, ts=0)
+    eng.evaluate("db2", {"cpu_load": 90}, ts=0)
+    eng.evaluate("db1", {"cpu_load": 10}, ts=10)
+    assert eng.has_active("db1") and eng.has_active("db2")
+    eng.evaluate("db1", {"memory_usage": 10}, ts=20)
+    assert not eng.has_active("db1") and eng.has_active("db2")
+    # Replacing the rules drops every state, and the counts with it
+    eng.set_rules(eng.rules)
+    assert not eng.has_active("db2")
+
+
+def test_sample_and_blocking_values():
+    sample = {"cpu_load": 12.5, "memory_usage": None, "wait_events": [{"name": "Commit", "value": 3}]}
+    assert sample_values(sample) == {"cpu_load": 12.5, "wait/Commit": 3}
+    assert blocking_values({"blocked_sessions": 2, "roots": []}) == {"blocking/blocked_sessions": 2}
+
+
+def test_replayed_alert_keeps_its_firing_time():
+    history = AlertHistory(path=None, max_entries=10)
+    for ts in (100, 200, 300):
+        history.add({"ts": ts, "severity": "WARNING", "source": "db", "target": "db1", "state": "FIRING"})
+    replayed = history.add({"ts": 150, "severity": "CRITICAL", "source": "db", "target": "db1", "state": "FIRING"})
+    assert history.get(replayed["id"])["ts"] == 150
+    items, _ = history.query(start=140, end=160)
+    assert [a["id"] for a in items] == [replayed["id"]]
+    items, _ = history.query(start=150, end=300)
+    assert [a["ts"] for a in items] == [150, 300, 200]   # newest id first
+    page, before = history.query(limit=2)
+    rest, _ = history.query(limit=2, before_id=before)
+    assert [a["ts"] for a in page + rest] == [150, 300, 200, 100]
+    for i in range(10):
+        history.add({"ts": 400 + i, "severity": "WARNING", "source": "db", "target": "db1", "state": "FIRING"})
+    assert history.query(start=0, end=350) == ([], None)
+    assert len(history.times) == len(history.entries)
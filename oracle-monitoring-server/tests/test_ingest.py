@@ -0,0 +1,149 @@
+import gzip
+import json
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core.targets import Target, register_target, remove_target
+from routers import dashboard, ingest as ingest_router
+from services import ingest
+from services.broadcaster import remove_broadcaster
+
+app = FastAPI()
+app.include_router(ingest_router.router)
+app.include_router(dashboard.router)
+client = TestClient(app)
+
+
+@pytest.fixture
+def target():
+    register_target(Target(id="pushed", mock=True, push=True))
+    yield "pushed"
+    remove_broadcaster("pushed")
+    remove_target("pushed")
+
+
+_seq = iter(range(1, 1_000_000))
+
+
+def batch(*samples, agent="agent-1"):
+    return {"agent_id": agent, "epoch": 1, "seq": next(_seq), "target": "pushed", "samples": list(samples)}
+
+
+def post(body, **headers):
+    return client.post("/api/ingest/batch", content=json.dumps(body),
+                       headers={"Content-Type": "application/json", **headers})
+
+
+def session_sample(ts=None, **data):
+    return {"kind": "session_metrics", "ts": ts or time.time(),
+            "data": {"cpu_load": 12.5, "active_sessions": 4, "disk_io": 1.0, **data}}
+
+
+@pytest.mark.parametrize("sample, field", [
+    ({"kind": "session_metrics", "data": {}}, "samples.0.ts"),
+    ({"kind": "session_metrics", "ts": "noon", "data": {}}, "samples.0.ts"),
+    ({"kind": "session_metrics", "ts": 1.0}, "samples.0.data"),
+    ({"kind": "session_metrics", "ts": 1.0, "data": [{}]}, "samples.0.data"),
+    ({"kind": "top_sql", "ts": 1.0, "data": {"sql_id": "a"}}, "samples.0.data"),
+    ({"kind": "ash", "ts": 1.0, "data": {"CPU": "lots"}}, "samples.0.data.CPU"),
+    ({"kind": "session_metrics", "ts": 1.0, "data": {"cpu_load": "high", "active_sessions": 1, "disk_io": 0}},
+     "samples.0.data.cpu_load"),
+    ({"kind": "top_sql", "ts": 1.0, "data": [{"sql_id": "a", "cpu_time": 1, "executions": 1}]},
+     "samples.0.data.0.elapsed_time"),
+    ({"kind": "top_sql", "ts": 1.0, "data": [], "groups": {"fingerprint": [{"key": "k"}]}},
+     "samples.0.groups.fingerprint.0.sql_ids"),
+    ({"kind": "blocking", "ts": 1.0, "data": {"blocked_sessions": "many"}}, "samples.0.data.blocked_sessions"),
+])
+def test_malformed_samples_are_rejected_with_422(target, sample, field):
+    response = post(batch(sample))
+    assert response.status_code == 422
+    assert field in response.json()["detail"]
+
+
+def test_malformed_batches():
+    assert post({"agent_id": "a", "epoch": 1}).status_code == 422
+    response = client.post("/api/ingest/batch", content=b"{not json", headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+    response = client.post("/api/ingest/batch", content=b"x", headers={"Content-Type": "text/plain"})
+    assert response.status_code == 415
+    response = client.post("/api/ingest/batch", content=b"x", headers={"Content-Type": "application/json",
+                                                                       "Content-Encoding": "gzip"})
+    assert response.status_code == 400
+
+
+def test_nothing_is_applied_from_a_rejected_batch(target):
+    response = post(batch(session_sample(), {"kind": "ash", "ts": 1.0, "data": {"CPU": None}}))
+    assert response.status_code == 422
+    assert client.get("/api/dashboard/metrics", params={"target": target}).status_code == 404
+
+
+def test_push_target_metrics(target):
+    assert client.get("/api/dashboard/metrics", params={"target": target}).status_code == 404
+    now = time.time()
+    response = post(batch(
+        session_sample(now),
+        {"kind": "ash", "ts": now, "data": {"CPU": 1.5, "User I/O": 2.25}},
+        {"kind": "top_sql", "ts": now, "data": [
+            {"sql_id": "abc", "elapsed_time": 2_000_000, "cpu_time": 1_000_000, "executions": 3}]},
+    ))
+    assert response.status_code == 200 and response.json()["ack"] > 0
+    metrics = client.get("/api/dashboard/metrics", params={"target": target}).json()
+    assert metrics["cpu_load"] == 12.5 and metrics["active_sessions"] == 4
+    assert metrics["memory_usage"] is None
+    assert [w["name"] for w in metrics["wait_events"]] == ["User I/O", "CPU"]
+    assert metrics["top_sql"][0]["sql_id"] == "abc" and metrics["top_sql"][0]["elapsed_time"] == 2.0
+
+
+def test_duplicate_batches_are_acked_not_reapplied(target):
+    body = batch(session_sample())
+    first = post(body).json()
+    again = post(body).json()
+    assert first["ack"] == again["ack"] == body["seq"]
+    assert (first["duplicate"], again["duplicate"]) == (False, True)
+
+
+def test_gzip_body(target):
+    body = gzip.compress(json.dumps(batch(session_sample())).encode())
+    response = client.post("/api/ingest/batch", content=body,
+                           headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+    assert response.status_code == 200
+
+
+def test_token(target, monkeypatch):
+    monkeypatch.setattr(ingest, "INGEST_TOKEN", "s3cret")
+    assert post(batch(session_sample())).status_code == 401
+    assert post(batch(session_sample()), **{"X-Ingest-Token": "wrong"}).status_code == 401
+    assert post(batch(session_sample()), **{"X-Ingest-Token": "s3cret"}).status_code == 200
+
+
+def test_unknown_target_needs_auto_register_and_token(monkeypatch):
+    body = {**batch(session_sample()), "target": "stranger"}
+    monkeypatch.setattr(ingest, "INGEST_AUTO_REGISTER", True)
+    assert post(body).status_code == 404
+    monkeypatch.setattr(ingest, "INGEST_TOKEN", "s3cret")
+    try:
+        assert post(body, **{"X-Ingest-Token": "s3cret"}).status_code == 200
+    finally:
+        remove_broadcaster("stranger")
+        remove_target("stranger")
+
+
+def test_poison_top_sql_row_is_rejected_not_a_server_error(target):
+    # Used to pass validation and raise KeyError while building the dashboard: a 500 the agent retried forever
+    now = time.time()
+    response = post(batch(
+        {"kind": "top_sql", "ts": now, "data": [{"sql_id": "abc", "cpu_time": 1, "executions": 1}]},
+        session_sample(now),
+    ))
+    assert response.status_code == 422
+
+
+def test_blocking_summary_keeps_the_last_trees(target):
+    now = time.time()
+    tree = {"blocked_sessions": 1, "roots": [{"sid": 1, "children": []}]}
+    assert post(batch({"kind": "blocking", "ts": now, "data": tree})).status_code == 200
+    assert post(batch({"kind": "blocking", "ts": now + 1, "data": {"blocked_sessions": 1}})).status_code == 200
+    assert ingest.pushed_blocking(target)["roots"] == tree["roots"]
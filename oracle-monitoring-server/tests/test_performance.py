@@ -0,0 +1,43 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core import tsdb
+from core.targets import Target, register_target, remove_target
+from routers import performance
+
+app = FastAPI()
+app.include_router(performance.router)
+client = TestClient(app)
+
+WAIT_CLASSES = ("CPU", "User I/O", "Commit")
+
+
+@pytest.fixture
+def target():
+    register_target(Target(id="ash-test", mock=True))
+    yield "ash-test"
+    remove_target("ash-test")
+
+
+def test_ash_default_window_serves_fractional_rollups(target):
+    store = tsdb.get_store()
+    now = time.time()
+    start = now - 25 * 60
+    # 1, 2, 1, 2 ... every 2 s: each 10 s bucket averages to a fraction
+    for i in range(int((now - start) / 2)):
+        for wait_class in WAIT_CLASSES:
+            store.append(f"{target}/ash/{wait_class}", 1 + i % 2, start + i * 2)
+
+    series = store.list_series(f"{target}/ash/")
+    max_points = tsdb.TSDB_MAX_POINTS // len(series)
+    assert store.pick_resolution(now - 30 * 60, now, max_points) == "10s"
+
+    response = client.get("/api/performance/ash", params={"target": target})
+    assert response.status_code == 200
+    rows = response.json()
+    assert {r["wait_class"] for r in rows} == set(WAIT_CLASSES)
+    assert any(r["active_sessions"] != int(r["active_sessions"]) for r in rows)
+    assert all(1 <= r["active_sessions"] <= 2 for r in rows)
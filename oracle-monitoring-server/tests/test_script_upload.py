@@ -0,0 +1,106 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core.targets import Target, register_target, remove_target
+from routers import editor
+
+app = FastAPI()
+app.include_router(editor.router)
+client = TestClient(app)
+
+SCRIPT = """ALTER SESSION SET CURRENT_SCHEMA = app;
+INSERT INTO t (id) VALUES (1);
+INSERT INTO t (id) VALUES (2);
+UPDATE t SET id = 3 WHERE id = 2;
+"""
+
+
+class Response:
+    def __init__(self, body, status_code=200):
+        self.status_code = status_code
+        self._body = body
+        self.text = json.dumps(body)
+
+    def json(self):
+        return self._body
+
+
+class FakeAgent:
+    """Records which session each statement ran on and how the session ended"""
+
+    def __init__(self, fail_on=None, commit_error=None):
+        self.fail_on = fail_on
+        self.commit_error = commit_error
+        self.calls = []
+        self.closed = []
+
+    async def post(self, path, json=None, **kwargs):
+        if path == "/sessions":
+            return Response({"status": "success", "session_id": "s1"})
+        self.calls.append((path, json["session_id"]))
+        if self.fail_on and self.fail_on in json["sql"]:
+            return Response({"status": "error", "message": "ORA-00942: table or view does not exist"})
+        return Response({"status": "success", "row_count": 1})
+
+    async def request(self, method, path, params=None, **kwargs):
+        commit = params["commit"] == "true"
+        self.closed.append((path, commit))
+        if commit and self.commit_error:
+            return Response({"status": "error", "committed": False, "message": self.commit_error})
+        return Response({"status": "success", "committed": commit})
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    register_target(Target(id="scripted", mock=False))
+    fake = FakeAgent()
+    monkeypatch.setattr(editor, "get_agent_client", lambda target: fake)
+    yield fake
+    remove_target("scripted")
+
+
+def upload(on_error="stop"):
+    response = client.post("/api/editor/upload", params={"target": "scripted", "stream": "true", "on_error": on_error},
+                           files={"file": ("script.sql", SCRIPT.encode())})
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_whole_script_runs_on_one_session_and_commits_at_the_end(agent):
+    messages = upload()
+    assert {session for _, session in agent.calls} == {"s1"}
+    assert [path for path, _ in agent.calls] == ["/execute", "/execute-many", "/execute"]
+    assert agent.closed == [("/sessions/s1", True)]
+    assert messages[-1]["status"] == "success" and messages[-1]["committed"] is True
+
+
+def test_stopping_on_an_error_rolls_back(agent):
+    agent.fail_on = "UPDATE"
+    end = upload()[-1]
+    assert end["stopped"] and end["committed"] is False
+    assert agent.closed == [("/sessions/s1", False)]
+
+
+def test_continuing_past_errors_commits_like_sqlplus(agent):
+    agent.fail_on = "UPDATE"
+    end = upload(on_error="continue")[-1]
+    assert end["errors"] == 1 and end["committed"] is True
+    assert agent.closed == [("/sessions/s1", True)]
+
+
+def test_failed_final_commit_is_an_error(agent):
+    agent.commit_error = "ORA-02091: transaction rolled back"
+    end = upload()[-1]
+    assert end["status"] == "error" and end["committed"] is False
+    assert "ORA-02091" in end["message"]
+
+
+def test_unreadable_upload_rolls_back(agent):
+    response = client.post("/api/editor/upload", params={"target": "scripted", "stream": "true"},
+                           files={"file": ("script.sql", b"SELECT 1 FROM dual;\n\xff\xfe")})
+    end = [json.loads(line) for line in response.text.splitlines()][-1]
+    assert end["status"] == "error" and end["committed"] is False
+    assert agent.closed == [("/sessions/s1", False)]
@@ -0,0 +1,128 @@
+import asyncio
+
+from services.sqlscript import ScriptSplitter, insert_shape, run_script
+
+
+def split(text, chunk=None):
+    splitter = ScriptSplitter()
+    out = []
+    if chunk is None:
+        out += splitter.feed(text)
+    else:
+        for i in range(0, len(text), chunk):
+            out += splitter.feed(text[i:i + chunk])
+    return out + splitter.finish()
+
+
+def test_semicolons_and_line_numbers():
+    stmts = split("select 1 from dual;\n\nselect 2\nfrom dual;\n")
+    assert [(s.text, s.line, s.kind) for s in stmts] == [
+        ("select 1 from dual", 1, "sql"),
+        ("select 2\nfrom dual", 3, "sql"),
+    ]
+
+
+def test_semicolons_inside_literals_and_comments():
+    stmts = split("select 'a;b', \"x;y\" from t -- c;d\n;\n/* e; f */ select 1 from dual;")
+    assert len(stmts) == 2
+    assert stmts[0].text.startswith("select 'a;b', \"x;y\"")
+    assert stmts[1].text == "/* e; f */ select 1 from dual"
+
+
+def test_escaped_quote():
+    stmts = split("insert into t values ('it''s; fine');\nselect 1 from dual;")
+    assert [s.text for s in stmts] == ["insert into t values ('it''s; fine')", "select 1 from dual"]
+
+
+def test_q_quotes():
+    stmts = split("select q'[a;']b]' from dual;\nselect Q'{x;}' , nq'<y;>' from dual;\nselect q'!z;!' from dual;")
+    assert [s.text for s in stmts] == [
+        "select q'[a;']b]' from dual",
+        "select Q'{x;}' , nq'<y;>' from dual",
+        "select q'!z;!' from dual",
+    ]
+
+
+def test_identifier_ending_in_q_is_not_a_q_quote():
+    stmts = split("select seq'x;' from dual;")
+    assert [s.text for s in stmts] == ["select seq'x;' from dual"]
+
+
+def test_plsql_block_ends_at_slash():
+    script = (
+        "create or replace procedure p as\n"
+        "begin\n"
+        "  null;\n"
+        "end;\n"
+        "/\n"
+        "begin p; end;\n"
+        "/\n"
+        "select 1 from dual;\n"
+    )
+    stmts = split(script)
+    assert [(s.kind, s.line) for s in stmts] == [("plsql", 1), ("plsql", 6), ("sql", 8)]
+    assert stmts[0].text.endswith("end;")
+
+
+def test_slash_after_sql_statement_is_not_repeated():
+    stmts = split("select 1 from dual;\n/\n")
+    assert len(stmts) == 1
+
+
+def test_sqlplus_commands_and_exec():
+    stmts = split("set serveroutput on\nexec dbms_lock.sleep(1);\nprompt hi\nselect 1 from dual;")
+    assert [(s.kind, s.text) for s in stmts] == [
+        ("sqlplus", "set serveroutput on"),
+        ("plsql", "BEGIN dbms_lock.sleep(1); END;"),
+        ("sqlplus", "prompt hi"),
+        ("sql", "select 1 from dual"),
+    ]
+
+
+def test_set_transaction_is_sql():
+    assert split("set transaction read only;")[0].kind == "sql"
+
+
+def test_chunk_boundaries_do_not_matter():
+    script = "select 'a;\nb' from dual;\nbegin\n  x := q'[;]';\nend;\n/\n-- tail\nselect 2 from dual"
+    whole = split(script)
+    for size in (1, 2, 3, 7):
+        assert split(script, size) == whole
+    assert [s.kind for s in whole] == ["sql", "plsql", "sql"]
+
+
+def test_unterminated_statement_is_emitted_at_finish():
+    assert [s.text for s in split("select 1 from dual")] == ["select 1 from dual"]
+
+
+def test_insert_shape():
+    template, values, kinds = insert_shape("INSERT INTO t (a, b, c) VALUES ('x''y', -1.5e3, NULL)")
+    assert template == "INSERT INTO t (a, b, c) VALUES (:1, :2, :3)"
+    assert values == ["x'y", "-1.5e3", None]
+    assert kinds == ["s", "n", None]
+    assert insert_shape("INSERT INTO t VALUES (sysdate)") is None
+    assert insert_shape("INSERT INTO t SELECT * FROM u") is None
+
+
+def test_run_script_batches_inserts():
+    script = "".join(f"insert into t values ({i}, 'v{i}');\n" for i in range(5)) + "select 1 from dual;\n"
+    single, many = [], []
+
+    async def chunks():
+        yield script
+
+    async def execute(sql):
+        single.append(sql)
+        return {"status": "success", "row_count": 1}
+
+    async def execute_many(sql, rows, types):
+        many.append((sql, rows, types))
+        return {"status": "success", "row_count": len(rows)}
+
+    async def collect():
+        return [msg async for msg in run_script(chunks(), execute, execute_many)]
+
+    messages = asyncio.run(collect())
+    assert many == [("INSERT INTO t VALUES (:1, :2)", [[str(i), f"v{i}"] for i in range(5)], ["n", "s"])]
+    assert single == ["select 1 from dual"]
+    assert messages[-1]["type"] == "end"
@@ -0,0 +1,114 @@
+import os
+import time
+
+from core import tsdb
+from core.tsdb import TimeSeriesStore
+
+# An hour boundary recent enough that retention (which flush() runs) keeps its files
+T0 = time.time() // 3600 * 3600 - 7200
+
+
+def values(store, series, res, start=T0, end=T0 + 7200):
+    return [p["value"] for p in store.query(series, start, end, resolution=res)["points"]]
+
+
+def test_out_of_order_samples_are_rejected(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), raw_interval=1)
+    assert store.append("cpu", 1, T0) and store.append("cpu", 2, T0 + 2)
+    assert store.append("cpu", 9, T0 + 1) is False
+    assert store.append("cpu", 3, T0 + 2)   # equal timestamps are still in order
+    assert store.rejected == 1
+    assert values(store, "cpu", "raw") == [1, 2, 3]
+    store.close()
+
+
+def test_last_timestamp_survives_a_restart(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), raw_interval=1)
+    store.append("cpu", 1, T0 + 10)
+    store.close()
+    store = TimeSeriesStore(str(tmp_path), raw_interval=1)
+    assert store.append("cpu", 2, T0 + 5) is False
+    assert store.append("cpu", 3, T0 + 20)
+    assert values(store, "cpu", "raw") == [1, 3]
+    store.close()
+
+
+def test_partial_rollup_bucket_is_resumed_not_duplicated(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), raw_interval=1)
+    store.append("cpu", 10, T0)
+    store.append("cpu", 20, T0 + 1)
+    store.close()                            # persists the open 1m bucket
+    store = TimeSeriesStore(str(tmp_path), raw_interval=1)
+    store.append("cpu", 30, T0 + 2)
+    store.append("cpu", 99, T0 + 60)         # closes the first minute
+    store.close()
+    store = TimeSeriesStore(str(tmp_path), raw_interval=1)
+    points = store.query("cpu", T0, T0 + 30, resolution="1m")["points"]
+    assert len(points) == 1
+    assert (points[0]["value"], points[0]["min"], points[0]["max"]) == (20, 10, 30)
+    store.close()
+
+
+def test_open_files_are_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(tsdb, "TSDB_MAX_OPEN_FILES", 8)
+    store = TimeSeriesStore(str(tmp_path), raw_interval=1)
+    for i in range(20):
+        store.append(f"s{i}", i, T0)
+        store.append(f"s{i}", i, T0 + 3600)   # closes rollup buckets, opening their files too
+    assert len(store._files) <= 8
+    store.flush()
+    assert all(values(store, f"s{i}", "raw") == [i, i] for i in range(20))
+    store.close()
+
+
+def test_retention_drops_old_day_files(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), raw_interval=1)
+    store.append("cpu", 1, T0)
+    store.close()
+    raw_dir = os.path.join(str(tmp_path), "cpu", "raw")
+    assert os.listdir(raw_dir)
+    store = TimeSeriesStore(str(tmp_path), raw_interval=1)
+    store.enforce_retention(now=T0 + (tsdb.RETENTION_DAYS["raw"] + 2) * 86400)
+    assert os.listdir(raw_dir) == []
+
+
+def test_recorded_samples_are_written_by_the_flusher(tmp_path, monkeypatch):
+    store = TimeSeriesStore(str(tmp_path), raw_interval=1)
+    monkeypatch.setattr(tsdb, "_store", store)
+    tsdb.record_sample("db1", {"cpu_load": 5, "wait_events": [{"name": "CPU", "value": 2}]}, T0)
+    tsdb.record_ash("db1", {"CPU": 1.5}, T0)
+    # Nothing touches the disk on the caller's (event loop) thread
+    assert os.listdir(str(tmp_path)) == []
+    store.flush()
+    assert store.list_series("db1/") == ["db1/ash/CPU", "db1/cpu_load", "db1/wait/CPU"]
+    tsdb.record_sample("db1", {"cpu_load": 7}, T0 + 1)
+    # Queries (worker threads) see queued samples without waiting for the flusher
+    assert values(store, "db1/cpu_load", "raw") == [5, 7]
+    store.close()
+
+
+def test_drain_keeps_each_series_in_order(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), raw_interval=1)
+    for i in range(5):
+        store.enqueue("b", i, T0 + i)
+        store.enqueue("a", -i, T0 + i)
+    store.drain()
+    assert store.rejected == 0
+    assert values(store, "a", "raw") == [0, -1, -2, -3, -4]
+    assert values(store, "b", "raw") == [0, 1, 2, 3, 4]
+    store.close()
+
+
+def test_pending_queue_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(tsdb, "TSDB_MAX_PENDING", 3)
+    store = TimeSeriesStore(str(tmp_path), raw_interval=1)
+    for i in range(5):
+        store.enqueue("a", i, T0 + i)
+    assert store.dropped == 2
+    assert values(store, "a", "raw") == [0, 1, 2]
+    store.close()
+
+
+def test_open_file_budget_follows_the_descriptor_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(tsdb, "TSDB_MAX_OPEN_FILES", 0)
+    assert TimeSeriesStore(str(tmp_path)).max_open_files >= 64
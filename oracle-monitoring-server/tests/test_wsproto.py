@@ -0,0 +1,113 @@
+import copy
+import json
+
+import pytest
+
+from services import wsproto
+from services.wsproto import TickFrames, decode_control, diff, parse_groups
+
+
+def _unescape(token):
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def apply(state, message):
+    """Apply a v2 delta the way a client does: `set` and `del` keyed by JSON Pointer"""
+    state = copy.deepcopy(state)
+    for pointer in message["del"]:
+        state.pop(_unescape(pointer[1:]), None)
+    for pointer, value in message["set"].items():
+        *parents, last = [_unescape(t) for t in pointer[1:].split("/")]
+        node = state
+        for token in parents:
+            node = node[int(token)] if isinstance(node, list) else node[token]
+        if isinstance(node, list):
+            node[int(last)] = value
+        else:
+            node[last] = value
+    return state
+
+
+def sample(cpu=10.0, waits=(5, 3), **extra):
+    return {
+        "timestamp": "12:00:00",
+        "cpu_load": cpu,
+        "memory_usage": 40.0,
+        "active_sessions": 7,
+        "top_sql": [{"sql_id": "a", "elapsed": 1.0}, {"sql_id": "b", "elapsed": 0.5}],
+        "wait_events": [{"name": "CPU", "value": waits[0], "color": "#0f0"},
+                        {"name": "User I/O", "value": waits[1], "color": "#00f"}],
+        **extra,
+    }
+
+
+@pytest.mark.parametrize("prev, cur", [
+    (sample(), sample()),
+    (sample(), sample(cpu=55.5)),
+    (sample(), sample(waits=(9, 3))),
+    (sample(), sample(waits=(1, 2), top_sql=[{"sql_id": "c", "elapsed": 2.0}])),
+    (sample(), {k: v for k, v in sample().items() if k != "memory_usage"}),
+    (sample(), sample(**{"odd/key~name": 1})),
+    (sample(), sample(top_sql=[{"sql_id": "a", "elapsed": 1.0}, {"sql_id": "b", "plan": 7}])),
+])
+def test_diff_apply_round_trip(prev, cur):
+    changes, deleted = diff(prev, cur)
+    patch = {p: v for c in changes.values() for p, v in c.items()}
+    message = {"set": patch, "del": [wsproto._ptr(k) for k in deleted]}
+    assert apply(prev, message) == cur
+
+
+def test_static_fields_are_not_resent():
+    changes, deleted = diff(sample(), sample(cpu=20.0, waits=(6, 3)))
+    assert changes == {"cpu_load": {"/cpu_load": 20.0}, "wait_events": {"/wait_events/0/value": 6}}
+    assert deleted == []
+
+
+def test_tick_frames_snapshot_then_delta():
+    first = TickFrames(1, sample())
+    second = TickFrames(2, sample(cpu=30.0, waits=(8, 3)), prev_data=first.data)
+    snapshot = json.loads(first.snapshot(None, "json"))
+    assert snapshot["type"] == "snapshot" and snapshot["seq"] == 1
+    delta = json.loads(second.delta(None, "json"))
+    assert delta["type"] == "delta" and delta["base"] == 1
+    assert apply(snapshot["data"], delta) == second.data
+    # The first frame has nothing to diff against
+    assert json.loads(first.delta(None, "json"))["type"] == "snapshot"
+
+
+def test_group_filtering_and_frame_cache():
+    groups = parse_groups("waits")
+    first = TickFrames(1, sample())
+    second = TickFrames(2, sample(cpu=30.0, waits=(8, 3)), prev_data=first.data)
+    snapshot = json.loads(first.snapshot(groups, "json"))
+    assert set(snapshot["data"]) == {"timestamp", "wait_events"}
+    delta = json.loads(second.delta(groups, "json"))
+    assert delta["set"] == {"/wait_events/0/value": 8}
+    assert second.delta(groups, "json") is second.delta(groups, "json")
+
+
+@pytest.mark.skipif(wsproto.msgpack is None, reason="msgpack not installed")
+def test_msgpack_frames_round_trip():
+    first = TickFrames(1, sample())
+    second = TickFrames(2, sample(cpu=30.0), prev_data=first.data)
+    snapshot = wsproto.msgpack.unpackb(first.snapshot(None, "msgpack"), raw=False)
+    delta = wsproto.msgpack.unpackb(second.delta(None, "msgpack"), raw=False)
+    assert apply(snapshot["data"], delta) == second.data
+
+
+def test_parse_groups():
+    assert parse_groups(None) is None and parse_groups("") is None
+    assert parse_groups("system, waits") == frozenset({"system", "waits"})
+    with pytest.raises(ValueError):
+        parse_groups("system,bogus")
+
+
+def test_decode_control_text_and_binary():
+    assert decode_control('{"type": "resync"}', None, "json") == {"type": "resync"}
+    assert decode_control(None, b'{"type": "resync"}', "json") == {"type": "resync"}
+    assert decode_control("not json", None, "json") is None
+    assert decode_control("[1, 2]", None, "json") is None
+    assert decode_control(None, None, "json") is None
+    if wsproto.msgpack is not None:
+        data = wsproto.msgpack.packb({"type": "resync"})
+        assert decode_control(None, data, "msgpack") == {"type": "resync"}